@@ -0,0 +1,108 @@
+# benchmarks/bench_arranque.py
+"""
+Mide el arranque en frío: desde que se lanza el proceso hasta que el primer update (un parte de baixa,
+que con el diario se confirma sin llamar a la API) tiene respuesta. Cada medida es un proceso nuevo.
+
+Se usa una cuenta de servicio con una clave generada al momento: se cargan las credenciales y se
+construyen los servicios de verdad (sin red), pero no se hace ninguna llamada a Google.
+ - diferida: como arranca el bot, credenciales y servicios en un hilo en segundo plano;
+ - sincrona: credenciales y servicios listos antes de atender el primer update.
+
+Uso: python -m benchmarks.bench_arranque [repeticiones]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+def _secretos(directorio: str) -> None:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = clave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                              serialization.NoEncryption()).decode('ascii')
+    cuenta = {
+        'type': 'service_account', 'project_id': 'bench', 'private_key_id': 'bench', 'private_key': pem,
+        'client_email': 'bench@bench.iam.gserviceaccount.com', 'client_id': '1',
+        'token_uri': 'https://oauth2.googleapis.com/token',
+    }
+    with open(os.path.join(directorio, 'login.json'), 'w', encoding='utf-8') as f:
+        json.dump(cuenta, f)
+    with open(os.path.join(directorio, 's_sheets.json'), 'w', encoding='utf-8') as f:
+        json.dump({'spreadsheet_id': 'bench'}, f)
+
+def _hijo(t0: float, directorio: str, modo: str) -> None:
+    import asyncio
+    import logging
+    import threading
+    from unittest import mock
+
+    import inicio
+    importado = time.time()
+    from telegram import Update
+    from in_telegram import verificar_uuid
+    from in_telegram.g_sheets import g_autentificacion, diario_escrituras
+
+    logging.getLogger().setLevel(logging.ERROR)
+    g_autentificacion._SERVICE_ACCOUNT_FILE = os.path.join(directorio, 'login.json')
+    g_autentificacion._SPREADSHEET_ID_FILE = os.path.join(directorio, 's_sheets.json')
+    diario_escrituras.DIARIO_PATH = os.path.join(tempfile.mkdtemp(prefix="arranque-"), "diario.sqlite3")
+
+    servicios = {}
+    def precargar():
+        g_autentificacion.precargar()
+        servicios['listos'] = time.time()
+
+    if modo == 'sincrona':
+        precargar()
+    else:
+        threading.Thread(target=precargar, daemon=True).start()
+
+    respuesta = threading.Event()
+
+    class _Bot:
+        async def send_message(self, chat_id, text):
+            servicios['respuesta'] = time.time()
+            respuesta.set()
+
+    class _Context:
+        bot = _Bot()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    update = Update.de_json({
+        'update_id': 1,
+        'message': {'message_id': 1, 'date': int(time.time()), 'text': "3 a",
+                    'chat': {'id': 1, 'type': 'private'}, 'from': {'id': 1, 'is_bot': False, 'first_name': "operari"}},
+    }, None)
+    with mock.patch.object(verificar_uuid, '_AUTHORIZED_IDS', frozenset({1})):
+        inicio.worker_pool.submit(1, inicio.process_message_in_thread, update, _Context(), loop)
+        respuesta.wait(30)
+    while 'listos' not in servicios:
+        time.sleep(0.005)
+    print(json.dumps({'import': importado - t0, 'respuesta': servicios['respuesta'] - t0, 'servicios': servicios['listos'] - t0}))
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    directorio = tempfile.mkdtemp(prefix="secretos-")
+    _secretos(directorio)
+
+    for modo in ('sincrona', 'diferida'):
+        medidas = []
+        for _ in range(repeticiones):
+            t0 = time.time()
+            salida = subprocess.run([sys.executable, '-m', 'benchmarks.bench_arranque', '--hijo', str(t0), directorio, modo],
+                                    capture_output=True, text=True, check=True).stdout
+            medidas.append(json.loads(salida.strip().splitlines()[-1]))
+        mediana = {clave: sorted(m[clave] for m in medidas)[len(medidas) // 2] * 1000 for clave in medidas[0]}
+        print(f"{modo:<9} import inicio={mediana['import']:.0f} ms  primera respuesta={mediana['respuesta']:.0f} ms  "
+              f"servicios de Sheets listos={mediana['servicios']:.0f} ms  (mediana de {repeticiones})")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--hijo':
+        _hijo(float(sys.argv[2]), sys.argv[3], sys.argv[4])
+    else:
+        main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_baixes_totals.py
+"""
+Mide /mostrar_baixes_totals contra el backend de Sheets simulado con latencia fija por llamada,
+comparando la lectura por nau (una llamada por celda I2) con la réplica local
+(un batchGet para cargarla y después ninguna llamada por consulta).
+
+Uso: python -m benchmarks.bench_baixes_totals [num_naus] [latencia_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from in_telegram.comandos import baixes_totals
+from in_telegram.g_sheets import g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils.registre_naus import RegistroNaus
+from in_telegram.utils.message_sender import esperar_envios
+
+CONSULTAS = 5
+
+class _BotSimulado:
+    def __init__(self):
+        self.mensajes = 0
+
+    async def send_message(self, chat_id, text):
+        self.mensajes += 1
+
+class _ContextSimulado:
+    def __init__(self):
+        self.bot = _BotSimulado()
+
+def _por_nau(backend, naves, context):
+    # Comportamiento original: una lectura y un mensaje por nau en cada consulta
+    async def ejecutar():
+        for _ in range(CONSULTAS):
+            for nave in naves:
+                backend.spreadsheets().values().get(spreadsheetId='bench', range=f"'Nau {nave}'!I2").execute()
+                await context.bot.send_message(chat_id=1, text="")
+    asyncio.run(ejecutar())
+
+def _replica(backend, naves, context):
+    registro_naus = RegistroNaus(naves)
+    replica_local.vaciar()
+
+    async def responder():
+        for _ in range(CONSULTAS):
+            totales = await asyncio.to_thread(baixes_totals._leer_totales, registro_naus)
+            await baixes_totals._mostrar_baixes_totals_async(1, context, totales)
+        await esperar_envios()
+    asyncio.run(responder())
+
+def main():
+    num_naus = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    latencia_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 80
+    naves = [chr(ord('A') + i) for i in range(num_naus)]
+    replica_local.REPLICA_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-"), "replica.sqlite3")
+
+    for nombre, funcion in (("una llamada por nau", _por_nau), ("réplica local", _replica)):
+        backend = g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=naves, latencia=latencia_ms / 1000))
+        context = _ContextSimulado()
+        inicio = time.perf_counter()
+        funcion(backend, naves, context)
+        duracion = time.perf_counter() - inicio
+        print(f"{nombre:<20} naus={num_naus} consultas={CONSULTAS} llamadas_sheets={backend.total_llamadas():<3} "
+              f"mensajes={context.bot.mensajes:<3} tiempo={duracion * 1000:.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_cuota.py
+"""
+Comprueba el gobernador de cuota de Sheets contra el backend simulado:
+ - ráfaga de lecturas de informes (varios supervisores a la vez) y, en medio, la baixa de un operario
+   (lectura + escritura): espera de la baixa con prioridad y sin ella;
+ - errores 429 inyectados: cuántos llegan a quien llama con los reintentos con backoff.
+
+Uso: python -m benchmarks.bench_cuota [lecturas_por_minuto] [supervisores]
+"""
+
+import logging
+import sys
+import threading
+import time
+
+from in_telegram.g_sheets import cuota
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.g_sheets.sheets_api import ejecutar
+
+CONSULTAS_POR_SUPERVISOR = 10
+
+def _rafaga(backend, supervisores: int, prioridad_operario: int) -> tuple[float, float]:
+    """Retorna (segundos de la baixa del operario, segundos hasta acabar la ráfaga)."""
+    def supervisor():
+        for _ in range(CONSULTAS_POR_SUPERVISOR):
+            ejecutar(backend.spreadsheets().values().batchGet(spreadsheetId='b', ranges=["'Nau A'!B7:E101", "'Nau A'!I2"]))
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=supervisor) for _ in range(supervisores)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.5) # La baixa llega con la ráfaga ya en marcha
+
+    inicio_baixa = time.perf_counter()
+    ejecutar(backend.spreadsheets().values().get(spreadsheetId='b', range="'Nau A'!D8"), prioridad=prioridad_operario)
+    ejecutar(backend.spreadsheets().values().update(spreadsheetId='b', range="'Nau A'!D8", body={'values': [[1]]}),
+             prioridad=prioridad_operario)
+    baixa = time.perf_counter() - inicio_baixa
+
+    for hilo in hilos:
+        hilo.join()
+    return baixa, time.perf_counter() - inicio
+
+def main():
+    por_minuto = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    supervisores = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"cuota={por_minuto:.0f} lecturas/min y escrituras/min, ráfaga={cuota.RAFAGA_MAXIMA}, reserva={cuota.RESERVA_BAIXES}, "
+          f"{supervisores} supervisores x {CONSULTAS_POR_SUPERVISOR} consultas")
+    for nombre, prioridad in (("baixa sin prioridad", cuota.PRIORIDAD_CONSULTA), ("baixa con prioridad", cuota.PRIORIDAD_BAIXA)):
+        cuota.configurar(por_minuto, por_minuto)
+        backend = FakeSheetsService(naus=('A',), latencia=0.02)
+        baixa, total = _rafaga(backend, supervisores, prioridad)
+        print(f"  {nombre:<20} espera de la baixa={baixa * 1000:6.0f} ms  ráfaga completa={total:.1f} s  "
+              f"llamadas={backend.total_llamadas()}")
+
+    # Errores 429: backoff corto para que el benchmark no tarde
+    cuota.configurar(1e9, 1e9)
+    cuota.ESPERA_BASE_REINTENTO = 0.02
+    backend = FakeSheetsService(naus=('A',), prob_429=0.2, semilla=3)
+    fallidas = 0
+    for _ in range(100):
+        try:
+            ejecutar(backend.spreadsheets().values().get(spreadsheetId='b', range="'Nau A'!D8"))
+        except Exception:
+            fallidas += 1
+    print(f"  429 inyectados al 20%: {backend.errores_429} errores de la API, {fallidas} de 100 peticiones fallidas para quien llama")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_diario.py
+"""
+Diario de escrituras contra el backend de Sheets simulado:
+ - latencia de la confirmación (registrar en SQLite) frente a la escritura directa (get + update),
+ - caída del proceso antes y después del batchUpdate: cada entrada se aplica exactamente una vez,
+ - Sheets caído: las baixes se acumulan y se aplican al volver.
+Uso: python -m benchmarks.bench_diario [--latencia-ms 80]
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from in_telegram.g_sheets import g_autentificacion, cuota, diario_escrituras, replica_local, buscar_data_actual
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.g_sheets.sheets_api import ejecutar
+
+class _Caida(Exception):
+    pass
+
+def _nuevo_diario(directorio: str, nombre: str):
+    diario_escrituras.cerrar()
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, nombre)
+
+def _registrar_lote(hoy: str, n: int):
+    total = {}
+    for i in range(n):
+        nave, columna, cantidad = "AB"[i % 2], "DE"[(i // 2) % 2], i % 5 + 1
+        diario_escrituras.registrar(nave, hoy, columna, cantidad, update_id=10_000 + i)
+        total[(nave, columna)] = total.get((nave, columna), 0) + cantidad
+    return total
+
+def _comprobar(backend, fila: int, esperado: dict, etiqueta: str):
+    valores = {(nave, columna): backend.valor(nave, f"{columna}{fila}") for nave, columna in sorted(esperado)}
+    ok = valores == esperado
+    detalle = ", ".join(f"{nave}{columna}={valor}" for (nave, columna), valor in valores.items())
+    print(f"  {etiqueta}: {'OK' if ok else 'ERROR'} ({detalle})")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latencia-ms', type=float, default=80.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    directorio = tempfile.mkdtemp(prefix="diario-")
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    diario_escrituras._diario().hilo = object() # Sin hilo: los ciclos se lanzan a mano para controlar las caídas
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    # Sin límite de cuota ni reintentos internos: se mide el diario, y la caída de Sheets debe llegarle como error
+    cuota.configurar(1e9, 1e9)
+    cuota.MAX_REINTENTOS = 0
+
+    # 1. Latencia de la confirmación
+    backend = FakeSheetsService(naus=('A', 'B'), latencia=args.latencia_ms / 1000)
+    g_autentificacion.usar_sheets_simulado(backend)
+    _nuevo_diario(directorio, "latencia.sqlite3")
+    tiempos = []
+    for i in range(50):
+        inicio = time.perf_counter()
+        diario_escrituras.registrar('A', hoy, 'E', 1, chat_id=1, update_id=i)
+        tiempos.append(time.perf_counter() - inicio)
+    directo = []
+    for _ in range(5):
+        inicio = time.perf_counter()
+        ejecutar(backend.spreadsheets().values().get(spreadsheetId='s', range="'Nau A'!E8", valueRenderOption='UNFORMATTED_VALUE'))
+        ejecutar(backend.spreadsheets().values().update(spreadsheetId='s', range="'Nau A'!E8", valueInputOption='RAW', body={'values': [[1]]}))
+        directo.append(time.perf_counter() - inicio)
+    print(f"Confirmación: diario p50={statistics.median(tiempos) * 1000:.2f} ms · escritura directa p50={statistics.median(directo) * 1000:.0f} ms")
+    antes = backend.total_llamadas()
+    diario_escrituras.sincronizar()
+    fila = buscar_data_actual.fila_cacheada('A')
+    print(f"  50 baixes aplicadas con {backend.total_llamadas() - antes} llamadas a Sheets; E{fila}={backend.valor('A', f'E{fila}')}")
+    reentrega = diario_escrituras.registrar('A', hoy, 'E', 1, chat_id=1, update_id=0)
+    print(f"  Reentrega del update 0: {'ignorada' if reentrega is None else 'DUPLICADA'}")
+
+    resultados = []
+    # 2. Caída justo después del batchUpdate (la hoja ya tiene los valores, el diario no lo sabe)
+    for momento in ("después", "antes"):
+        backend = FakeSheetsService(naus=('A', 'B'))
+        g_autentificacion.usar_sheets_simulado(backend)
+        _nuevo_diario(directorio, f"caida-{momento}.sqlite3")
+        esperado = _registrar_lote(hoy, 40)
+        original = backend._ejecutar
+
+        def con_caida(metodo, operacion):
+            if metodo == 'values.batchUpdate':
+                if momento == "después":
+                    original(metodo, operacion)
+                raise _Caida()
+            return original(metodo, operacion)
+
+        backend._ejecutar = con_caida
+        try:
+            diario_escrituras.sincronizar()
+        except _Caida:
+            pass
+        backend._ejecutar = original
+        # "Reinicio": conexión nueva al mismo archivo
+        _nuevo_diario(directorio, f"caida-{momento}.sqlite3")
+        diario_escrituras.sincronizar()
+        fila = buscar_data_actual.fila_cacheada('A')
+        resultados.append(_comprobar(backend, fila, esperado, f"Caída {momento} del batchUpdate"))
+
+    # 3. Sheets caído durante un rato
+    backend = FakeSheetsService(naus=('A', 'B'), prob_429=1.0)
+    g_autentificacion.usar_sheets_simulado(backend)
+    _nuevo_diario(directorio, "caido.sqlite3")
+    esperado = _registrar_lote(hoy, 30)
+    for _ in range(3):
+        try:
+            diario_escrituras.sincronizar()
+        except Exception:
+            pass
+    print(f"  Sheets caído: {diario_escrituras.pendientes()} baixes pendientes en el diario")
+    backend.prob_429 = 0.0
+    diario_escrituras.sincronizar()
+    resultados.append(_comprobar(backend, buscar_data_actual.fila_cacheada('A'), esperado, "Sheets recuperado"))
+    print("Exactamente una vez:", "OK" if all(resultados) else "ERROR")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_granjas.py
+"""
+Dos granjas con hojas de cálculo distintas detrás del mismo bot, contra el backend de Sheets simulado.
+La hoja de la granja 'nord' es lenta y devuelve 429; se mide cuánto tarda en aplicarse un lote de baixes
+de la granja 'sud' sola y mientras 'nord' está saturada. Con diario y réplica por granja, y la cuota de la cuenta
+repartida por turnos entre granjas, deberían tardar casi lo mismo (un 429 de 'nord' pausa la cuota de las dos).
+Uso: python -m benchmarks.bench_granjas [--baixes 40] [--latencia-nord-ms 1500] [--prob-429-nord 0.5]
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from in_telegram.g_sheets import g_autentificacion, diario_escrituras, replica_local, buscar_data_actual
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService, FakeLibrosSheets
+from in_telegram.utils import granjas
+
+def _registrar_lote(granja: granjas.Granja, hoy: str, n: int, primer_update: int) -> dict:
+    total = {}
+    with granjas.contexto_granja(granja):
+        for i in range(n):
+            nave, columna = "AB"[i % 2], "DE"[(i // 2) % 2]
+            diario_escrituras.registrar(nave, hoy, columna, 1, chat_id=1, update_id=primer_update + i)
+            total[(nave, columna)] = total.get((nave, columna), 0) + 1
+    return total
+
+def _esperar(granja: granjas.Granja, timeout: float) -> float | None:
+    """Segundos hasta que el diario de la granja queda vacío, o None si no se vacía a tiempo."""
+    inicio = time.perf_counter()
+    with granjas.contexto_granja(granja):
+        if not diario_escrituras.esperar_sincronizado(timeout):
+            return None
+    return time.perf_counter() - inicio
+
+def _comprobar(backend: FakeSheetsService, granja: granjas.Granja, esperado: dict, anterior: dict) -> bool:
+    with granjas.contexto_granja(granja):
+        fila = buscar_data_actual.fila_cacheada('A')
+    return all(backend.valor(nave, f"{columna}{fila}") == anterior.get((nave, columna), 0) + cantidad
+               for (nave, columna), cantidad in esperado.items())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--baixes', type=int, default=40)
+    parser.add_argument('--latencia-nord-ms', type=float, default=1500.0)
+    parser.add_argument('--prob-429-nord', type=float, default=0.5)
+    parser.add_argument('--latencia-sud-ms', type=float, default=50.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    directorio = tempfile.mkdtemp(prefix="granjas-")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    granjas.GRANJAS_FILE = os.path.join(directorio, "granjas.json")
+    with open(granjas.GRANJAS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'granges': {'nord': {'spreadsheet_id': 'hoja-nord', 'naus': ['A', 'B']},
+                               'sud': {'spreadsheet_id': 'hoja-sud', 'naus': ['A', 'B']}},
+                   'xats': {'1': 'nord', '2': 'sud'}}, f)
+    granjas.recargar(forzar=True)
+    nord, sud = granjas.para_update(1, None), granjas.para_update(2, None)
+
+    hoja_nord = FakeSheetsService(naus=('A', 'B'), latencia=args.latencia_nord_ms / 1000, semilla=1)
+    hoja_sud = FakeSheetsService(naus=('A', 'B'), latencia=args.latencia_sud_ms / 1000)
+    g_autentificacion.usar_sheets_simulado(FakeLibrosSheets({'hoja-nord': hoja_nord, 'hoja-sud': hoja_sud}))
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+
+    # 1. Sud sola
+    esperado_sola = _registrar_lote(sud, hoy, args.baixes, 0)
+    sola = _esperar(sud, 60.0)
+    ok_sola = _comprobar(hoja_sud, sud, esperado_sola, {})
+
+    # 2. Sud mientras nord está lenta y devolviendo 429
+    hoja_nord.prob_429 = args.prob_429_nord
+    hilo_nord = threading.Thread(target=_registrar_lote, args=(nord, hoy, args.baixes * 5, 100_000))
+    hilo_nord.start()
+    time.sleep(0.2) # El sincronizador de nord ya está esperando a su hoja
+    esperado_carga = _registrar_lote(sud, hoy, args.baixes, 10_000)
+    con_nord = _esperar(sud, 60.0)
+    ok_carga = _comprobar(hoja_sud, sud, esperado_carga, esperado_sola)
+    hilo_nord.join()
+    with granjas.contexto_granja(nord):
+        pendientes_nord = diario_escrituras.pendientes()
+
+    print(f"sud: {args.baixes} baixes, hoja a {args.latencia_sud_ms:.0f} ms · nord: {args.baixes * 5} baixes, "
+          f"hoja a {args.latencia_nord_ms:.0f} ms con 429 al {args.prob_429_nord:.0%}")
+    print(f"  sud sola              aplicadas en {sola * 1000 if sola is not None else float('nan'):6.0f} ms  totales {'OK' if ok_sola else 'ERROR'}")
+    print(f"  sud con nord saturada aplicadas en {con_nord * 1000 if con_nord is not None else float('nan'):6.0f} ms  totales {'OK' if ok_carga else 'ERROR'}")
+    print(f"  nord en ese momento: {pendientes_nord} baixes pendientes, {hoja_nord.errores_429} errores 429, "
+          f"{hoja_nord.total_llamadas()} llamadas a su hoja")
+
+if __name__ == '__main__':
+    main()
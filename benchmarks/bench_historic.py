@@ -0,0 +1,67 @@
+# benchmarks/bench_historic.py
+"""
+Mide /baixes_historic para todas las naus y la temporada completa (B7:E101) contra el backend
+de Sheets simulado: primera consulta con la réplica vacía (un batchGet) y consultas siguientes desde la réplica.
+
+Uso: python -m benchmarks.bench_historic [num_naus] [latencia_ms]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+from in_telegram.comandos import baixes_historic
+from in_telegram.g_sheets import g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService, PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS
+from in_telegram.utils.registre_naus import RegistroNaus
+
+CONSULTAS = 20
+
+def _rellenar(backend, naves):
+    rnd = random.Random(1)
+    datos = [{'range': f"'Nau {nave}'!D{fila}:E{fila}", 'values': [[rnd.randint(0, 4), rnd.randint(0, 12)]]}
+             for nave in naves for fila in range(PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS + 1)]
+    backend.spreadsheets().values().batchUpdate(spreadsheetId='bench', body={'data': datos}).execute()
+
+def _consulta(registro_naus, dies):
+    replica_local.asegurar_cargada(registro_naus)
+    filas = replica_local.filas_diarias(registro_naus.naus)
+    datos = baixes_historic.calcular(filas, registro_naus.naus, datetime.date.today(), dies)
+    return baixes_historic.formatear(datos, None)
+
+def main():
+    num_naus = int(sys.argv[1]) if len(sys.argv) > 1 else 26
+    latencia_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 80
+    naves = [chr(ord('A') + i) for i in range(num_naus)]
+    dies = ULTIMA_FILA_FECHAS - PRIMERA_FILA_FECHAS + 1
+    replica_local.REPLICA_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-"), "replica.sqlite3")
+
+    # Temporada completa: la última fila de la hoja es hoy
+    backend = FakeSheetsService(naus=naves, dias_antes_de_hoy=dies - 1)
+    _rellenar(backend, naves)
+    backend.latencia = latencia_ms / 1000
+    g_autentificacion.usar_sheets_simulado(backend)
+    registro_naus = RegistroNaus(naves)
+    llamadas_antes = backend.total_llamadas()
+
+    inicio = time.perf_counter()
+    mensaje = _consulta(registro_naus, dies)
+    primera = time.perf_counter() - inicio
+
+    tiempos = []
+    for _ in range(CONSULTAS):
+        inicio = time.perf_counter()
+        _consulta(registro_naus, dies)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+
+    print(f"naus={num_naus} dies={dies} llamadas_sheets={backend.total_llamadas() - llamadas_antes} "
+          f"caracteres={len(mensaje)}")
+    print(f"primera consulta (batchGet) {primera * 1000:.1f} ms")
+    print(f"desde la réplica            p50={tiempos[len(tiempos) // 2] * 1000:.1f} ms max={tiempos[-1] * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_lag_bucle.py
+"""
+Mide el retraso (lag) del bucle de eventos mientras se procesa una ráfaga de informes de baja.
+Un monitor duerme INTERVALO segundos en bucle y registra cuánto se pasa de ese tiempo:
+si las llamadas a Sheets bloquean el bucle, el lag crece con la latencia de la API.
+
+Compara la ejecución directa de .execute() dentro de la corrutina (comportamiento anterior)
+con sheets_api.ejecutar_async.
+
+Uso: python -m benchmarks.bench_lag_bucle [num_informes] [latencia_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from in_telegram.g_sheets import baixes_g_sheets, cuota, diario_escrituras, replica_local
+
+INTERVALO = 0.005
+
+class _PeticionLenta:
+    def __init__(self, latencia, respuesta, metodo):
+        self._latencia = latencia
+        self._respuesta = respuesta
+        self.methodId = f"sheets.spreadsheets.{metodo}" # La cuota distingue lecturas y escrituras por el método
+
+    def execute(self):
+        time.sleep(self._latencia)
+        return self._respuesta
+
+class _SheetsLento:
+    def __init__(self, latencia):
+        self._latencia = latencia
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, **kwargs):
+        return _PeticionLenta(self._latencia, {'values': [[1]]}, 'values.get')
+
+    def update(self, **kwargs):
+        return _PeticionLenta(self._latencia, {}, 'values.update')
+
+class _BotSimulado:
+    async def send_message(self, chat_id, text):
+        pass
+
+class _ContextSimulado:
+    bot = _BotSimulado()
+
+async def _monitor(lags: list, parar: asyncio.Event):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(INTERVALO)
+        lags.append(time.perf_counter() - inicio - INTERVALO)
+
+async def _rafaga(num_informes: int) -> list:
+    lags = []
+    parar = asyncio.Event()
+    monitor = asyncio.create_task(_monitor(lags, parar))
+    await asyncio.sleep(INTERVALO * 2)
+    await asyncio.gather(*[
+        baixes_g_sheets._escribir_Datos_sheets('A', 8, 1, False, _ContextSimulado(), i)
+        for i in range(num_informes)
+    ])
+    parar.set()
+    await monitor
+    return lags
+
+async def _ejecutar_en_bucle(peticion, prioridad=None):
+    return peticion.execute()
+
+def _medir(nombre: str, backend, num_informes: int, bloqueante: bool):
+    parches = [
+        mock.patch.object(baixes_g_sheets, 'get_sheets_service_ro', return_value=backend),
+        mock.patch.object(baixes_g_sheets, 'get_sheets_service_rw', return_value=backend),
+        mock.patch.object(baixes_g_sheets, 'get_spreadsheet_id', return_value='bench'),
+    ]
+    if bloqueante:
+        parches.append(mock.patch.object(baixes_g_sheets, 'ejecutar_async', _ejecutar_en_bucle))
+    for p in parches:
+        p.start()
+    try:
+        inicio = time.perf_counter()
+        lags = asyncio.run(_rafaga(num_informes))
+        duracion = time.perf_counter() - inicio
+    finally:
+        for p in reversed(parches):
+            p.stop()
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0
+    print(f"{nombre:<22} informes={num_informes} lag_max={max(lags) * 1000:7.1f} ms  lag_p99={p99 * 1000:7.1f} ms  total={duracion * 1000:.0f} ms")
+
+def main():
+    directorio = tempfile.mkdtemp(prefix="bench-lag-")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    cuota.configurar(1e9, 1e9) # Solo se mide el bucle, no la espera de cuota
+    num_informes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latencia_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    backend = _SheetsLento(latencia_ms / 1000)
+    _medir(".execute() en el bucle", backend, num_informes, bloqueante=True)
+    _medir("ejecutar_async", backend, num_informes, bloqueante=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_logs.py
+"""
+Bytes y líneas de log por informe de baixa válido, con el backend de Sheets simulado.
+Uso: python -m benchmarks.bench_logs [--informes 200] [--formato json|texto] [--muestreo 0.05]
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from telegram import Update
+
+import inicio
+from in_telegram import verificar_uuid
+from in_telegram.g_sheets import diario_escrituras, g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils.registre_naus import naus_validas
+from in_telegram.utils.message_sender import mensajes_pendientes
+
+class _Bot:
+    async def send_message(self, chat_id, text):
+        pass
+
+class _Context:
+    bot = _Bot()
+
+def _update(update_id: int, user_id: int, texto: str) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': texto,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': "operari"},
+        },
+    }, None)
+
+def _configurar(salida, formato: str, muestreo: float):
+    try:
+        from in_telegram.utils.config_logs import configurar_logging
+    except ImportError: # Árbol anterior a la configuración centralizada
+        raiz = logging.getLogger()
+        raiz.handlers[:] = [logging.StreamHandler(salida)]
+        raiz.handlers[0].setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        raiz.setLevel(logging.INFO)
+        return
+    configurar_logging(formato=formato, muestreo=muestreo, stream=salida)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--informes', type=int, default=200)
+    parser.add_argument('--formato', default='json')
+    parser.add_argument('--muestreo', type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Nunca el diario ni la réplica del bot: sus entradas sintéticas se aplicarían en la hoja real al arrancar
+    directorio = tempfile.mkdtemp(prefix="bench-logs-")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    naus = naus_validas()
+    g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=naus))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    salida = io.StringIO()
+    with mock.patch.object(verificar_uuid, '_AUTHORIZED_IDS', frozenset({1})), mock.patch('builtins.print'):
+        # Calentamiento: carga de la caché de fechas y de la lista de usuarios
+        inicio.process_message_in_thread(_update(0, 1, f"1 {naus[0]}"), _Context(), loop)
+        time.sleep(0.2)
+        _configurar(salida, args.formato, args.muestreo)
+        for i in range(1, args.informes + 1):
+            inicio.process_message_in_thread(_update(i, 1, f"{i % 9 + 1} {naus[i % len(naus)]}"), _Context(), loop)
+            time.sleep(0.002)
+        limite = time.time() + 30
+        while mensajes_pendientes(loop) and time.time() < limite:
+            time.sleep(0.05)
+        time.sleep(0.2)
+    logging.getLogger().handlers[:] = []
+    loop.call_soon_threadsafe(loop.stop)
+
+    texto = salida.getvalue()
+    lineas = texto.splitlines()
+    # Árbol anterior: "Se escribió N en la celda ..."; actual: "Baixa escrita a ..." (auditoría)
+    auditoria = sum(1 for l in lineas if 'Se escribió' in l or 'Baixa escrita' in l)
+    print(f"{args.informes} informes: {len(texto.encode('utf-8')) / args.informes:.0f} bytes/informe, "
+          f"{len(lineas) / args.informes:.2f} líneas/informe, {auditoria} líneas de escritura")
+    if lineas:
+        print("Ejemplo:", lineas[-1][:300], file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
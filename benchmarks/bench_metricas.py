@@ -0,0 +1,58 @@
+# benchmarks/bench_metricas.py
+"""
+Coste de la instrumentación con las métricas desactivadas y activadas, y prueba del endpoint /metrics.
+Uso: python -m benchmarks.bench_metricas
+"""
+
+import time
+import urllib.request
+
+from in_telegram.utils import metricas
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.g_sheets import cuota
+from in_telegram.g_sheets.sheets_api import ejecutar
+
+N = 200_000
+
+def _coste_medir_etapa() -> float:
+    inicio = time.perf_counter()
+    for _ in range(N):
+        with metricas.medir_etapa(metricas.ETAPA_FILTRADO):
+            pass
+    return (time.perf_counter() - inicio) / N * 1e9
+
+def _coste_vacio() -> float:
+    inicio = time.perf_counter()
+    for _ in range(N):
+        pass
+    return (time.perf_counter() - inicio) / N * 1e9
+
+def main():
+    base = _coste_vacio()
+    desactivadas = _coste_medir_etapa()
+    servidor = metricas.iniciar_servidor('127.0.0.1', 0)
+    activadas = _coste_medir_etapa()
+    print(f"medir_etapa(): desactivadas {desactivadas - base:.0f} ns/llamada · activadas {activadas - base:.0f} ns/llamada")
+
+    backend = FakeSheetsService(naus=('A',))
+    ejecutar(backend.spreadsheets().values().get(spreadsheetId='x', range="'Nau A'!D7"))
+    ejecutar(backend.spreadsheets().values().update(spreadsheetId='x', range="'Nau A'!D7", body={'values': [[1]]}))
+    backend.prob_429 = 1.0
+    cuota.MAX_REINTENTOS = 1
+    cuota.ESPERA_BASE_REINTENTO = 0.01
+    try:
+        ejecutar(backend.spreadsheets().values().get(spreadsheetId='x', range="'Nau A'!D7"))
+    except Exception:
+        pass
+
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/metrics"
+    with urllib.request.urlopen(url) as respuesta:
+        texto = respuesta.read().decode('utf-8')
+    print(f"GET {url} -> {len(texto.splitlines())} líneas")
+    for linea in texto.splitlines():
+        if linea.startswith(("baixes_sheets_llamadas_total", "baixes_sheets_reintentos_total")) or 'le="+Inf"' in linea:
+            print("  " + linea)
+    servidor.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_multianotacio.py
+"""
+Final de ronda de un operario: N anotaciones (nau + SAC/NO SAC) enviadas como N mensajes o como un único
+mensaje '10a 3b sac 2c ...', contra el backend de Sheets simulado. Para cada modo de escritura compara
+mensajes, respuestas, llamadas a Sheets y tiempo, y comprueba que la hoja queda con los mismos totales.
+Uso: python -m benchmarks.bench_multianotacio [--anotacions 8] [--latencia-ms 80]
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import tempfile
+import time
+
+from in_telegram.g_sheets import g_autentificacion, cuota, baixes_g_sheets, buscar_data_actual, diario_escrituras, replica_local
+from in_telegram.g_sheets.baixes_g_sheets import g_sheets
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils import granjas
+from in_telegram.utils.message_sender import esperar_envios
+
+NAUS = tuple("ABCDEFGH")
+_update_ids = itertools.count(1) # Únicos en toda la ejecución: el diario descarta los update_id repetidos
+
+class _Bot:
+    def __init__(self):
+        self.respuestas = []
+
+    async def send_message(self, chat_id, text):
+        self.respuestas.append(text)
+
+class _Context:
+    def __init__(self):
+        self.bot = _Bot()
+
+def _update(update_id: int, texto: str) -> dict:
+    return {'update_id': update_id, 'effective_user': {'id': 1}, 'message': {'chat': {'id': 1}, 'text': texto}}
+
+async def _enviar(textos: list, context) -> float:
+    """
+    Cada mensaje se procesa cuando el anterior ya está escrito, como haría el operario esperando la respuesta.
+    Retorna el tiempo hasta que todo está en la hoja (sin contar el ritmo de envío de las respuestas a Telegram).
+    """
+    inicio = time.perf_counter()
+    for texto in textos:
+        await g_sheets(_update(next(_update_ids), texto), context, asyncio.get_running_loop())
+    if baixes_g_sheets.DIARIO_ESCRITURAS:
+        await asyncio.to_thread(diario_escrituras.esperar_sincronizado, 30.0)
+    duracion = time.perf_counter() - inicio
+    await esperar_envios()
+    return duracion
+
+def _texto(anotacion: tuple) -> str:
+    cantidad, nau, sac = anotacion
+    return f"{cantidad}{nau.lower()}{' sac' if sac else ''}"
+
+def _totales(backend: FakeSheetsService, fila: int) -> dict:
+    return {(nau, columna): backend.valor(nau, f"{columna}{fila}") or 0 for nau in NAUS for columna in "DE"}
+
+async def _ronda(modo: str, anotaciones: list, latencia: float) -> list:
+    baixes_g_sheets.DIARIO_ESCRITURAS = modo == 'diari'
+    baixes_g_sheets.ESCRITURA_AGRUPADA = modo == 'agrupat'
+    textos = [_texto(anotacion) for anotacion in anotaciones]
+    filas = []
+    for nombre, mensajes in (("separats", textos), ("un missatge", [" ".join(textos)])):
+        backend = g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=NAUS, latencia=latencia))
+        buscar_data_actual.invalidar_cache_fechas()
+        replica_local.vaciar()
+        context = _Context()
+        await _enviar(["1a"], context) # Caché de fechas cargada y sincronizador arrancado
+        llamadas_antes = dict(backend.llamadas)
+        context.bot.respuestas.clear()
+        duracion = await _enviar(mensajes, context)
+        llamadas = {m: n - llamadas_antes.get(m, 0) for m, n in backend.llamadas.items() if n - llamadas_antes.get(m, 0)}
+        fila = buscar_data_actual.fila_cacheada('A')
+        filas.append((nombre, len(mensajes), len(context.bot.respuestas), llamadas, duracion, _totales(backend, fila)))
+    return filas
+
+async def main_async(args):
+    rng = random.Random(7)
+    anotaciones = [(rng.randint(1, 12), nau, sac) for nau, sac in rng.sample([(n, s) for n in NAUS for s in (False, True)], args.anotacions)]
+    print(f"{args.anotacions} anotacions: {' '.join(_texto(anotacion) for anotacion in anotaciones)}")
+    correcto = True
+    for modo in ('directe', 'agrupat', 'diari'):
+        filas = await _ronda(modo, anotaciones, args.latencia_ms / 1000)
+        iguales = filas[0][5] == filas[1][5]
+        correcto = correcto and iguales
+        for nombre, mensajes, respuestas, llamadas, duracion, _ in filas:
+            print(f"  {modo:<8} {nombre:<12} {mensajes:2d} missatges  {respuestas:2d} respostes  "
+                  f"{sum(llamadas.values()):3d} crides a Sheets {dict(llamadas)}  {duracion * 1000:6.0f} ms")
+        print(f"  {modo:<8} totals {'iguals' if iguales else 'DIFERENTS'}")
+    return correcto
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--anotacions', type=int, default=8)
+    parser.add_argument('--latencia-ms', type=float, default=80.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    directorio = tempfile.mkdtemp(prefix="multianotacio-")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    cuota.configurar(1e9, 1e9)
+    with granjas.contexto_granja(granjas.Granja(granjas.PRINCIPAL, naus=list(NAUS))):
+        correcto = asyncio.run(main_async(args))
+    raise SystemExit(0 if correcto else 1)
+
+if __name__ == '__main__':
+    main()
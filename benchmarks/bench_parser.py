@@ -0,0 +1,116 @@
+# benchmarks/bench_parser.py
+"""
+Micro-benchmark del análisis de mensajes de baixes.
+Compara el parser de una sola pasada (parse_baixa) con la cadena anterior de filtrar +
+filtrar_nave + g_sheets, y comprueba que cada mensaje del corpus se acepta o rechaza como se espera.
+También comprueba los mensajes con varias anotaciones (parse_baixes).
+
+Uso: python -m benchmarks.bench_parser [repeticiones]
+"""
+
+import re
+import sys
+import timeit
+
+from in_telegram.validadores.parser_baixes import parse_baixa, parse_baixes, ParsedBaixa, ErrorBaixa
+
+NAUS = frozenset({'A', 'B'})
+
+# (mensaje, resultado esperado)
+CORPUS = [
+    ("10 a sac", ParsedBaixa('A', 10, True)),
+    ("10a", ParsedBaixa('A', 10, False)),
+    ("A10", ParsedBaixa('A', 10, False)),
+    ("b 3", ParsedBaixa('B', 3, False)),
+    ("sac 7 B", ParsedBaixa('B', 7, True)),
+    ("  12   b  ", ParsedBaixa('B', 12, False)),
+    ("SAC a1", ParsedBaixa('A', 1, True)),
+    ("10asac", ParsedBaixa('A', 10, True)),
+    ("0a", ErrorBaixa.QUANTITAT),
+    ("10 c", ErrorBaixa.NAU_INVALIDA),
+    ("10 ab", ErrorBaixa.FORMAT),
+    ("hola", ErrorBaixa.FORMAT),
+    ("sac", ErrorBaixa.FORMAT),
+    ("10", ErrorBaixa.FORMAT),
+    ("1a2", ErrorBaixa.FORMAT),
+    ("10 a!", ErrorBaixa.CARACTERS),
+    ("a-10", ErrorBaixa.CARACTERS),
+    ("10 € a", ErrorBaixa.CARACTERS),
+]
+
+# Mensajes con varias anotaciones: cada 'sac' va con la anotación que tiene delante
+CORPUS_VARIAS = [
+    ("10a 3b sac", (ParsedBaixa('A', 10, False), ParsedBaixa('B', 3, True))),
+    ("10A 3B SAC 2a", (ParsedBaixa('A', 10, False), ParsedBaixa('B', 3, True), ParsedBaixa('A', 2, False))),
+    ("a10b3", (ParsedBaixa('A', 10, False), ParsedBaixa('B', 3, False))),
+    ("sac 1a 2b", (ParsedBaixa('A', 1, True), ParsedBaixa('B', 2, False))),
+    ("10 a sac", (ParsedBaixa('A', 10, True),)),
+    ("10a 0b", ErrorBaixa.QUANTITAT),
+    ("10a 3c", ErrorBaixa.NAU_INVALIDA),
+    ("10a 3", ErrorBaixa.FORMAT),
+    ("10a, 3b", ErrorBaixa.CARACTERS),
+]
+
+def _pipeline_anterior(message_content: str):
+    """Reproduce las pasadas de filtrar, filtrar_nave y g_sheets antes del parser único."""
+    patron = re.compile(r"^[a-zA-Z0-9\sÑñÇç]+$", re.UNICODE)
+    if not patron.fullmatch(message_content):
+        return ErrorBaixa.CARACTERS
+
+    processed_message = message_content.strip().lower()
+    message_without_sac = processed_message.replace("sac", "").strip()
+    normalized_message = re.sub(r'\s+', ' ', message_without_sac).strip()
+    letras_encontradas = re.findall(r'[a-zñç]', normalized_message, re.UNICODE)
+    numeros_encontrados = re.findall(r'\d', normalized_message)
+    patron_permitidos_nave = re.compile(r"^[a-z0-9\sñç]+$", re.UNICODE)
+    if not patron_permitidos_nave.fullmatch(normalized_message):
+        return ErrorBaixa.CARACTERS
+    if not (len(letras_encontradas) == 1 and len(numeros_encontrados) >= 1):
+        return ErrorBaixa.FORMAT
+    if letras_encontradas[0].upper() not in NAUS:
+        return ErrorBaixa.NAU_INVALIDA
+
+    processed_message = message_content.lower()
+    sac_bool = "sac" in processed_message
+    message_for_extraction = processed_message.replace("sac", "").strip()
+    message_for_extraction = re.sub(r'\s+', '', message_for_extraction)
+    match = re.search(r'([a-zñç])(\d+)|(\d+)([a-zñç])', message_for_extraction, re.UNICODE)
+    if match.group(1):
+        nave, cantidad = match.group(1).upper(), int(match.group(2))
+    else:
+        cantidad, nave = int(match.group(3)), match.group(4).upper()
+    if cantidad < 1:
+        return ErrorBaixa.QUANTITAT
+    return ParsedBaixa(nave, cantidad, sac_bool)
+
+def comprobar_corpus() -> int:
+    errores = 0
+    for mensaje, esperado in CORPUS:
+        obtenido = parse_baixa(mensaje, NAUS)
+        if obtenido != esperado:
+            errores += 1
+            print(f"FALLO  {mensaje!r}: esperado {esperado}, obtenido {obtenido}")
+    for mensaje, esperado in CORPUS_VARIAS:
+        obtenido = parse_baixes(mensaje, NAUS)
+        if obtenido != esperado:
+            errores += 1
+            print(f"FALLO  {mensaje!r}: esperado {esperado}, obtenido {obtenido}")
+    total = len(CORPUS) + len(CORPUS_VARIAS)
+    print(f"Corpus: {total - errores}/{total} mensajes con el resultado esperado")
+    return errores
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    errores = comprobar_corpus()
+
+    mensajes = [mensaje for mensaje, _ in CORPUS]
+    for nombre, funcion in (("pipeline anterior", _pipeline_anterior), ("parse_baixa", lambda m: parse_baixa(m, NAUS)),
+                            ("parse_baixes", lambda m: parse_baixes(m, NAUS))):
+        segundos = timeit.timeit(lambda: [funcion(m) for m in mensajes], number=repeticiones)
+        ns_por_mensaje = segundos / (repeticiones * len(mensajes)) * 1e9
+        print(f"{nombre:<18} {ns_por_mensaje:8.0f} ns/mensaje")
+
+    sys.exit(1 if errores else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_sheets_service.py
+"""
+Cuenta cuántos servicios de Sheets se construyen y cuántas conexiones HTTP se abren
+por comando, con el comportamiento anterior (build en cada llamada) y con el pool compartido.
+No usa la red: las respuestas HTTP son simuladas.
+
+Uso: python -m benchmarks.bench_sheets_service
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+import httplib2
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+
+from in_telegram.g_sheets import g_autentificacion
+from in_telegram.g_sheets import buscar_data_actual
+from in_telegram.g_sheets import baixes_g_sheets
+from in_telegram.g_sheets import replica_local
+from in_telegram.comandos import baixes_diaries
+from in_telegram.utils.registre_naus import RegistroNaus
+
+NAUS = RegistroNaus(['A', 'B'])
+CHAT_ID = 1
+
+class _FakeBot:
+    async def send_message(self, chat_id, text):
+        pass
+
+class _FakeContext:
+    bot = _FakeBot()
+
+def _respuesta_simulada(uri: str, method: str):
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    if ':batchGet' in uri:
+        filas = [['01/01/00'], [hoy, '', 3, 4]]
+        body = {'valueRanges': [{'values': filas} for _ in range(uri.count('ranges='))]}
+    elif method == 'PUT' or method == 'POST':
+        body = {}
+    elif 'B7%3AB101' in uri or 'B7:B101' in uri:
+        body = {'values': [['01/01/00'], [hoy]]}
+    else:
+        body = {'values': [[3]]}
+    return httplib2.Response({'status': '200'}), json.dumps(body).encode('utf-8')
+
+def _instalar_http_falso(conexiones: set):
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        conexiones.add(id(self))
+        return _respuesta_simulada(uri, method)
+    return mock.patch.object(httplib2.Http, 'request', request)
+
+async def _informe_baja():
+    fila = await buscar_data_actual.buscar_data_actual_g_sheet('A')
+    await baixes_g_sheets._escribir_Datos_sheets('A', fila, 1, False, _FakeContext(), CHAT_ID)
+
+async def _mostrar_baixes_avui():
+    baixes_diaries._leer_bajas_diarias(NAUS)
+
+def _medir(nombre: str, comando, antiguo: bool):
+    conexiones = set()
+    builds = [0]
+    creds = AnonymousCredentials()
+
+    def build_antiguo():
+        builds[0] += 1
+        return build('sheets', 'v4', credentials=creds, static_discovery=True, cache_discovery=False)
+
+    g_autentificacion.reset_services()
+    replica_local.vaciar()
+    buscar_data_actual.invalidar_cache_fechas()
+    antes = g_autentificacion.estadisticas_conexion()
+    parches = [
+        _instalar_http_falso(conexiones),
+        mock.patch.object(g_autentificacion, '_CREDENTIALS_RO', creds),
+        mock.patch.object(g_autentificacion, '_CREDENTIALS_RW', creds),
+        mock.patch.object(g_autentificacion, '_SPREADSHEET_ID', 'bench'),
+        mock.patch.object(g_autentificacion, '_credenciales_cargadas', True), # Sin leer secrets/
+    ]
+    if antiguo:
+        for modulo in (buscar_data_actual, baixes_g_sheets, replica_local):
+            parches.append(mock.patch.object(modulo, 'get_sheets_service_ro', build_antiguo))
+        parches.append(mock.patch.object(baixes_g_sheets, 'get_sheets_service_rw', build_antiguo))
+    for p in parches:
+        p.start()
+    try:
+        inicio = time.perf_counter()
+        for _ in range(3): # Tres ejecuciones seguidas del mismo comando
+            asyncio.run(comando())
+        duracion = time.perf_counter() - inicio
+    finally:
+        for p in reversed(parches):
+            p.stop()
+
+    despues = g_autentificacion.estadisticas_conexion()
+    total_builds = builds[0] if antiguo else despues['builds'] - antes['builds']
+    modo = "antes  " if antiguo else "después"
+    print(f"{nombre:<22} {modo}  builds={total_builds:<3} conexiones={len(conexiones):<3} tiempo={duracion * 1000:.1f} ms (3 ejecuciones)")
+
+def main():
+    replica_local.REPLICA_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-"), "replica.sqlite3")
+    for nombre, comando in (("informe de baja", _informe_baja), ("/mostrar_baixes_avui", _mostrar_baixes_avui)):
+        _medir(nombre, comando, antiguo=True)
+        _medir(nombre, comando, antiguo=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_token.py
+"""
+Renovación de los tokens OAuth con credenciales simuladas (cada renovación tarda LATENCIA segundos):
+ - token caducado y varias peticiones a la vez: cuántas renovaciones se hacen y cuánto espera cada petición;
+ - con el hilo de renovación en marcha y tokens de vida corta: cuánto espera una petición como máximo.
+Los márgenes y la vida del token se escalan para que el benchmark dure unos segundos.
+
+Uso: python -m benchmarks.bench_token
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+from google.auth import _helpers, credentials
+
+from in_telegram.g_sheets import g_autentificacion
+
+LATENCIA = 0.3
+VIDA_TOKEN = 3.0
+PETICIONES_CONCURRENTES = 8
+
+class _CredencialesSimuladas(credentials.Credentials):
+    def __init__(self):
+        super().__init__()
+        self.renovaciones = 0
+
+    def refresh(self, request):
+        time.sleep(LATENCIA)
+        self.renovaciones += 1
+        self.token = f"token-{self.renovaciones}"
+        self.expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(seconds=VIDA_TOKEN)
+
+def _peticion(cred, esperas: list):
+    inicio = time.perf_counter()
+    g_autentificacion._renovar_token(cred, "peticion", g_autentificacion.MARGEN_PETICION_TOKEN)
+    esperas.append(time.perf_counter() - inicio)
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    _helpers.REFRESH_THRESHOLD = datetime.timedelta(seconds=0.2) # Margen propio de google-auth (3 min 45 s), escalado
+    g_autentificacion.MARGEN_PETICION_TOKEN = 0.5
+    g_autentificacion.MARGEN_RENOVACION_TOKEN = 1.5
+    g_autentificacion.INTERVALO_RENOVACION_TOKEN = 0.1
+
+    # 1. Token caducado: las peticiones concurrentes comparten una renovación
+    cred = _CredencialesSimuladas()
+    esperas = []
+    hilos = [threading.Thread(target=_peticion, args=(cred, esperas)) for _ in range(PETICIONES_CONCURRENTES)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    print(f"token caducado, {PETICIONES_CONCURRENTES} peticiones a la vez: {cred.renovaciones} renovación(es), "
+          f"espera máxima {max(esperas) * 1000:.0f} ms")
+
+    # 2. Hilo de renovación en marcha: las peticiones no esperan
+    rw, ro = _CredencialesSimuladas(), _CredencialesSimuladas()
+    g_autentificacion._CREDENTIALS_RW, g_autentificacion._CREDENTIALS_RO = rw, ro
+    g_autentificacion._credenciales_cargadas = True
+    g_autentificacion.iniciar_renovacion()
+    time.sleep(2 * LATENCIA + 0.1) # Primeros tokens
+
+    esperas = []
+    limite = time.perf_counter() + 4 * VIDA_TOKEN
+    while time.perf_counter() < limite:
+        for cred in (rw, ro):
+            _peticion(cred, esperas)
+        time.sleep(0.01)
+    print(f"con renovación en segundo plano durante {4 * VIDA_TOKEN:.0f} s: {rw.renovaciones + ro.renovaciones} renovaciones, "
+          f"{len(esperas)} peticiones, espera máxima {max(esperas) * 1000:.2f} ms, "
+          f"antigüedad del token {g_autentificacion.antiguedad_token():.1f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# benchmarks/bench_webhook.py
+"""
+Prueba sin red del modo webhook frente al modo polling.
+Levanta un servidor local que imita la Bot API (getMe, setWebhook, deleteWebhook, getUpdates,
+sendMessage), arranca el bot apuntando a él y mide el tiempo desde que llega una actualización
+hasta que el bot envía la respuesta. En modo webhook las actualizaciones se envían con POST al
+servidor del bot, con y sin el secret token correcto.
+
+Uso: python -m benchmarks.bench_webhook [num_actualizaciones]
+"""
+
+import asyncio
+import json
+import queue
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import inicio
+from in_telegram import verificar_uuid
+
+TOKEN = "123:bench"
+USER_ID = 4242
+SECRET = "secreto-bench"
+WEBHOOK_PORT = 18443
+API_PORT = 18081
+
+class _BotApiFalsa:
+    def __init__(self):
+        self.updates = queue.Queue()
+        self.respuestas = queue.Queue()
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                longitud = int(self.headers.get('Content-Length', 0))
+                datos = urllib.parse.parse_qs(self.rfile.read(longitud).decode('utf-8'))
+                metodo = self.path.rsplit('/', 1)[-1]
+                resultado = api.responder(metodo, {k: v[0] for k, v in datos.items()})
+                cuerpo = json.dumps({'ok': True, 'result': resultado}).encode('utf-8')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                except BrokenPipeError:
+                    pass # El bot cerró un getUpdates pendiente al detenerse
+
+            do_GET = do_POST
+
+        return Handler
+
+    def responder(self, metodo: str, datos: dict):
+        metodo = metodo.lower()
+        if metodo == 'getme':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if metodo == 'getupdates':
+            # Long polling: se devuelve en cuanto hay una actualización o al vencer el timeout
+            try:
+                return [self.updates.get(timeout=float(datos.get('timeout', 1) or 1))]
+            except queue.Empty:
+                return []
+        if metodo == 'sendmessage':
+            self.respuestas.put(time.perf_counter())
+            return {'message_id': 1, 'date': int(time.time()), 'text': datos.get('text', ''),
+                    'chat': {'id': int(datos['chat_id']), 'type': 'private'}}
+        return True
+
+def _update(update_id: int) -> dict:
+    # Cada actualización en un chat distinto para no medir el límite de 1 msg/s por chat
+    chat_id = 1000 + update_id
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': 'hola',
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'bench'},
+        },
+    }
+
+def _post_webhook(update: dict, secret: str) -> int:
+    peticion = urllib.request.Request(
+        f"http://127.0.0.1:{WEBHOOK_PORT}/telegram",
+        data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret},
+    )
+    try:
+        with urllib.request.urlopen(peticion, timeout=5) as respuesta:
+            return respuesta.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def _arrancar_bot(modo: str):
+    application = inicio.build_application(TOKEN, f"http://127.0.0.1:{API_PORT}/bot")
+    config = {'listen': '127.0.0.1', 'port': WEBHOOK_PORT, 'url_path': 'telegram',
+              'webhook_url': None, 'secret_token': SECRET, 'base_url': None}
+
+    loop = asyncio.new_event_loop()
+
+    def ejecutar():
+        asyncio.set_event_loop(loop)
+        if modo == 'webhook':
+            inicio.run_webhook(application, config, stop_signals=None, close_loop=False)
+        else:
+            application.run_polling(stop_signals=None, close_loop=False, timeout=1)
+
+    hilo = threading.Thread(target=ejecutar, daemon=True)
+    hilo.start()
+    while not application.running:
+        time.sleep(0.05)
+    time.sleep(0.3)
+    return application, hilo, loop
+
+def _detener(application, hilo, loop):
+    loop.call_soon_threadsafe(application.stop_running)
+    hilo.join(timeout=10)
+
+def _medir(api: _BotApiFalsa, modo: str, num: int) -> list:
+    application, hilo, loop = _arrancar_bot(modo)
+    latencias = []
+    try:
+        if modo == 'webhook':
+            estado = _post_webhook(_update(0), "secreto-incorrecto")
+            print(f"POST con secret token incorrecto -> HTTP {estado}")
+        for i in range(1, num + 1):
+            inicio_t = time.perf_counter()
+            if modo == 'webhook':
+                _post_webhook(_update(i), SECRET)
+            else:
+                api.updates.put(_update(i))
+            latencias.append(api.respuestas.get(timeout=10) - inicio_t)
+    finally:
+        _detener(application, hilo, loop)
+    return latencias
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    api = _BotApiFalsa()
+    servidor = ThreadingHTTPServer(('127.0.0.1', API_PORT), api.handler())
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    with mock.patch.object(verificar_uuid, '_AUTHORIZED_IDS', frozenset({USER_ID})):
+        for modo in ('polling', 'webhook'):
+            latencias = _medir(api, modo, num)
+            latencias.sort()
+            print(f"{modo:<8} actualizaciones={num} p50={statistics.median(latencias) * 1000:.1f} ms "
+                  f"max={latencias[-1] * 1000:.1f} ms")
+    servidor.shutdown()
+
+if __name__ == '__main__':
+    main()
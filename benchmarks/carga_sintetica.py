@@ -0,0 +1,155 @@
+# benchmarks/carga_sintetica.py
+"""
+Generador de carga sintética para todo el pipeline de mensajes, sin red.
+N usuarios simulados envían M informes de baja cada uno; cada informe entra por el WorkerPool de inicio
+y pasa por process_message_in_thread -> filtrar -> filtrar_nave -> g_sheets contra el backend de
+Sheets en memoria, con un bot falso que registra las respuestas.
+
+Informa de la latencia de respuesta (p50/p95/p99), llamadas a Sheets por mensaje y pico de hilos.
+
+Uso: python -m benchmarks.carga_sintetica --usuarios 20 --informes 5 --latencia-ms 80 [--prob-429 0.01] [--agrupat] [--cuota 60]
+"""
+
+import argparse
+import asyncio
+import collections
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from telegram import Update
+
+import inicio
+from in_telegram import verificar_uuid
+from in_telegram.g_sheets import g_autentificacion, cuota, baixes_g_sheets, buscar_data_actual, diario_escrituras, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils.registre_naus import naus_validas
+
+class _BotSimulado:
+    """Registra cuándo llega cada respuesta a cada chat."""
+
+    def __init__(self):
+        self.respuestas = collections.defaultdict(list) # {chat_id: [(instante, texto)]}
+        self._lock = threading.Lock()
+
+    async def send_message(self, chat_id, text):
+        with self._lock:
+            self.respuestas[chat_id].append((time.perf_counter(), text))
+
+class _ContextSimulado:
+    def __init__(self, bot):
+        self.bot = bot
+
+def _update(update_id: int, user_id: int, texto: str) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': texto,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"operari{user_id}"},
+        },
+    }, None)
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--informes', type=int, default=5, help="Informes por usuario")
+    parser.add_argument('--latencia-ms', type=float, default=80.0, help="Latencia simulada por llamada a Sheets")
+    parser.add_argument('--prob-429', type=float, default=0.0, help="Probabilidad de error 429 por llamada")
+    parser.add_argument('--pausa-ms', type=float, default=0.0, help="Pausa entre informes de un mismo usuario")
+    parser.add_argument('--agrupat', action='store_true', help="Activa la escritura agrupada")
+    parser.add_argument('--cuota', type=float, default=0.0, help="Lecturas y escrituras por minuto de la cuota de Sheets (0 = sin límite)")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    naus = naus_validas()
+    backend = FakeSheetsService(naus=naus, latencia=args.latencia_ms / 1000, prob_429=args.prob_429, semilla=1)
+    g_autentificacion.usar_sheets_simulado(backend)
+    cuota.configurar(args.cuota or 1e9, args.cuota or 1e9)
+    # Diario y réplica en un directorio temporal: cada ejecución empieza de cero
+    directorio = tempfile.mkdtemp(prefix="carga-")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    buscar_data_actual.invalidar_cache_fechas()
+    baixes_g_sheets.ESCRITURA_AGRUPADA = args.agrupat
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="bucle-principal", daemon=True).start()
+
+    bot = _BotSimulado()
+    context = _ContextSimulado(bot)
+    usuarios = [100000 + i for i in range(args.usuarios)]
+    total = args.usuarios * args.informes
+    enviados = collections.defaultdict(list) # {chat_id: [instante_envío]}
+
+    pico_hilos = [threading.active_count()]
+    parar = threading.Event()
+
+    def monitor_hilos():
+        while not parar.is_set():
+            pico_hilos[0] = max(pico_hilos[0], threading.active_count())
+            time.sleep(0.002)
+
+    threading.Thread(target=monitor_hilos, daemon=True).start()
+    rng = random.Random(2)
+
+    with mock.patch.object(verificar_uuid, '_AUTHORIZED_IDS', frozenset(usuarios)):
+        llamadas_antes = backend.total_llamadas()
+        inicio_carga = time.perf_counter()
+        update_id = 0
+        for ronda in range(args.informes):
+            for user_id in usuarios:
+                update_id += 1
+                texto = f"{rng.randint(1, 9)} {rng.choice(naus).lower()}{' sac' if rng.random() < 0.3 else ''}"
+                enviados[user_id].append(time.perf_counter())
+                aceptado = inicio.worker_pool.submit(user_id, inicio.process_message_in_thread,
+                                                     _update(update_id, user_id, texto), context, loop)
+                if not aceptado:
+                    enviados[user_id].pop()
+            if args.pausa_ms:
+                time.sleep(args.pausa_ms / 1000)
+
+        # Esperar a que todas las confirmaciones hayan llegado (pueden llegar fusionadas en un mensaje)
+        esperados = sum(len(v) for v in enviados.values())
+        limite = time.perf_counter() + args.timeout
+        while time.perf_counter() < limite:
+            recibidas = sum(texto.count('\n') + 1 for r in bot.respuestas.values() for _, texto in r)
+            if recibidas >= esperados:
+                break
+            time.sleep(0.01)
+        duracion = time.perf_counter() - inicio_carga
+        llamadas = backend.total_llamadas() - llamadas_antes
+
+    parar.set()
+
+    latencias = []
+    for chat_id, instantes in enviados.items():
+        pendientes = collections.deque(instantes)
+        for instante_respuesta, texto in bot.respuestas.get(chat_id, []):
+            for _ in range(texto.count('\n') + 1):
+                if pendientes:
+                    latencias.append(instante_respuesta - pendientes.popleft())
+
+    respondidos = len(latencias)
+    print(f"Mensajes: {total} enviados, {esperados} aceptados, {respondidos} respondidos en {duracion:.2f} s "
+          f"({respondidos / duracion:.1f} msg/s)")
+    print(f"Latencia respuesta: p50={_percentil(latencias, 50) * 1000:.0f} ms  p95={_percentil(latencias, 95) * 1000:.0f} ms  "
+          f"p99={_percentil(latencias, 99) * 1000:.0f} ms")
+    print(f"Llamadas a Sheets: {llamadas} ({llamadas / max(1, esperados):.2f} por mensaje)  {dict(backend.llamadas)}  "
+          f"errores 429 inyectados: {backend.errores_429}")
+    print(f"Pico de hilos: {pico_hilos[0]}  ·  rechazados por cola llena: {inicio.worker_pool.rejected_count()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+# benchmarks/estres_instancias.py
+"""
+Prueba de estrés con varias instancias del bot (procesos) escribiendo a la vez en la misma hoja simulada.
+Un proceso servidor (multiprocessing.managers) tiene el FakeSheetsService; cada instancia lo usa con FakeSheetsRemoto
+y recibe M informes de baixes por su WorkerPool (process_message_in_thread -> filtrar -> g_sheets), como carga_sintetica.
+Al final se comparan los totales de la hoja con la suma de lo que se envió: ningún incremento perdido ni duplicado.
+
+Modos: diari (diario compartido), directe (lectura + escritura por mensaje) y agrupat (batchUpdate cada INTERVALO_FLUSH_MS).
+Con --sense-coordinacio las instancias no se coordinan: muestra los incrementos que se pierden o se duplican.
+
+Uso: python -m benchmarks.estres_instancias [--instancies 1,2,4] [--informes 120] [--mode directe]
+                                            [--coordinacio fichero|sqlite] [--latencia-ms 50] [--naus 20] [--sense-coordinacio]
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService, PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS
+
+SPREADSHEET_ID = 'estres'
+_PREFIJOS_OK = ("Sa escrit", "Baixa registrada")
+
+class _ServidorSheets(BaseManager):
+    pass
+
+_ServidorSheets.register('FakeSheetsService', FakeSheetsService, exposed=('ejecutar_remoto', 'valor', 'total_llamadas'))
+
+class _SinCoordinacion:
+    def adquirir(self, claves, espera_maxima):
+        return None
+
+    def liberar(self, claves, testigo):
+        pass
+
+def _instancia(indice: int, hoja, directorio: str, args, barrera, resultados):
+    """Una instancia del bot en su propio proceso."""
+    import asyncio
+    from unittest import mock
+    from telegram import Update
+    import inicio
+    from in_telegram import verificar_uuid
+    from in_telegram.g_sheets import baixes_g_sheets, coordinacion, cuota, diario_escrituras, g_autentificacion, replica_local
+    from in_telegram.g_sheets.fake_sheets import FakeSheetsRemoto
+    from in_telegram.utils import granjas
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    granjas.GRANJAS_FILE = os.path.join(directorio, "granjas.json")
+    granjas.recargar(forzar=True)
+    granja = granjas.para_update(None, None)
+    g_autentificacion.usar_sheets_simulado(FakeSheetsRemoto(hoja), SPREADSHEET_ID)
+    cuota.configurar(1e9, 1e9)
+    # El diario es el mismo archivo para todas las instancias; la réplica es de cada una
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, f"replica-{indice}.sqlite3")
+    coordinacion.configurar(args.coordinacio, os.path.join(directorio, f"coordinacion-{args.coordinacio}"))
+    if args.sense_coordinacio:
+        coordinacion._backend = _SinCoordinacion()
+    baixes_g_sheets.DIARIO_ESCRITURAS = args.mode == 'diari'
+    baixes_g_sheets.ESCRITURA_AGRUPADA = args.mode == 'agrupat'
+
+    respuestas = []
+    respuestas_lock = threading.Lock()
+
+    class _Bot:
+        async def send_message(self, chat_id, text):
+            with respuestas_lock:
+                respuestas.extend(text.split('\n'))
+
+    class _Context:
+        bot = _Bot()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="bucle-principal", daemon=True).start()
+
+    naus = granja.registro.naus
+    rng = random.Random(indice)
+    usuarios = [100000 * (indice + 1) + i for i in range(16)]
+    mensajes = []
+    esperado = collections.Counter()
+    for i in range(args.informes):
+        nau, cantidad, sac = rng.choice(naus), rng.randint(1, 9), rng.random() < 0.3
+        mensajes.append((usuarios[i % len(usuarios)], f"{cantidad} {nau.lower()}{' sac' if sac else ''}"))
+        esperado[(nau, 'D' if sac else 'E')] += cantidad
+
+    def _update(update_id, user_id, texto):
+        return Update.de_json({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id, 'date': int(time.time()), 'text': texto,
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"operari{user_id}"},
+            },
+        }, None)
+
+    with mock.patch.object(verificar_uuid, '_AUTHORIZED_IDS', frozenset(usuarios)):
+        barrera.wait()
+        inicio_carga = time.time()
+        for i, (user_id, texto) in enumerate(mensajes):
+            while not inicio.worker_pool.submit(user_id, inicio.process_message_in_thread,
+                                                _update(indice * 1_000_000 + i, user_id, texto), _Context(), loop):
+                time.sleep(0.01) # Cola llena: se reintenta como haría Telegram
+        limite = time.monotonic() + args.timeout
+        while time.monotonic() < limite:
+            with respuestas_lock:
+                if len(respuestas) >= len(mensajes):
+                    break
+            time.sleep(0.01)
+        confirmado = time.time()
+        sincronizado = True
+        if args.mode == 'diari':
+            with granjas.contexto_granja(granja):
+                sincronizado = diario_escrituras.esperar_sincronizado(args.timeout)
+        fin = time.time()
+
+    errores = [r for r in respuestas if not r.startswith(_PREFIJOS_OK)]
+    resultados.put({'indice': indice, 'esperado': dict(esperado), 'respuestas': len(respuestas), 'errores': errores[:3],
+                    'n_errores': len(errores), 'inicio': inicio_carga, 'confirmado': confirmado, 'fin': fin,
+                    'sincronizado': sincronizado})
+
+def _fila_de_hoy(hoja, nau: str) -> int:
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    fechas = hoja.ejecutar_remoto('values.get', {'spreadsheetId': SPREADSHEET_ID,
+                                                 'range': f"'Nau {nau}'!B{PRIMERA_FILA_FECHAS}:B{ULTIMA_FILA_FECHAS}"})
+    for offset, fila in enumerate(fechas.get('values', [])):
+        if fila and fila[0] == hoy:
+            return PRIMERA_FILA_FECHAS + offset
+    raise RuntimeError(f"La hoja simulada no tiene la fecha {hoy}")
+
+def _ronda(n: int, args, ctx, servidor) -> dict:
+    directorio = tempfile.mkdtemp(prefix=f"estres-{n}-")
+    naus = list(string.ascii_uppercase[:args.naus])
+    with open(os.path.join(directorio, "granjas.json"), 'w', encoding='utf-8') as f:
+        json.dump({'granges': {'estres': {'spreadsheet_id': SPREADSHEET_ID, 'naus': naus}}, 'per_defecte': 'estres'}, f)
+    hoja = servidor.FakeSheetsService(naus=naus, latencia=args.latencia_ms / 1000)
+
+    barrera = ctx.Barrier(n)
+    resultados = ctx.Queue()
+    procesos = [ctx.Process(target=_instancia, args=(i, hoja, directorio, args, barrera, resultados), name=f"instancia-{i}")
+                for i in range(n)]
+    for p in procesos:
+        p.start()
+    datos = [resultados.get(timeout=args.timeout * 3) for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    esperado = collections.Counter()
+    for d in datos:
+        esperado.update({tuple(k): v for k, v in d['esperado'].items()})
+    fila = _fila_de_hoy(hoja, naus[0]) # Todas las naus de la hoja simulada tienen las mismas fechas
+    escrito = {(nau, columna): hoja.valor(nau, f"{columna}{fila}") or 0 for nau, columna in esperado}
+    diferencia = sum(escrito[c] - v for c, v in esperado.items())
+    celdas_mal = sum(1 for c, v in esperado.items() if escrito[c] != v)
+
+    inicio = min(d['inicio'] for d in datos)
+    mensajes = n * args.informes
+    return {
+        'instancias': n, 'mensajes': mensajes,
+        'confirmacion': max(d['confirmado'] for d in datos) - inicio,
+        'duracion': max(d['fin'] for d in datos) - inicio,
+        'respuestas': sum(d['respuestas'] for d in datos),
+        'errores': sum(d['n_errores'] for d in datos), 'ejemplos': [e for d in datos for e in d['errores']][:3],
+        'sincronizado': all(d['sincronizado'] for d in datos),
+        'esperado': sum(esperado.values()), 'diferencia': diferencia, 'celdas_mal': celdas_mal, 'celdas': len(esperado),
+        'llamadas': hoja.total_llamadas(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instancies', default="1,2,4", help="Número de instancias de cada ronda")
+    parser.add_argument('--informes', type=int, default=120, help="Informes por instancia")
+    parser.add_argument('--mode', choices=('diari', 'directe', 'agrupat'), default='directe')
+    parser.add_argument('--coordinacio', choices=('fichero', 'sqlite'), default='fichero')
+    parser.add_argument('--sense-coordinacio', action='store_true', help="Sin bloqueos entre instancias (muestra el problema)")
+    parser.add_argument('--latencia-ms', type=float, default=50.0, help="Latencia simulada por llamada a Sheets")
+    parser.add_argument('--naus', type=int, default=20, help="Naus de la granja (más naus, menos celdas compartidas)")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn') # Sin fork: las instancias no heredan hilos del proceso padre
+    servidor = _ServidorSheets(ctx=ctx)
+    servidor.start()
+    try:
+        coordinacion = "sin coordinación" if args.sense_coordinacio else args.coordinacio
+        print(f"Modo {args.mode}, {coordinacion}, {args.informes} informes por instancia, latencia {args.latencia_ms:.0f} ms, "
+              f"{args.naus} naus, {os.cpu_count()} CPU")
+        base = None
+        correcto = True
+        for n in (int(x) for x in args.instancies.split(',')):
+            r = _ronda(n, args, ctx, servidor)
+            rendimiento = r['mensajes'] / r['duracion']
+            base = base or rendimiento / n
+            ok = r['diferencia'] == 0 and r['celdas_mal'] == 0 and r['sincronizado'] and not r['errores']
+            correcto = correcto and ok
+            linea = (f"{n} instancias: {r['mensajes']} mensajes en {r['duracion']:.2f} s ({rendimiento:.1f} msg/s, "
+                     f"x{rendimiento / base:.2f})")
+            if args.mode == 'diari':
+                linea += f"  confirmados en {r['confirmacion']:.2f} s"
+            linea += (f"  ·  {r['llamadas']} llamadas  ·  totales: {'OK' if ok else 'ERROR'} "
+                      f"(esperado {r['esperado']}, diferencia {r['diferencia']:+d}, {r['celdas_mal']}/{r['celdas']} celdas mal)")
+            print(linea)
+            if r['errores']:
+                print(f"   {r['errores']} respuestas de error, p. ej. {r['ejemplos']}")
+    finally:
+        servidor.shutdown()
+    raise SystemExit(0 if correcto or args.sense_coordinacio else 1)
+
+if __name__ == '__main__':
+    main()
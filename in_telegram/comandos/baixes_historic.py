@@ -0,0 +1,207 @@
+# in_telegram/comandos/baixes_historic.py
+
+import logging
+import asyncio
+import datetime
+import numpy as np
+from telegram.ext import ContextTypes
+from in_telegram.g_sheets import replica_local
+from in_telegram.utils.message_sender import send_message_sync_wrapper
+from in_telegram.utils.registre_naus import registro, RegistroNaus
+
+logger = logging.getLogger(__name__)
+
+COMANDO = "/baixes_historic"
+DIES_DEFECTE = 30
+DIES_MAXIM = 366
+FINESTRA_MITJANA = 7 # Días de la media móvil
+# Un día es un pico si sube respecto al anterior al menos PICO_MINIM baixes
+# y al menos PICO_FACTOR veces la media móvil de los días previos
+PICO_MINIM = 3
+PICO_FACTOR = 1.0
+MAX_PICS_LLISTATS = 10 # Se listan los más recientes
+
+US = f"Ús: {COMANDO} [nau] [dies]. Per exemple: {COMANDO} A 60"
+
+_NAT = np.datetime64('NaT', 'D')
+_POSICIONES_DIGITOS = [0, 1, 3, 4, 6, 7, 8, 9] # dd/mm/yy(yy)
+
+def _parsear_argumentos(texto: str, registro_naus: RegistroNaus):
+    """(nau o None, dies) o None si los argumentos no son válidos."""
+    nave, dies = None, DIES_DEFECTE
+    for argumento in texto.split()[1:]:
+        if argumento.isdigit():
+            dies = int(argumento)
+            if not 1 <= dies <= DIES_MAXIM:
+                return None
+        elif argumento in registro_naus and nave is None:
+            nave = argumento.upper()
+        else:
+            return None
+    return nave, dies
+
+def _fechas(textos) -> np.ndarray:
+    """
+    Convierte fechas 'dd/mm/yy' o 'dd/mm/yyyy' a datetime64[D] sin recorrerlas una a una.
+    Lo que no es una fecha (también un día que no existe en su mes, como el 31/04) queda como NaT.
+    """
+    completos = np.asarray(textos, dtype=str)
+    longitud = np.char.str_len(completos)
+    caracteres = completos.astype('U10').view('U1').reshape(completos.shape + (10,))
+    digitos = caracteres[:, _POSICIONES_DIGITOS]
+    es_digito = (digitos >= '0') & (digitos <= '9')
+    validas = ((caracteres[:, 2] == '/') & (caracteres[:, 5] == '/') & es_digito[:, :6].all(axis=1)
+               & ((longitud == 8) | ((longitud == 10) & es_digito[:, 6:].all(axis=1))))
+    numeros = np.where(es_digito, digitos, '0').astype(np.int64)
+    dia = numeros[:, 0] * 10 + numeros[:, 1]
+    mes = numeros[:, 2] * 10 + numeros[:, 3]
+    anyo = np.where(longitud == 10, numeros[:, 4:8] @ np.array([1000, 100, 10, 1]), 2000 + numeros[:, 4] * 10 + numeros[:, 5])
+    validas &= (mes >= 1) & (mes <= 12)
+    meses = ((anyo - 1970) * 12 + np.where(validas, mes, 1) - 1).astype('datetime64[M]')
+    fechas = meses.astype('datetime64[D]') + (dia - 1)
+    # Un día fuera de su mes (00, 31/04, 29/02 de un año no bisiesto...) cae en otro mes al volver a convertirlo
+    validas &= fechas.astype('datetime64[M]') == meses
+    return np.where(validas, fechas, _NAT)
+
+def calcular(filas: list[tuple], naves: tuple, hoy: datetime.date, dies: int) -> dict:
+    """
+    Agregados de los últimos 'dies' días (hasta hoy incluido) a partir de las filas de la réplica.
+    Todo se calcula sobre matrices (nau x día), sin bucles por fila.
+    """
+    n = len(naves)
+    diario_sac = np.zeros((n, dies))
+    diario_no_sac = np.zeros((n, dies))
+    inicio = np.datetime64(hoy, 'D') - (dies - 1)
+
+    if filas:
+        col_nave, _, col_fecha, col_sac, col_no_sac = zip(*filas)
+        nombres = np.asarray(naves)
+        orden = np.argsort(nombres)
+        indice_nave = orden[np.searchsorted(nombres[orden], np.asarray(col_nave))]
+        fechas = _fechas([f or '' for f in col_fecha])
+        indice_dia = (fechas - inicio).astype(np.int64)
+        dentro = ~np.isnat(fechas) & (indice_dia >= 0) & (indice_dia < dies)
+        # add.at acumula también si una fecha aparece repetida en la hoja
+        np.add.at(diario_sac, (indice_nave[dentro], indice_dia[dentro]), np.asarray(col_sac, dtype=float)[dentro])
+        np.add.at(diario_no_sac, (indice_nave[dentro], indice_dia[dentro]), np.asarray(col_no_sac, dtype=float)[dentro])
+
+    diario = diario_sac + diario_no_sac
+
+    # Media móvil: suma de los últimos FINESTRA_MITJANA días con sumas acumuladas
+    acumulado = np.concatenate([np.zeros((n, 1)), np.cumsum(diario, axis=1)], axis=1)
+    posiciones = np.arange(1, dies + 1)
+    desde = np.maximum(posiciones - FINESTRA_MITJANA, 0)
+    media = (acumulado[:, posiciones] - acumulado[:, desde]) / (posiciones - desde)
+
+    # Picos: subida respecto al día anterior frente a la media de los días previos
+    subida = np.diff(diario, axis=1)
+    umbral = np.maximum(PICO_MINIM, PICO_FACTOR * media[:, :-1])
+    picos = np.zeros((n, dies), dtype=bool)
+    picos[:, 1:] = subida >= umbral
+
+    dias = inicio + np.arange(dies)
+    # Semanas que empiezan en lunes (el 1970-01-01 fue jueves) y meses naturales
+    semana = (dias.astype(np.int64) + 3) // 7
+    semanas, indice_semana = np.unique(semana, return_inverse=True)
+    meses, indice_mes = np.unique(dias.astype('datetime64[M]'), return_inverse=True)
+
+    def _agrupar(indice, grupos):
+        sac = np.zeros((n, grupos))
+        no_sac = np.zeros((n, grupos))
+        np.add.at(sac, (slice(None), indice), diario_sac)
+        np.add.at(no_sac, (slice(None), indice), diario_no_sac)
+        return sac, no_sac
+
+    semana_sac, semana_no_sac = _agrupar(indice_semana, len(semanas))
+    mes_sac, mes_no_sac = _agrupar(indice_mes, len(meses))
+
+    return {
+        'naves': naves,
+        'dias': dias,
+        'sac': diario_sac.sum(axis=1),
+        'no_sac': diario_no_sac.sum(axis=1),
+        'media': media[:, -1],
+        'picos': picos,
+        'diario': diario,
+        'semanas': (semanas * 7 - 3).astype('datetime64[D]'),
+        'semana_sac': semana_sac,
+        'semana_no_sac': semana_no_sac,
+        'meses': meses,
+        'mes_sac': mes_sac,
+        'mes_no_sac': mes_no_sac,
+    }
+
+def _num(valor) -> str:
+    return f"{valor:g}"
+
+def _dia(fecha: np.datetime64) -> str:
+    return fecha.astype(datetime.date).strftime("%d/%m")
+
+def _tabla(cabecera: list[str], filas: list[list[str]]) -> list[str]:
+    anchos = [max(len(fila[i]) for fila in [cabecera] + filas) for i in range(len(cabecera))]
+    return ["  ".join(celda.ljust(ancho) if i == 0 else celda.rjust(ancho) for i, (celda, ancho) in enumerate(zip(fila, anchos)))
+            for fila in [cabecera] + filas]
+
+def formatear(datos: dict, nave: str | None) -> str:
+    """Tabla por nau y, debajo, las semanas y meses de la ventana sumando las naus calculadas."""
+    naves = datos['naves']
+    dias = datos['dias']
+    lineas = []
+
+    titulo = "totes les naus" if nave is None else f"nau {nave}"
+    lineas.append(f"Baixes de {titulo}, últims {len(dias)} dies ({_dia(dias[0])} - {_dia(dias[-1])}):")
+    filas = []
+    for i in range(len(naves)):
+        sac, no_sac = datos['sac'][i], datos['no_sac'][i]
+        total = sac + no_sac
+        filas.append([naves[i], _num(sac), _num(no_sac), _num(total),
+                      f"{round(100 * sac / total)}%" if total else "-",
+                      f"{datos['media'][i]:.1f}", str(int(datos['picos'][i].sum()))])
+    lineas += _tabla(["Nau", "SAC", "NO SAC", "Total", "%SAC", f"Mitj.{FINESTRA_MITJANA}d", "Pics"], filas)
+
+    for nombre, claves, etiqueta in (("Setmanes", ('semanas', 'semana_sac', 'semana_no_sac'), _dia),
+                                     ("Mesos", ('meses', 'mes_sac', 'mes_no_sac'), lambda m: m.astype(datetime.date).strftime("%m/%y"))):
+        periodos = datos[claves[0]]
+        sac = datos[claves[1]].sum(axis=0)
+        no_sac = datos[claves[2]].sum(axis=0)
+        filas = [[etiqueta(periodos[j]), _num(sac[j]), _num(no_sac[j]), _num(sac[j] + no_sac[j])] for j in range(len(periodos))]
+        lineas.append("")
+        lineas += _tabla([nombre, "SAC", "NO SAC", "Total"], filas)
+
+    naus_pico, dias_pico = np.nonzero(datos['picos'])
+    if len(dias_pico):
+        lineas.append("")
+        lineas.append("Pics (dia anterior -> dia):")
+        recientes = np.argsort(dias_pico, kind='stable')[-MAX_PICS_LLISTATS:]
+        for i, j in zip(naus_pico[recientes], dias_pico[recientes]):
+            diario = datos['diario'][i]
+            lineas.append(f"{naves[i]} {_dia(dias[j])}: {_num(diario[j - 1])} -> {_num(diario[j])}")
+    return "\n".join(lineas)
+
+def baixes_historic(chat_id: int, context: ContextTypes.DEFAULT_TYPE, main_loop: asyncio.AbstractEventLoop, texto: str) -> None:
+    logger.info("Comando %s recibido del chat %s.", COMANDO, chat_id)
+
+    registro_naus = registro()
+    if not registro_naus.naus:
+        send_message_sync_wrapper(chat_id, context, "No se pudo cargar la lista de naves válidas. Contacta con el administrador.", main_loop)
+        return
+
+    argumentos = _parsear_argumentos(texto, registro_naus)
+    if argumentos is None:
+        send_message_sync_wrapper(chat_id, context, US, main_loop)
+        return
+    nave, dies = argumentos
+
+    # Se ejecuta en el hilo del worker: la lectura y el cálculo no bloquean el bucle de eventos
+    try:
+        replica_local.asegurar_cargada(registro_naus)
+        naves = registro_naus.naus if nave is None else (nave,)
+        datos = calcular(replica_local.filas_diarias(naves), naves, datetime.date.today(), dies)
+        mensaje = formatear(datos, nave)
+        aviso = replica_local.aviso_antiguedad()
+    except Exception as e:
+        logger.error("Error al calcular el histórico de bajas: %s", e)
+        send_message_sync_wrapper(chat_id, context, "Ha ocurrido un error al intentar calcular el histórico de bajas.", main_loop)
+        return
+
+    send_message_sync_wrapper(chat_id, context, f"{mensaje}\n\n{aviso}" if aviso else mensaje, main_loop)
@@ -1,87 +1,64 @@
 # in_telegram/comandos/baixes_totals.py
 
 import logging
-import json
-import os
 import asyncio
 from telegram.ext import ContextTypes
 
-from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_spreadsheet_id
+from in_telegram.g_sheets import replica_local
+from in_telegram.utils.message_sender import send_message_sync_wrapper, send_message_async
+from in_telegram.utils.registre_naus import registro, RegistroNaus
 
 logger = logging.getLogger(__name__)
 
-NAVE_LIST_FILE_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-    'in_telegram', 'utils', 'llista_naus.json'
-)
-
-VALID_NAVE_LETTERS = []
-try:
-    with open(NAVE_LIST_FILE_PATH, 'r', encoding='utf-8') as f:
-        loaded_letters = json.load(f)
-        if isinstance(loaded_letters, list) and all(isinstance(item, str) for item in loaded_letters):
-            VALID_NAVE_LETTERS = [letter.upper() for letter in loaded_letters] # Convertir a mayúsculas al cargar
-        else:
-            logger.error(f"El formato de '{NAVE_LIST_FILE_PATH}' es incorrecto. Debe ser una lista de cadenas de texto.")
-except FileNotFoundError:
-    logger.error(f"Archivo de lista de naves no encontrado en: {NAVE_LIST_FILE_PATH}. Asegúrate de que existe.")
-except json.JSONDecodeError:
-    logger.error(f"Error al decodificar JSON en: {NAVE_LIST_FILE_PATH}. Revisa el formato del archivo.")
-except Exception as e:
-    logger.error(f"Error inesperado al cargar la lista de naves desde {NAVE_LIST_FILE_PATH}: {e}")
-
-async def _get_cell_value_baixes(sheet_name: str, cell_range: str) -> str:
-    service = get_sheets_service_ro()
-    spreadsheet_id = get_spreadsheet_id()
-
-    if not service or not spreadsheet_id:
-        logger.error("Servicio de Google Sheets (RO) o Spreadsheet ID no cargados. No se puede leer el valor de la celda.")
-        return "Error de configuración"
-    try:
-        sheet = service.spreadsheets()
-
-        range_name = f"'{sheet_name}'!{cell_range}"
-
-        result = sheet.values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_name
-        ).execute()
-
-        values = result.get('values', [])
-        if values and values[0]:
-            return values[0][0]
-        return "0"
+# Si es True se envía un mensaje por nau (comportamiento anterior) en lugar de una sola tabla
+UN_MISSATGE_PER_NAU = False
+
+def _leer_totales(registro_naus: RegistroNaus, forzar: bool = False) -> list[tuple[str, str]]:
+    """
+    Total de bajas de todas las naus del registro desde la réplica local. Retorna [(nau, valor), ...].
+    Con forzar=True se vuelve a leer la hoja (un batchGet) antes de responder.
+    """
+    replica_local.asegurar_cargada(registro_naus, forzar)
+    return [(nave, "0" if valor is None else str(valor)) for nave, valor in replica_local.totales(registro_naus.naus)]
+
+def _formatear_tabla(totales: list[tuple[str, str]]) -> str:
+    ancho = max(len(f"Nau {nave}") for nave, _ in totales)
+    lineas = [f"{f'Nau {nave}':<{ancho}}  {valor}" for nave, valor in totales]
+    return "Total de baixes per nau:\n" + "\n".join(lineas)
+
+async def _mostrar_baixes_totals_async(chat_id: int, context: ContextTypes.DEFAULT_TYPE, totales: list[tuple[str, str]], aviso: str | None = None) -> None:
+    if not UN_MISSATGE_PER_NAU:
+        tabla = _formatear_tabla(totales)
+        await send_message_async(chat_id, context, f"{tabla}\n{aviso}" if aviso else tabla)
+        return
 
-    except Exception as e:
-        logger.error(f"Error al leer celda {cell_range} de la hoja {sheet_name}: {e}")
-        return "Error al leer"
+    for nave_letter, cell_value in totales:
+        sheet_name = f"Nau {nave_letter}"
+        mensaje_respuesta = f"El total de baixes en la {sheet_name} es de {cell_value}"
+        # No fusionables: se mantiene un mensaje por nau, el orden lo garantiza la cola de salida
+        await send_message_async(chat_id, context, mensaje_respuesta, fusionable=False)
+    if aviso:
+        await send_message_async(chat_id, context, aviso, fusionable=False)
 
 
-async def _mostrar_baixes_totals_async(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.info(f"Ejecutando lógica asíncrona para /mostrar_baixes_totals para el chat {chat_id}")
+def mostrar_baixes_totals(chat_id: int, context: ContextTypes.DEFAULT_TYPE, main_loop: asyncio.AbstractEventLoop, forzar: bool = False) -> None:
+    logger.info("Comando /mostrar_baixes_totals recibido del chat %s.", chat_id)
 
-    if not VALID_NAVE_LETTERS:
-        await context.bot.send_message(chat_id=chat_id, text="No se pudo cargar la lista de naves válidas. Contacta con el administrador.")
+    registro_naus = registro()
+    if not registro_naus.naus:
+        send_message_sync_wrapper(chat_id, context, "No se pudo cargar la lista de naves válidas. Contacta con el administrador.", main_loop)
         return
 
-    if not get_sheets_service_ro() or not get_spreadsheet_id():
-        logger.error("Servicio de Google Sheets (RO) o Spreadsheet ID no disponibles para bajas totales.")
-        await context.bot.send_message(chat_id=chat_id, text="Error interno: No se pudo conectar con Google Sheets para leer bajas totales. Contacta con el administrador.")
+    # Se ejecuta en el hilo del worker: la lectura no bloquea el bucle de eventos
+    try:
+        totales = _leer_totales(registro_naus, forzar)
+        aviso = replica_local.aviso_antiguedad()
+    except Exception as e:
+        logger.error("Error al leer las bajas totales: %s", e)
+        send_message_sync_wrapper(chat_id, context, "Error interno: No se pudo conectar con Google Sheets para leer bajas totales. Contacta con el administrador.", main_loop)
         return
 
-    for nave_letter in VALID_NAVE_LETTERS:
-        sheet_name = f"Nau {nave_letter}"
-
-        cell_value = await _get_cell_value_baixes(sheet_name, "I2")
-
-        mensaje_respuesta = f"El total de baixes en la {sheet_name} es de {cell_value}"
-        await context.bot.send_message(chat_id=chat_id, text=mensaje_respuesta)
-        await asyncio.sleep(0.1)
-
-
-def mostrar_baixes_totals(chat_id: int, context: ContextTypes.DEFAULT_TYPE, main_loop: asyncio.AbstractEventLoop) -> None:
-    logger.info(f"Comando /mostrar_baixes_totals recibido del chat {chat_id}.")
     asyncio.run_coroutine_threadsafe(
-        _mostrar_baixes_totals_async(chat_id, context),
+        _mostrar_baixes_totals_async(chat_id, context, totales, aviso),
         main_loop
-    )
\ No newline at end of file
+    )
@@ -1,17 +1,13 @@
 # in_telegram/filtrar_mensajes.py
 
 import logging
-import re
 import asyncio
 from in_telegram.comandos.baixes_diaries import bajas_diarias_handler
 from in_telegram.comandos.baixes_totals import mostrar_baixes_totals
 from in_telegram.utils.message_sender import send_message_sync_wrapper 
 from in_telegram.validadores.filtrar_nave import filtrar_nave
+from in_telegram.validadores.parser_baixes import parse_baixes, ErrorBaixa
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 def filtrar(telegram_message_update: dict, context, main_loop: asyncio.AbstractEventLoop) -> None:
@@ -21,34 +17,40 @@ def filtrar(telegram_message_update: dict, context, main_loop: asyncio.AbstractE
     try:
         message_content = telegram_message_update.get('message', {}).get('text')
 
-        print(f"Filtrando mensaje: '{message_content}' del chat {chat_id}")
+        logger.debug("Filtrando mensaje: '%s' del chat %s", message_content, chat_id)
 
         if message_content is None:
-            logger.info(f"Usuario {user_id}: El mensaje no tiene contenido de texto para filtrar.")
+            logger.info("Usuario %s: El mensaje no tiene contenido de texto para filtrar.", user_id)
             return 
         
-        patron = re.compile(r"^[a-zA-Z0-9\sÑñÇç]+$", re.UNICODE)
-                
         try:
             if message_content == "/mostrar_baixes_avui":
                 bajas_diarias_handler(chat_id, context, main_loop)
             elif message_content == "/mostrar_baixes_totals":
                 mostrar_baixes_totals(chat_id, context, main_loop)
+            elif message_content == "/refrescar_baixes_avui": # Ignora la caché de lectura
+                bajas_diarias_handler(chat_id, context, main_loop, forzar=True)
+            elif message_content == "/refrescar_baixes_totals":
+                mostrar_baixes_totals(chat_id, context, main_loop, forzar=True)
+            elif message_content.split(maxsplit=1)[:1] == ["/baixes_historic"]: # Admite nau y días como argumentos
+                # Import diferido: numpy solo se carga la primera vez que se pide el histórico
+                from in_telegram.comandos.baixes_historic import baixes_historic
+                baixes_historic(chat_id, context, main_loop, message_content)
             else:
-                if not patron.fullmatch(message_content):
-                    logger.info(f"Usuario {user_id}: Mensaje '{message_content}' NO cumple con el filtro de caracteres.")
+                # Se analiza una sola vez (una o varias anotaciones); filtrar_nave y g_sheets reciben el resultado
+                baixa = parse_baixes(message_content)
+                if baixa is ErrorBaixa.CARACTERS:
+                    logger.info("Usuario %s: Mensaje '%s' NO cumple con el filtro de caracteres.", user_id, message_content)
                     error_text = "Només s'admeten caràcters alfanumèrics."
-                    asyncio.run_coroutine_threadsafe(
-                    send_message_sync_wrapper(chat_id, context, error_text),
-                    main_loop)
+                    send_message_sync_wrapper(chat_id, context, error_text, main_loop)
                 else:
-                    logger.info(f"Usuario {user_id}: Mensaje '{message_content}' cumple con el filtro (todo ok).")
-                    filtrar_nave(telegram_message_update, context, main_loop)
+                    logger.debug("Usuario %s: Mensaje '%s' cumple con el filtro (todo ok).", user_id, message_content)
+                    filtrar_nave(telegram_message_update, context, main_loop, baixa)
             
         except Exception as send_e:
-            logger.error(f"Error al intentar enviar el mensaje de respuesta a {user_id}: {send_e}")
+            logger.error("Error al intentar enviar el mensaje de respuesta a %s: %s", user_id, send_e)
             
     except Exception as e:
-        logger.error(f"Error general en la función de filtrado para el usuario {user_id}: {e}")
+        logger.error("Error general en la función de filtrado para el usuario %s: %s", user_id, e)
 
         
\ No newline at end of file
@@ -2,21 +2,53 @@
 
 import logging
 import asyncio
-import re
 import datetime 
 import os
 from googleapiclient.errors import HttpError
-from in_telegram.validadores.llista_naus_valides import llista_naus_valides 
+from in_telegram.validadores.parser_baixes import parse_baixes, ParsedBaixa, ErrorBaixa
+from in_telegram.utils.registre_naus import registro
 from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_sheets_service_rw, get_spreadsheet_id
-from in_telegram.g_sheets.buscar_data_actual import buscar_data_actual_g_sheet
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from in_telegram.g_sheets.buscar_data_actual import buscar_data_actual_g_sheet, fila_cacheada
+from in_telegram.g_sheets.escritura_agrupada import encolar_incremento, encolar_incrementos, rango_celda, valor_numerico, CeldaNoNumerica
+from in_telegram.g_sheets import coordinacion, replica_local, diario_escrituras
+from in_telegram.g_sheets.sheets_api import ejecutar_async
+from in_telegram.g_sheets.cuota import PRIORIDAD_BAIXA
+from in_telegram.utils.message_sender import send_message_async, send_message_sync_wrapper
+from in_telegram.utils import metricas
 
 logger = logging.getLogger(__name__)
 
+# Si es True, la baixa se guarda en el diario local (SQLite), se confirma al momento y un hilo la aplica en la hoja.
+# Si es False, se escribe en la hoja antes de contestar (con ESCRITURA_AGRUPADA, agrupada cada INTERVALO_FLUSH_MS).
+DIARIO_ESCRITURAS = True
+# Si es True, los incrementos se agrupan y se escriben cada INTERVALO_FLUSH_MS con un único batchUpdate
+ESCRITURA_AGRUPADA = False
+
+async def _registrar_en_diario(nave: str, cantidad: int, sac_bool: bool, fecha_actual: str, context, chat_id, update_id) -> None:
+    target_column = 'D' if sac_bool else 'E'
+    # Si la fila de hoy ya está en caché se guarda; si no, la busca el sincronizador. No se espera a la API.
+    fila = fila_cacheada(nave)
+
+    # Las entradas que no se puedan aplicar (fecha inexistente, celda no numérica) se avisan a este chat
+    main_loop = asyncio.get_running_loop()
+    notificar = lambda chat, texto: send_message_sync_wrapper(chat, context, texto, main_loop)
+    try:
+        id_entrada = await asyncio.to_thread(
+            diario_escrituras.registrar, nave, fecha_actual, target_column, cantidad, fila, chat_id, update_id, notificar=notificar
+        )
+    except Exception as e:
+        logger.error("Error al guardar la baixa en el diario local: %s", e)
+        await send_message_async(chat_id, context, "Hi ha hagut un error inesperat al intentar registrar les dades.")
+        return
+
+    if id_entrada is None:
+        logger.info("Update %s ya estaba en el diario (reentrega). No se duplica.", update_id)
+    else:
+        logger.info("Baixa registrada en el diario (%s): Nau %s %s%s +%s", id_entrada, nave, target_column,
+                    fila if fila is not None else "?", cantidad, extra={'auditoria': True})
+    tipo = "SAC" if sac_bool else "NO SAC"
+    await send_message_async(chat_id, context, f"Baixa registrada: {cantidad} {tipo} a la nau {nave}. S'anotarà al full de càlcul en breu.")
+
 async def _escribir_Datos_sheets(nave: str, posicion_fecha: int, cantidad: int, sac_bool: bool, context,chat_id) -> None:  
     try:
         service_rw = get_sheets_service_rw()
@@ -25,7 +57,7 @@ async def _escribir_Datos_sheets(nave: str, posicion_fecha: int, cantidad: int,
 
         if not service_rw or not service_ro or not spreadsheet_id:
             logger.error("Servicio de Google Sheets (RW/RO) o Spreadsheet ID no disponibles. No se puede escribir.")
-            await context.bot.send_message(chat_id=chat_id, text="Error interno: No se pudo conectar con Google Sheets para escribir. Contacta con el administrador.")
+            await send_message_async(chat_id, context, "Error interno: No se pudo conectar con Google Sheets para escribir. Contacta con el administrador.")
             return
     
         target_row = posicion_fecha
@@ -39,65 +71,241 @@ async def _escribir_Datos_sheets(nave: str, posicion_fecha: int, cantidad: int,
         sheet_name_full = f"Nau {nave}"
         cell_range = f"'{sheet_name_full}'!{target_column}{target_row}"
         
-        logger.info(f"Leyendo el valor actual de la celda: {cell_range}")
-        result_read = service_ro.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=cell_range,
-            valueRenderOption='UNFORMATTED_VALUE' #Importante para obtener el valor numérico sin formato
-        ).execute()
-
-        current_value = 0
-
-        if 'values' in result_read and result_read['values']:
+        if ESCRITURA_AGRUPADA:
+            # El incremento se suma en memoria y se vuelca junto con los demás en un batchUpdate
             try:
-                # La API devuelve lista de listas, si hay un valor, será [[valor]]
-                current_value_str = str(result_read['values'][0][0]).strip()
-                if current_value_str: # Solo intenta convertir si no está vacío
-                    current_value = int(float(current_value_str)) # Convertir a float primero para manejar posibles decimales o enteros grandes, luego a int
-                logger.info(f"Valor actual leído de {cell_range}: '{current_value_str}' (convertido a {current_value})")
-            except ValueError as ve:
-                logger.warning(f"La celda {cell_range} contiene un valor no numérico '{current_value_str}'. Se asumirá 0 para la suma. Error: {ve}")
-                await context.bot.send_message(chat_id=chat_id, text=f"Error: La celda de la fulla de càlcul '{cell_range}' conté un valor no numèric. No es pot sumar.")
+                current_value, new_total = await asyncio.wrap_future(
+                    encolar_incremento(nave, target_column, target_row, cantidad)
+                )
+            except CeldaNoNumerica as err:
+                logger.warning("%s. No se puede sumar.", err)
+                await send_message_async(chat_id, context, f"Error: La celda de la fulla de càlcul '{cell_range}' conté un valor no numèric. No es pot sumar.")
                 return
-            
         else:
-            logger.info(f"La celda {cell_range} está vacía. Se asumirá 0 para la suma.")
+            # Leer y escribir con la celda bloqueada: otro hilo u otra instancia del bot no puede sumar en medio
+            async with coordinacion.bloquear([coordinacion.clave_celda(spreadsheet_id, nave, target_column, target_row)]):
+                logger.debug("Leyendo el valor actual de la celda: %s", cell_range)
+                with metricas.medir_etapa(metricas.ETAPA_LECTURA_CELDA):
+                    result_read = await ejecutar_async(service_ro.spreadsheets().values().get(
+                        spreadsheetId=spreadsheet_id,
+                        range=cell_range,
+                        valueRenderOption='UNFORMATTED_VALUE' #Importante para obtener el valor numérico sin formato
+                    ), prioridad=PRIORIDAD_BAIXA)
+
+                current_value = 0
+
+                if 'values' in result_read and result_read['values']:
+                    try:
+                        # La API devuelve lista de listas, si hay un valor, será [[valor]]
+                        current_value_str = str(result_read['values'][0][0]).strip()
+                        if current_value_str: # Solo intenta convertir si no está vacío
+                            current_value = int(float(current_value_str)) # Convertir a float primero para manejar posibles decimales o enteros grandes, luego a int
+                        logger.debug("Valor actual leído de %s: '%s' (convertido a %s)", cell_range, current_value_str, current_value)
+                    except ValueError as ve:
+                        logger.warning("La celda %s contiene un valor no numérico '%s'. Se asumirá 0 para la suma. Error: %s", cell_range, current_value_str, ve)
+                        await send_message_async(chat_id, context, f"Error: La celda de la fulla de càlcul '{cell_range}' conté un valor no numèric. No es pot sumar.")
+                        return
+            
+                else:
+                    logger.debug("La celda %s está vacía. Se asumirá 0 para la suma.", cell_range)
 
-        new_total = current_value + cantidad
-        logger.info(f"Nuevo total a escribir en {cell_range}: {new_total} (Actual: {current_value} + A sumar: {cantidad})")
+                new_total = current_value + cantidad
+                logger.debug("Nuevo total a escribir en %s: %s (Actual: %s + A sumar: %s)", cell_range, new_total, current_value, cantidad)
 
 
-        # Preparar el valor a escribir
-        body = {
-            'values': [[new_total]]
-        }
+                # Preparar el valor a escribir
+                body = {
+                    'values': [[new_total]]
+                }
 
-        # Escribir el valor en la celda
-        result = service_rw.spreadsheets().values().update( 
-            spreadsheetId=spreadsheet_id,
-            range=cell_range,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+                # Escribir el valor en la celda
+                with metricas.medir_etapa(metricas.ETAPA_ESCRITURA_CELDA):
+                    result = await ejecutar_async(service_rw.spreadsheets().values().update( 
+                        spreadsheetId=spreadsheet_id,
+                        range=cell_range,
+                        valueInputOption='RAW',
+                        body=body
+                    ), prioridad=PRIORIDAD_BAIXA)
 
-        logger.info(f"Datos escritos exitosamente: {result}")
-        logger.info(f"Se escribió {cantidad} en la celda {cell_range}")
+                logger.debug("Datos escritos exitosamente: %s", result)
+
+                # La réplica local queda con el valor recién escrito (SQLite: fuera del bucle de eventos)
+                await asyncio.to_thread(replica_local.guardar_celda, nave, target_column, target_row, new_total, cantidad)
+
+        # Registro de auditoría: se escribe siempre, aunque se muestreen los INFO
+        logger.info("Baixa escrita a %s: %s -> %s (+%s)%s", cell_range, current_value, new_total, cantidad,
+                    " (agrupada)" if ESCRITURA_AGRUPADA else "", extra={'auditoria': True})
 
         message = f"Sa escrit de forma satisfactòria, el antic valor era {current_value} i el nou valor és {new_total}"
-        await context.bot.send_message(chat_id=chat_id, text=message)
+        await send_message_async(chat_id, context, message)
         
+    except coordinacion.BloqueoOcupado as err:
+        logger.error("No se pudo bloquear la celda para escribir: %s", err)
+        await send_message_async(chat_id, context, "La cel·la està ocupada per una altra escriptura. Torna a enviar el missatge d'aquí uns segons.")
     except HttpError as err:
         error_details = err.error_details if hasattr(err, 'error_details') else str(err)
-        logger.error(f"Error de la API de Google Sheets al intentar escribir: {err.resp.status} - {error_details}")
-        await context.bot.send_message(chat_id=chat_id, text=f"Hi ha hagut un error amb la comunicació del full de dades: {err.resp.status}")
+        logger.error("Error de la API de Google Sheets al intentar escribir: %s - %s", err.resp.status, error_details)
+        await send_message_async(chat_id, context, f"Hi ha hagut un error amb la comunicació del full de dades: {err.resp.status}")
     except FileNotFoundError as err:
-        logger.critical(f"Error crítico: Archivo de credenciales no encontrado para escritura: {err}")
+        logger.critical("Error crítico: Archivo de credenciales no encontrado para escritura: %s", err)
         raise
     except Exception as e:
-        logger.error(f"Error inesperado al intentar escribir los datos en Google Sheets: {e}")
-        await context.bot.send_message(chat_id=chat_id, text=f"Hi ha hagut un error inesperat al intentar escriure les dades.")
+        logger.error("Error inesperado al intentar escribir los datos en Google Sheets: %s", e)
+        await send_message_async(chat_id, context, f"Hi ha hagut un error inesperat al intentar escriure les dades.")
+
+def _describir(baixa: ParsedBaixa) -> str:
+    return f"{baixa.cantidad} {'SAC' if baixa.sac else 'NO SAC'} a la nau {baixa.nave}"
+
+def _enumerar(partes: list) -> str:
+    """'a', 'a i b', 'a, b i c'"""
+    return partes[0] if len(partes) == 1 else f"{', '.join(partes[:-1])} i {partes[-1]}"
+
+async def _registrar_varias_en_diario(baixes: tuple, fecha_actual: str, context, chat_id, update_id) -> None:
+    """Todas las anotaciones del mensaje en una transacción del diario (mismo update_id, indice 0, 1, 2...)."""
+    entradas = [(b.nave, fecha_actual, 'D' if b.sac else 'E', b.cantidad, fila_cacheada(b.nave)) for b in baixes]
+
+    main_loop = asyncio.get_running_loop()
+    notificar = lambda chat, texto: send_message_sync_wrapper(chat, context, texto, main_loop)
+    try:
+        ids = await asyncio.to_thread(diario_escrituras.registrar_varias, entradas, chat_id, update_id, notificar=notificar)
+    except Exception as e:
+        logger.error("Error al guardar las baixes en el diario local: %s", e)
+        await send_message_async(chat_id, context, "Hi ha hagut un error inesperat al intentar registrar les dades.")
+        return
+
+    if ids is None:
+        logger.info("Update %s ya estaba en el diario (reentrega). No se duplica.", update_id)
+    else:
+        for id_entrada, (nave, _, columna, cantidad, fila) in zip(ids, entradas):
+            logger.info("Baixa registrada en el diario (%s): Nau %s %s%s +%s", id_entrada, nave, columna,
+                        fila if fila is not None else "?", cantidad, extra={'auditoria': True})
+    await send_message_async(chat_id, context, f"Baixes registrades: {_enumerar([_describir(b) for b in baixes])}. "
+                                               f"S'anotaran al full de càlcul en breu.")
+
+async def _escribir_varias_sheets(baixes: tuple, filas: dict, context, chat_id) -> None:
+    """
+    Suma todas las anotaciones de un mensaje con una lectura y una escritura: un batchGet de las celdas
+    afectadas y un batchUpdate (o la cola de escritura agrupada). Responde con un único resumen.
+    """
+    # Incremento total por celda; dos anotaciones de la misma nau y tipo van a la misma celda
+    incrementos = {}
+    for b in baixes:
+        celda = (b.nave, 'D' if b.sac else 'E', filas[b.nave])
+        incrementos[celda] = incrementos.get(celda, 0) + b.cantidad
+    celdas = list(incrementos)
+    rangos = [rango_celda(*celda) for celda in celdas]
+
+    try:
+        service_rw = get_sheets_service_rw()
+        service_ro = get_sheets_service_ro()
+        spreadsheet_id = get_spreadsheet_id()
+
+        if not service_rw or not service_ro or not spreadsheet_id:
+            logger.error("Servicio de Google Sheets (RW/RO) o Spreadsheet ID no disponibles. No se puede escribir.")
+            await send_message_async(chat_id, context, "Error interno: No se pudo conectar con Google Sheets para escribir. Contacta con el administrador.")
+            return
+
+        if ESCRITURA_AGRUPADA:
+            # El mensaje entra en la cola como una unidad: el batchUpdate aplica todas sus celdas o ninguna
+            try:
+                por_celda = await asyncio.wrap_future(encolar_incrementos(incrementos))
+            except CeldaNoNumerica as err:
+                logger.warning("%s. No se escribe ninguna de las %s anotaciones del mensaje.", err, len(baixes))
+                await send_message_async(chat_id, context, f"Error: La celda de la fulla de càlcul '{err.cell_range}' conté un valor no numèric. No es pot sumar.")
+                return
+            resultados = [por_celda[celda] for celda in celdas]
+        else:
+            # Todas las celdas bloqueadas entre la lectura y la escritura
+            async with coordinacion.bloquear([coordinacion.clave_celda(spreadsheet_id, *celda) for celda in celdas]):
+                with metricas.medir_etapa(metricas.ETAPA_LECTURA_CELDA):
+                    result_read = await ejecutar_async(service_ro.spreadsheets().values().batchGet(
+                        spreadsheetId=spreadsheet_id,
+                        ranges=rangos,
+                        valueRenderOption='UNFORMATTED_VALUE'
+                    ), prioridad=PRIORIDAD_BAIXA)
+                value_ranges = result_read.get('valueRanges', [])
+
+                resultados = []
+                for i, celda in enumerate(celdas):
+                    values = value_ranges[i].get('values', []) if i < len(value_ranges) else []
+                    try:
+                        actual = valor_numerico(values, rangos[i])
+                    except CeldaNoNumerica as err:
+                        # Se validan juntas: si una celda no se puede sumar no se escribe ninguna
+                        logger.warning("%s. No se escribe ninguna de las %s anotaciones del mensaje.", err, len(baixes))
+                        await send_message_async(chat_id, context, f"Error: La celda de la fulla de càlcul '{rangos[i]}' conté un valor no numèric. No es pot sumar.")
+                        return
+                    resultados.append((actual, actual + incrementos[celda]))
+
+                with metricas.medir_etapa(metricas.ETAPA_ESCRITURA_CELDA):
+                    await ejecutar_async(service_rw.spreadsheets().values().batchUpdate(
+                        spreadsheetId=spreadsheet_id,
+                        body={'valueInputOption': 'RAW',
+                              'data': [{'range': r, 'values': [[nuevo]]} for r, (_, nuevo) in zip(rangos, resultados)]}
+                    ), prioridad=PRIORIDAD_BAIXA)
+
+                # La réplica local queda con los valores recién escritos (SQLite: fuera del bucle de eventos)
+                await asyncio.to_thread(replica_local.guardar_celdas,
+                                        [(*celda, nuevo, incrementos[celda]) for celda, (_, nuevo) in zip(celdas, resultados)])
+
+        lineas = []
+        for celda, cell_range, (antiguo, nuevo) in zip(celdas, rangos, resultados):
+            # Registro de auditoría: se escribe siempre, aunque se muestreen los INFO
+            logger.info("Baixa escrita a %s: %s -> %s (+%s)%s", cell_range, antiguo, nuevo, incrementos[celda],
+                        " (agrupada)" if ESCRITURA_AGRUPADA else "", extra={'auditoria': True})
+            nave, columna, _ = celda
+            lineas.append(f"Nau {nave} {'SAC' if columna == 'D' else 'NO SAC'}: de {antiguo} a {nuevo}")
+        logger.info("%s anotaciones de un mensaje escritas en %s celdas.", len(baixes), len(celdas))
+
+        await send_message_async(chat_id, context, "S'han escrit les baixes de forma satisfactòria.\n" + "\n".join(lineas))
+
+    except coordinacion.BloqueoOcupado as err:
+        logger.error("No se pudieron bloquear las celdas para escribir: %s", err)
+        await send_message_async(chat_id, context, "La cel·la està ocupada per una altra escriptura. Torna a enviar el missatge d'aquí uns segons.")
+    except HttpError as err:
+        error_details = err.error_details if hasattr(err, 'error_details') else str(err)
+        logger.error("Error de la API de Google Sheets al intentar escribir: %s - %s", err.resp.status, error_details)
+        await send_message_async(chat_id, context, f"Hi ha hagut un error amb la comunicació del full de dades: {err.resp.status}")
+    except Exception as e:
+        logger.error("Error inesperado al intentar escribir los datos en Google Sheets: %s", e)
+        await send_message_async(chat_id, context, "Hi ha hagut un error inesperat al intentar escriure les dades.")
+
+async def _avisar_error_g_sheets(e: Exception, context, chat_id) -> None:
+    """Registra y avisa al chat de un error al buscar la fecha o escribir las baixes de un mensaje."""
+    if isinstance(e, HttpError):
+        error_message = f"Error de la API de Google Sheets: {e.resp.status} - {e.error_details if hasattr(e, 'error_details') else str(e)}"
+        logger.error(error_message)
+        await send_message_async(chat_id, context, f"Hi ha hagut un error al accedir al full de dades: {e.resp.status}")
+    else:
+        error_message = f"Error inesperado en g_sheets: {e}"
+        logger.error(error_message)
+        await send_message_async(chat_id, context, "Hi ha hagut un error inesperat amb la comunicació del full de dades.")
+
+async def _g_sheets_varias(baixes: tuple, fecha_actual: str, context, chat_id, update_id) -> None:
+    logger.debug("Mensaje con %s anotaciones: %s", len(baixes), baixes)
+
+    if DIARIO_ESCRITURAS:
+        await _registrar_varias_en_diario(baixes, fecha_actual, context, chat_id, update_id)
+        return
 
-async def g_sheets(telegram_message_update: dict, context, main_loop: asyncio.AbstractEventLoop) -> None:
+    try:
+        # Con la caché de fechas vacía, todas las naus se cargan con una sola lectura compartida
+        naves = list(dict.fromkeys(b.nave for b in baixes))
+        with metricas.medir_etapa(metricas.ETAPA_BUSQUEDA_FECHA):
+            posiciones = await asyncio.gather(*(buscar_data_actual_g_sheet(nave) for nave in naves))
+        filas = dict(zip(naves, posiciones))
+        sin_fecha = [nave for nave, fila in filas.items() if fila is None]
+        if sin_fecha:
+            logger.error("La fecha actual '%s' no se encontró en los datos de la hoja de cálculo para las naus %s.", fecha_actual, sin_fecha)
+            await send_message_async(chat_id, context, f"La data actual '{fecha_actual}' no s'ha trobat dins de la fulla de càlcul.")
+            return
+
+        await _escribir_varias_sheets(baixes, filas, context, chat_id)
+
+    except Exception as e:
+        await _avisar_error_g_sheets(e, context, chat_id)
+
+async def g_sheets(telegram_message_update: dict, context, main_loop: asyncio.AbstractEventLoop, baixa: ParsedBaixa | tuple | ErrorBaixa | None = None) -> None:
     user_id = telegram_message_update.get('effective_user', {}).get('id', 'N/A')
     chat_id = telegram_message_update.get('message', {}).get('chat', {}).get('id')
     message_content = telegram_message_update.get('message', {}).get('text')
@@ -105,67 +313,47 @@ async def g_sheets(telegram_message_update: dict, context, main_loop: asyncio.Ab
     #Extraer la fecha actual en formato "dd/mm/yy" 
     # Usamos datetime para obtener la fecha de hoy
     fecha_actual = datetime.date.today().strftime("%d/%m/%y")
-    logger.info(f"Fecha actual extraída: {fecha_actual}")
-
-    #Determinar si 'sac' está presente (sac_bool)
-    # Convertimos el mensaje a minúsculas para una comparación sin distinción de mayúsculas
-    processed_message = message_content.lower()
-    sac_bool = "sac" in processed_message
-    logger.info(f"'sac' presente en el mensaje: {sac_bool}")
-
-    #Extraer cantidad (el número) y nave (la letra)
-    message_for_extraction = processed_message.replace("sac", "").strip()
-    message_for_extraction = re.sub(r'\s+', '', message_for_extraction)
-
-    cantidad = None
-    nave = None
-
-    match = re.search(r'([a-zñç])(\d+)|(\d+)([a-zñç])', message_for_extraction, re.UNICODE)
-
-    if match:
-        if match.group(1): # Coincide con el patrón de letra-número (ej. "a1")
-            nave = match.group(1).upper()
-            cantidad = int(match.group(2))
-        elif match.group(3): # Coincide con el patrón de número-letra (ej. "1a")
-            cantidad = int(match.group(3))
-            nave = match.group(4).upper() 
-    
-    logger.info(f"Cantidad extraída: {cantidad}")
-    logger.info(f"Nave extraída: {nave}")
+    logger.debug("Fecha actual extraída: %s", fecha_actual)
 
-    if cantidad is None or cantidad < 1:
+    # El texto ya viene analizado desde filtrar; solo se analiza aquí si se llama directamente
+    if baixa is None:
+        baixa = parse_baixes(message_content)
+
+    if baixa is ErrorBaixa.QUANTITAT or baixa is ErrorBaixa.FORMAT or baixa is ErrorBaixa.CARACTERS:
         error_msg = "El nombre de baixes ha de ser igual o superior a 1 i el format ha de ser correcte (ex: 'A10' o '10A')."
         logger.info(error_msg)
-        await context.bot.send_message(chat_id=chat_id, text=error_msg)
+        await send_message_async(chat_id, context, error_msg)
         return
 
-    if nave is None:
-        error_msg = "Error: No se pudo extraer la letra de la nave del mensaje. Assegura't que el format sigui correcte."
-        logger.error(error_msg)
-        await context.bot.send_message(chat_id=chat_id, text=error_msg)
+    if baixa is ErrorBaixa.NAU_INVALIDA:
+        error_msg = f"La nau indicada no està dins del rang de naus vàlides ({', '.join(registro().naus)})."
+        logger.warning(error_msg)
+        await send_message_async(chat_id, context, error_msg)
         return
 
-    if not llista_naus_valides(nave):
-        error_msg = f"La nau {nave} no està dins del rang de naus vàlides (A o B)."
-        logger.warning(error_msg)
-        await context.bot.send_message(chat_id=chat_id, text=error_msg)
+    if isinstance(baixa, tuple):
+        if len(baixa) > 1:
+            await _g_sheets_varias(baixa, fecha_actual, context, chat_id, telegram_message_update.get('update_id'))
+            return
+        baixa = baixa[0]
+
+    nave, cantidad, sac_bool = baixa.nave, baixa.cantidad, baixa.sac
+    logger.debug("Baixa analizada: nave=%s, cantidad=%s, sac=%s", nave, cantidad, sac_bool)
+
+    if DIARIO_ESCRITURAS:
+        await _registrar_en_diario(nave, cantidad, sac_bool, fecha_actual, context, chat_id, telegram_message_update.get('update_id'))
         return
 
     try:
         # Definir el rango de fechas para leer (ahora sin _get_sheet_config)
-        posicion_fecha = await buscar_data_actual_g_sheet(nave)
+        with metricas.medir_etapa(metricas.ETAPA_BUSQUEDA_FECHA):
+            posicion_fecha = await buscar_data_actual_g_sheet(nave)
         if posicion_fecha is None:
-            logger.error(f"La fecha actual '{fecha_actual}' no se encontró en los datos de la hoja de cálculo para Nau {nave}.")
-            await context.bot.send_message(chat_id=chat_id, text=f"La data actual '{fecha_actual}' no s'ha trobat dins de la fulla de càlcul.")
+            logger.error("La fecha actual '%s' no se encontró en los datos de la hoja de cálculo para Nau %s.", fecha_actual, nave)
+            await send_message_async(chat_id, context, f"La data actual '{fecha_actual}' no s'ha trobat dins de la fulla de càlcul.")
             return
         
         await _escribir_Datos_sheets(nave, posicion_fecha, cantidad, sac_bool, context, chat_id)
 
-    except HttpError as err:
-        error_message = f"Error de la API de Google Sheets: {err.resp.status} - {err.error_details if hasattr(err, 'error_details') else str(err)}"
-        logger.error(error_message)
-        await context.bot.send_message(chat_id=chat_id, text=f"Hi ha hagut un error al accedir al full de dades: {err.resp.status}")
     except Exception as e:
-        error_message = f"Error inesperado en g_sheets: {e}"
-        logger.error(error_message)
-        await context.bot.send_message(chat_id=chat_id, text=f"Hi ha hagut un error inesperat amb la comunicació del full de dades.")
\ No newline at end of file
+        await _avisar_error_g_sheets(e, context, chat_id)
\ No newline at end of file
@@ -1,26 +1,117 @@
 # in_telegram/g_sheets/buscar_data_actual.py
 
 import logging
+import asyncio
 import datetime
+import threading
 from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_spreadsheet_id
+from in_telegram.g_sheets.sheets_api import ejecutar_async
+from in_telegram.g_sheets.cuota import PRIORIDAD_BAIXA
+from in_telegram.utils import granjas
+from in_telegram.utils.registre_naus import registro, RANGO_FECHAS
 
 logger = logging.getLogger(__name__)
 
+# Caché por granja {granja: {(nau, fecha): fila}}. Solo guarda las entradas del día actual: al cambiar de día se vacía.
+_cache_filas = {}
+_cache_fecha = {} # {granja: fecha de las entradas guardadas}
+_cache_lock = threading.Lock()
+# Carga completa en curso por granja y fecha ({(granja, fecha): Task}): los mensajes que llegan mientras tanto
+# la esperan en lugar de repetirla
+_cargas_en_curso = {}
+
 def _num_data(api_dates: list[list[str]], current_date_str: str) -> int | None:
     flattened_dates = [date_item for sublist in api_dates for date_item in sublist]
 
     try:
         position_zero_based = flattened_dates.index(current_date_str)
-        logger.info(f"Fecha '{current_date_str}' encontrada en la posición: {position_zero_based}")
+        logger.debug("Fecha '%s' encontrada en la posición: %s", current_date_str, position_zero_based)
         return position_zero_based + 6
     except ValueError:
-        logger.warning(f"La fecha '{current_date_str}' no se encontró en los datos de la API.")
+        logger.warning("La fecha '%s' no se encontró en los datos de la API.", current_date_str)
         return None
     except Exception as e:
-        logger.error(f"Error inesperado en _num_data al buscar la fecha: {e}")
+        logger.error("Error inesperado en _num_data al buscar la fecha: %s", e)
+        return None
+
+def _fila_de_fecha(api_dates: list[list[str]], current_date_str: str) -> int | None:
+    posicion = _num_data(api_dates, current_date_str)
+    if posicion is None:
         return None
+    return posicion + 1
+
+def _rango_fechas(nave_letter: str) -> str:
+    rango = registro().rangos_fechas.get(nave_letter)
+    return rango if rango is not None else f"'Nau {nave_letter}'!{RANGO_FECHAS}"
+
+def invalidar_cache_fechas(nave_letter: str | None = None) -> None:
+    """
+    Descarta la fila cacheada de una nau de la granja en curso (o de todas si no se indica).
+    Hay que llamarla si alguien modifica la columna de fechas durante el día.
+    """
+    granja = granjas.actual().nombre
+    with _cache_lock:
+        if nave_letter is None:
+            _cache_filas.pop(granja, None)
+            _cache_fecha.pop(granja, None)
+        else:
+            cache = _cache_filas.get(granja, {})
+            for clave in [clave for clave in cache if clave[0] == nave_letter.upper()]:
+                del cache[clave]
+
+def _cache_de_hoy(granja: str, fecha_actual: str) -> dict:
+    """Caché de la granja para la fecha indicada, vaciada si era de otro día. Hay que llamarla con _cache_lock adquirido."""
+    if _cache_fecha.get(granja) != fecha_actual:
+        _cache_filas[granja] = {}
+        _cache_fecha[granja] = fecha_actual
+    return _cache_filas[granja]
+
+async def _cargar_cache_fechas(service_ro, spreadsheet_id: str, fecha_actual: str, naves: list[str]) -> None:
+    """Lee la columna de fechas de todas las naus con un solo batchGet y guarda la fila de hoy."""
+    rangos = [_rango_fechas(nave) for nave in naves]
+    logger.info("Cargando filas de la fecha %s para las naus %s con un batchGet.", fecha_actual, naves)
+    result = await ejecutar_async(service_ro.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id, ranges=rangos
+    ), prioridad=PRIORIDAD_BAIXA)
+
+    nuevas = {}
+    for nave, value_range in zip(naves, result.get('valueRanges', [])):
+        fila = _fila_de_fecha(value_range.get('values', []), fecha_actual)
+        if fila is not None:
+            nuevas[(nave, fecha_actual)] = fila
+
+    granja = granjas.actual().nombre
+    with _cache_lock:
+        _cache_de_hoy(granja, fecha_actual).update(nuevas)
+
+def guardar_fila_fecha(nave_letter: str, fecha_actual: str, fila: int) -> None:
+    """Permite a otros lectores (p. ej. el informe diario) alimentar la caché con una fila ya conocida."""
+    granja = granjas.actual().nombre
+    with _cache_lock:
+        _cache_de_hoy(granja, fecha_actual)[(nave_letter.upper(), fecha_actual)] = fila
+
+def fila_cacheada(nave_letter: str) -> int | None:
+    """Fila de hoy para la nau de la granja en curso si ya está en caché (no accede a la red)."""
+    fecha_actual = datetime.date.today().strftime("%d/%m/%y")
+    granja = granjas.actual().nombre
+    with _cache_lock:
+        if _cache_fecha.get(granja) != fecha_actual:
+            return None
+        return _cache_filas[granja].get((nave_letter.upper(), fecha_actual))
 
 async def buscar_data_actual_g_sheet(nave_letter: str) -> int | None:
+    nave_letter = nave_letter.upper()
+    fecha_actual = datetime.date.today().strftime("%d/%m/%y")
+    granja = granjas.actual().nombre
+
+    with _cache_lock:
+        # Caduca a medianoche local: la fecha forma parte de la clave
+        primera_carga = _cache_fecha.get(granja) != fecha_actual
+        fila_cacheada = None if primera_carga else _cache_filas[granja].get((nave_letter, fecha_actual))
+
+    if fila_cacheada is not None:
+        return fila_cacheada
+
     service_ro = get_sheets_service_ro()
     spreadsheet_id = get_spreadsheet_id()
 
@@ -28,34 +119,50 @@ async def buscar_data_actual_g_sheet(nave_letter: str) -> int | None:
         logger.error("Servicio de Google Sheets (RO) o Spreadsheet ID no disponibles. No se puede buscar la fecha actual.")
         return None
 
-    fecha_actual = datetime.date.today().strftime("%d/%m/%y")
-    logger.info(f"Buscando fecha actual: {fecha_actual} para Nau {nave_letter}")
+    logger.debug("Buscando fecha actual: %s para Nau %s", fecha_actual, nave_letter)
 
     try:
-        sheet_name_full = f"Nau {nave_letter}"
-        data_range = "B7:B101" # Rango donde se encuentran las fechas
-        range_to_read = f"'{sheet_name_full}'!{data_range}"
+        if primera_carga:
+            clave_carga = (granja, fecha_actual)
+            carga = _cargas_en_curso.get(clave_carga)
+            if carga is None or carga.get_loop() is not asyncio.get_running_loop():
+                naves = list(registro().naus)
+                if nave_letter not in naves:
+                    naves.append(nave_letter)
+                carga = asyncio.ensure_future(_cargar_cache_fechas(service_ro, spreadsheet_id, fecha_actual, naves))
+                _cargas_en_curso[clave_carga] = carga
+                carga.add_done_callback(lambda _t, c=clave_carga: _cargas_en_curso.pop(c, None))
+            await asyncio.shield(carga)
+            with _cache_lock:
+                encontrada = (nave_letter, fecha_actual) in _cache_filas.get(granja, {})
+            if not encontrada and nave_letter not in registro().conjunto:
+                # La carga compartida era de otra petición y no incluía esta nau
+                await _cargar_cache_fechas(service_ro, spreadsheet_id, fecha_actual, [nave_letter])
+        else:
+            # La caché ya estaba cargada hoy pero esta nau no tenía fila: se vuelve a leer solo esta nau
+            range_to_read = _rango_fechas(nave_letter)
+            logger.debug("Intentando leer de '%s', rango '%s'.", spreadsheet_id, range_to_read)
+            result = await ejecutar_async(service_ro.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id, range=range_to_read
+            ), prioridad=PRIORIDAD_BAIXA)
+            values = result.get('values', [])
+            if not values:
+                logger.error("No se encontraron datos de fechas en el rango '%s' del full de càlcul.", range_to_read)
+                return None
+            fila = _fila_de_fecha(values, fecha_actual)
+            if fila is not None:
+                guardar_fila_fecha(nave_letter, fecha_actual, fila)
 
-        logger.info(f"Intentando leer de '{spreadsheet_id}', rango '{range_to_read}'.")
+        with _cache_lock:
+            posicion_fecha = _cache_filas.get(granja, {}).get((nave_letter, fecha_actual))
 
-        result = service_ro.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id, range=range_to_read
-        ).execute()
-
-        values = result.get('values', [])
-
-        if not values:
-            logger.error(f"No se encontraron datos de fechas en el rango '{range_to_read}' del full de càlcul.")
-            return None
-
-        posicion_fecha = _num_data(values, fecha_actual)+1
         if posicion_fecha is None:
-            logger.error(f"La fecha actual '{fecha_actual}' no se encontró en los datos de la hoja de cálculo para Nau {nave_letter}.")
+            logger.error("La fecha actual '%s' no se encontró en los datos de la hoja de cálculo para Nau %s.", fecha_actual, nave_letter)
             return None
 
-        logger.info(f"Fecha actual '{fecha_actual}' encontrada en la fila {posicion_fecha} para Nau {nave_letter}.")
+        logger.debug("Fecha actual '%s' encontrada en la fila %s para Nau %s.", fecha_actual, posicion_fecha, nave_letter)
         return posicion_fecha
 
     except Exception as e:
-        logger.error(f"Error inesperado en buscar_data_actual_g_sheet para Nau {nave_letter}: {e}")
-        return None
\ No newline at end of file
+        logger.error("Error inesperado en buscar_data_actual_g_sheet para Nau %s: %s", nave_letter, e)
+        return None
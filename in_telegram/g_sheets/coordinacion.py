@@ -0,0 +1,266 @@
+# in_telegram/g_sheets/coordinacion.py
+
+import logging
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Cómo se serializan las escrituras que leen una celda y la vuelven a escribir:
+#  local   -> locks en memoria. Basta con una sola instancia del bot (evita que dos hilos pierdan incrementos)
+#  fichero -> además, locks de rango (fcntl) sobre un archivo compartido por las instancias de la misma máquina
+#  sqlite  -> además, arrendamientos en una base SQLite compartida; caducan si la instancia que los tiene cae
+LOCAL, FICHERO, SQLITE = 'local', 'fichero', 'sqlite'
+BACKENDS = (LOCAL, FICHERO, SQLITE)
+RUTA_FICHERO = 'datos/coordinacion.lock'
+RUTA_SQLITE = 'datos/coordinacion.sqlite3'
+
+ESPERA_MAXIMA_BLOQUEO = 30.0 # Segundos esperando un bloqueo antes de rendirse
+RANURAS = 4096 # Locks (y bytes del archivo de locks): claves distintas pueden compartir ranura, solo se esperan de más
+DURACION_ARRIENDO = 60.0 # sqlite: se renueva mientras se tiene; solo cuenta si la instancia cae sin soltarlo
+_ESPERA_MINIMA_SONDEO = 0.002
+_ESPERA_MAXIMA_SONDEO = 0.05
+
+class BloqueoOcupado(TimeoutError):
+    """Otra instancia u otro hilo tiene alguna de las claves y no la ha soltado a tiempo."""
+
+def clave_celda(spreadsheet_id: str, nave: str, columna: str, fila: int) -> str:
+    return f"celda:{spreadsheet_id}:{nave}!{columna}{fila}"
+
+def clave_diario(granja: str) -> str:
+    """El sincronizador del diario de una granja: solo una instancia aplica el diario compartido a la vez."""
+    return f"diario:{granja}"
+
+def _espera_sondeo(intento: int, limite: float, claves) -> float:
+    """Espera creciente entre intentos; BloqueoOcupado si se acaba el tiempo."""
+    restante = limite - time.monotonic()
+    if restante <= 0:
+        raise BloqueoOcupado(f"Bloqueo no disponible: {', '.join(claves)}")
+    return min(restante, _ESPERA_MINIMA_SONDEO * 2 ** min(intento, 5), _ESPERA_MAXIMA_SONDEO)
+
+def _sondear(intento: int, limite: float, claves) -> None:
+    time.sleep(_espera_sondeo(intento, limite, claves))
+
+def _ranuras(claves: list) -> list[int]:
+    return sorted({zlib.crc32(clave.encode('utf-8')) % RANURAS for clave in claves})
+
+class _BloqueoLocal:
+    """Un lock en memoria por ranura: las claves se reparten en RANURAS locks fijos."""
+
+    def __init__(self):
+        self._locks = [threading.Lock() for _ in range(RANURAS)]
+
+    def adquirir(self, claves: list, espera_maxima: float):
+        limite = time.monotonic() + espera_maxima
+        obtenidas = []
+        try:
+            for ranura in _ranuras(claves):
+                if not self._locks[ranura].acquire(timeout=max(0.0, limite - time.monotonic())):
+                    raise BloqueoOcupado(f"Bloqueo no disponible: {', '.join(claves)}")
+                try:
+                    self._adquirir_ranura(ranura, limite, claves)
+                except BaseException:
+                    self._locks[ranura].release()
+                    raise
+                obtenidas.append(ranura)
+        except BaseException:
+            self.liberar(claves, obtenidas)
+            raise
+        return obtenidas
+
+    def liberar(self, claves: list, testigo) -> None:
+        for ranura in reversed(testigo):
+            self._liberar_ranura(ranura)
+            self._locks[ranura].release()
+
+    def _adquirir_ranura(self, ranura: int, limite: float, claves: list) -> None:
+        pass
+
+    def _liberar_ranura(self, ranura: int) -> None:
+        pass
+
+class _BloqueoFichero(_BloqueoLocal):
+    """
+    Además del lock en memoria, un lock de rango de un byte por ranura (fcntl.lockf) en un archivo compartido.
+    Los locks de fcntl son por proceso, por eso dentro del proceso se sigue usando el lock en memoria.
+    Si la instancia cae, el sistema operativo suelta sus locks.
+    """
+
+    def __init__(self, ruta: str):
+        super().__init__()
+        import fcntl # Solo existe en sistemas POSIX
+        self._fcntl = fcntl
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        # Se mantiene abierto siempre: cerrar cualquier descriptor del archivo soltaría todos los locks del proceso
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _adquirir_ranura(self, ranura: int, limite: float, claves: list) -> None:
+        intento = 0
+        while True:
+            try:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB, 1, ranura)
+                return
+            except OSError:
+                _sondear(intento, limite, claves)
+                intento += 1
+
+    def _liberar_ranura(self, ranura: int) -> None:
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, 1, ranura)
+
+class _BloqueoSqlite:
+    """
+    Arrendamientos en una tabla SQLite compartida. Todas las claves de una petición se toman
+    en la misma transacción (o ninguna), así no hay interbloqueos entre instancias.
+    Un hilo renueva los arrendamientos propios cada tercio de DURACION_ARRIENDO mientras haya alguno:
+    una escritura larga (un ciclo del sincronizador con reintentos) no pierde sus claves a medias.
+    """
+
+    _ESQUEMA = "CREATE TABLE IF NOT EXISTS bloqueos (clave TEXT PRIMARY KEY, propietario TEXT NOT NULL, caduca REAL NOT NULL)"
+
+    def __init__(self, ruta: str):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=ESPERA_MAXIMA_BLOQUEO)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(self._ESQUEMA)
+        self._lock = threading.Lock()
+        self._instancia = f"{socket.gethostname()}:{os.getpid()}"
+        self._propios = set() # Propietarios (uno por bloqueo) con arrendamientos vigentes en esta instancia
+        self._renovador = None
+
+    def _intentar(self, claves: list, propietario: str) -> bool:
+        marcas = ",".join("?" * len(claves))
+        ahora = time.time()
+        with self._lock:
+            db = self._conexion
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM bloqueos WHERE caduca < ?", (ahora,))
+                ocupadas = db.execute(f"SELECT COUNT(*) FROM bloqueos WHERE clave IN ({marcas})", claves).fetchone()[0]
+                if not ocupadas:
+                    db.executemany("INSERT INTO bloqueos (clave, propietario, caduca) VALUES (?, ?, ?)",
+                                   [(clave, propietario, ahora + DURACION_ARRIENDO) for clave in claves])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return not ocupadas
+
+    def adquirir(self, claves: list, espera_maxima: float):
+        limite = time.monotonic() + espera_maxima
+        propietario = f"{self._instancia}:{uuid.uuid4().hex}"
+        intento = 0
+        while not self._intentar(claves, propietario):
+            _sondear(intento, limite, claves)
+            intento += 1
+        with self._lock:
+            self._propios.add(propietario)
+            if self._renovador is None:
+                self._renovador = threading.Thread(target=self._renovar, name="renovar-arriendos", daemon=True)
+                self._renovador.start()
+        return propietario
+
+    def liberar(self, claves: list, testigo) -> None:
+        with self._lock:
+            self._propios.discard(testigo)
+            self._conexion.execute("DELETE FROM bloqueos WHERE propietario = ?", (testigo,))
+
+    def _renovar(self) -> None:
+        """Hilo de renovación: termina cuando la instancia ya no tiene ningún arrendamiento."""
+        while True:
+            time.sleep(DURACION_ARRIENDO / 3)
+            with self._lock:
+                if not self._propios:
+                    self._renovador = None
+                    return
+                caduca = time.time() + DURACION_ARRIENDO
+                for propietario in self._propios:
+                    try:
+                        renovados = self._conexion.execute("UPDATE bloqueos SET caduca = ? WHERE propietario = ?",
+                                                           (caduca, propietario)).rowcount
+                    except sqlite3.Error as e:
+                        logger.error("No se pudo renovar el arrendamiento %s: %s", propietario, e)
+                        continue
+                    if not renovados:
+                        logger.error("Arrendamiento %s perdido: ha caducado antes de renovarlo.", propietario)
+
+_backend = _BloqueoLocal()
+_tipo_backend = LOCAL
+
+def configurar(tipo: str = LOCAL, ruta: str | None = None) -> None:
+    """Elige el backend de coordinación. Todas las instancias que comparten hoja deben usar el mismo y la misma ruta."""
+    global _backend, _tipo_backend
+    if tipo == LOCAL:
+        _backend = _BloqueoLocal()
+    elif tipo == FICHERO:
+        _backend = _BloqueoFichero(ruta or RUTA_FICHERO)
+    elif tipo == SQLITE:
+        _backend = _BloqueoSqlite(ruta or RUTA_SQLITE)
+    else:
+        raise ValueError(f"Backend de coordinación desconocido: {tipo} (opciones: {', '.join(BACKENDS)})")
+    _tipo_backend = tipo
+    logger.info("Coordinación de escrituras: %s%s", tipo, f" ({ruta})" if ruta else "")
+
+def tipo() -> str:
+    return _tipo_backend
+
+class bloquear:
+    """
+    Context manager (with o async with) que mantiene las claves bloqueadas mientras dura el bloque.
+    Las claves se toman siempre en el mismo orden. Si no se consiguen en 'espera_maxima' segundos, BloqueoOcupado.
+    Con async with cada intento se hace en un hilo y entre intentos se espera con asyncio.sleep: el bucle de eventos
+    no se bloquea y ningún hilo del executor queda ocupado esperando (si todos esperasen, nadie podría soltar).
+    """
+
+    __slots__ = ('_claves', '_espera_maxima', '_backend', '_testigo')
+
+    def __init__(self, claves, espera_maxima: float = ESPERA_MAXIMA_BLOQUEO):
+        self._claves = sorted(set(claves))
+        self._espera_maxima = espera_maxima
+
+    def __enter__(self):
+        self._backend = _backend # El mismo backend para soltar, aunque se reconfigure en medio
+        self._testigo = self._backend.adquirir(self._claves, self._espera_maxima)
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self._backend.liberar(self._claves, self._testigo)
+        return False
+
+    async def __aenter__(self):
+        self._backend = _backend
+        limite = time.monotonic() + self._espera_maxima
+        intento = 0
+        while True:
+            intento_en_hilo = asyncio.ensure_future(asyncio.to_thread(self._backend.adquirir, self._claves, 0))
+            try:
+                self._testigo = await asyncio.shield(intento_en_hilo)
+                return self
+            except BloqueoOcupado:
+                await asyncio.sleep(_espera_sondeo(intento, limite, self._claves))
+                intento += 1
+            except asyncio.CancelledError:
+                # El hilo sigue y puede acabar tomando las claves: se sueltan en cuanto termine
+                intento_en_hilo.add_done_callback(self._soltar_si_adquirido)
+                raise
+
+    def _soltar_si_adquirido(self, intento_en_hilo: asyncio.Future):
+        if intento_en_hilo.cancelled() or intento_en_hilo.exception() is not None:
+            return
+        testigo = intento_en_hilo.result()
+        try:
+            intento_en_hilo.get_loop().run_in_executor(None, self._backend.liberar, self._claves, testigo)
+        except RuntimeError: # El bucle se está cerrando y ya no acepta trabajo en el executor
+            self._backend.liberar(self._claves, testigo)
+
+    async def __aexit__(self, tipo, valor, traza):
+        return await asyncio.to_thread(self.__exit__, tipo, valor, traza)
@@ -0,0 +1,138 @@
+# in_telegram/g_sheets/cuota.py
+
+import logging
+import random
+import threading
+import time
+from in_telegram.utils import granjas, metricas
+from in_telegram.utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Cuota de Google Sheets por cuenta de servicio (todas las granjas usan login.json): lecturas y escrituras se cuentan por separado
+LECTURAS_POR_MINUTO = 60
+ESCRITURAS_POR_MINUTO = 60
+RAFAGA_MAXIMA = 20 # Peticiones seguidas permitidas con el bucket lleno
+# Tokens que las consultas (informes) no pueden gastar: quedan para las baixes de los operarios
+RESERVA_BAIXES = 5
+
+# Reintentos de errores de cuota (429) y del servidor (5xx)
+ESTADOS_REINTENTABLES = frozenset({429, 500, 502, 503, 504})
+MAX_REINTENTOS = 4
+ESPERA_BASE_REINTENTO = 1.0
+ESPERA_MAXIMA_REINTENTO = 16.0
+
+# Prioridades: un número menor se atiende antes
+PRIORIDAD_BAIXA = 0 # Lecturas y escrituras de un parte de baixes
+PRIORIDAD_CONSULTA = 1 # Informes y refrescos de la réplica
+
+LECTURA = "lectura"
+ESCRITURA = "escritura"
+_METODOS_ESCRITURA = frozenset({'values.update', 'values.batchUpdate', 'values.append', 'values.clear', 'values.batchClear', 'batchUpdate'})
+
+def _bucket(por_minuto: float) -> TokenBucket:
+    capacidad = min(RAFAGA_MAXIMA, por_minuto)
+    # Una consulta necesita 1 + RESERVA_BAIXES tokens a la vez: con menos capacidad esperaría para siempre
+    if capacidad < 1 + RESERVA_BAIXES:
+        raise ValueError(f"Cuota de {por_minuto} peticiones/min demasiado baja: la ráfaga ({capacidad:g}) "
+                         f"debe ser al menos 1 + RESERVA_BAIXES ({1 + RESERVA_BAIXES})")
+    return TokenBucket(por_minuto / 60.0, capacidad)
+
+class _Cubo:
+    __slots__ = ('bucket', 'pausa_hasta', 'esperando', 'esperando_granja', 'ultimo_turno')
+
+    def __init__(self, por_minuto: float):
+        self.bucket = _bucket(por_minuto)
+        self.pausa_hasta = 0.0
+        self.esperando = [0, 0] # Hilos esperando token, por prioridad
+        self.esperando_granja = {} # {(prioridad, granja): hilos esperando}
+        self.ultimo_turno = {} # {granja: instante del último token consumido}
+
+    def turno_de(self, granja: str, prioridad: int) -> bool:
+        """
+        Reparto entre granjas dentro de la cuota compartida: con varias granjas esperando con la misma prioridad,
+        pasa la que lleva más tiempo sin consumir. Una granja con muchas peticiones no deja sin cuota a las demás.
+        """
+        propio = self.ultimo_turno.get(granja, 0.0)
+        return all(self.ultimo_turno.get(otra, 0.0) >= propio
+                   for (p, otra), n in self.esperando_granja.items() if p == prioridad and n and otra != granja)
+
+_condicion = threading.Condition()
+# Una sola cuota para todas las granjas: un 429 de la cuenta afecta a todas sus hojas
+_cubos = {LECTURA: _Cubo(LECTURAS_POR_MINUTO), ESCRITURA: _Cubo(ESCRITURAS_POR_MINUTO)}
+
+def tipo_de(metodo: str) -> str:
+    return ESCRITURA if metodo in _METODOS_ESCRITURA else LECTURA
+
+def configurar(lecturas_por_minuto: float = LECTURAS_POR_MINUTO, escrituras_por_minuto: float = ESCRITURAS_POR_MINUTO) -> None:
+    """
+    Sustituye los límites (buckets llenos). Para otra cuota contratada o para benchmarks.
+    ValueError, sin cambiar nada, si alguno no deja pasar ninguna consulta por la reserva de las baixes.
+    """
+    buckets = {LECTURA: _bucket(lecturas_por_minuto), ESCRITURA: _bucket(escrituras_por_minuto)}
+    with _condicion:
+        for tipo, bucket in buckets.items():
+            _cubos[tipo].bucket = bucket
+        _condicion.notify_all()
+
+def adquirir(tipo: str, prioridad: int = PRIORIDAD_CONSULTA) -> float:
+    """
+    Bloquea hasta que haya cuota para una petición del tipo indicado y la consume. Retorna los segundos esperados.
+    Mientras haya una baixa esperando, ninguna consulta pasa delante, y las consultas nunca gastan la reserva.
+    Entre granjas con peticiones de la misma prioridad esperando, la cuota se reparte por turnos.
+    """
+    inicio = time.monotonic()
+    granja = granjas.actual().nombre
+    clave = (prioridad, granja)
+    with _condicion:
+        cubo = _cubos[tipo]
+        cubo.esperando[prioridad] += 1
+        cubo.esperando_granja[clave] = cubo.esperando_granja.get(clave, 0) + 1
+        try:
+            while True:
+                if prioridad == PRIORIDAD_CONSULTA and cubo.esperando[PRIORIDAD_BAIXA]:
+                    espera = None # Se despierta al consumir la baixa
+                elif not cubo.turno_de(granja, prioridad):
+                    espera = None # Se despierta cuando consuma la granja a la que le toca
+                else:
+                    necesarios = 1 + RESERVA_BAIXES if prioridad == PRIORIDAD_CONSULTA else 1
+                    espera = max(cubo.pausa_hasta - time.monotonic(), cubo.bucket.espera(necesarios))
+                    if espera <= 0:
+                        cubo.bucket.consumir()
+                        cubo.ultimo_turno[granja] = time.monotonic()
+                        _condicion.notify_all()
+                        break
+                _condicion.wait(espera)
+        finally:
+            cubo.esperando[prioridad] -= 1
+            cubo.esperando_granja[clave] -= 1
+            if not cubo.esperando_granja[clave]:
+                del cubo.esperando_granja[clave]
+            _condicion.notify_all() # Si era su turno y se ha ido sin consumir, pasa la siguiente granja
+    esperado = time.monotonic() - inicio
+    if esperado > 0.001:
+        metricas.observar("baixes_sheets_espera_cuota_segundos", esperado, (tipo,))
+        logger.debug("Esperados %.2f s de cuota de %s (prioridad %s).", esperado, tipo, prioridad)
+    return esperado
+
+def espera_reintento(intento: int, retry_after: float | None = None) -> float:
+    """Backoff exponencial con jitter (mitad fija, mitad aleatoria). Respeta el Retry-After si es mayor."""
+    espera = min(ESPERA_MAXIMA_REINTENTO, ESPERA_BASE_REINTENTO * 2 ** intento)
+    espera = espera / 2 + random.uniform(0, espera / 2)
+    if retry_after is not None:
+        espera = max(espera, min(retry_after, ESPERA_MAXIMA_REINTENTO))
+    return espera
+
+def pausar(tipo: str, segundos: float) -> None:
+    """Tras un 429 nadie más usa la cuota de ese tipo hasta que pase la espera (la cuota es de la cuenta, no de la hoja)."""
+    with _condicion:
+        cubo = _cubos[tipo]
+        cubo.pausa_hasta = max(cubo.pausa_hasta, time.monotonic() + segundos)
+
+def restante(tipo: str) -> float:
+    """Peticiones que se pueden hacer ahora sin esperar (0 durante una pausa por 429)."""
+    with _condicion:
+        cubo = _cubos[tipo]
+        if cubo.pausa_hasta > time.monotonic():
+            return 0.0
+        return round(max(0.0, cubo.bucket.disponibles()), 2)
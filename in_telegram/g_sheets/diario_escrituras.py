@@ -0,0 +1,571 @@
+# in_telegram/g_sheets/diario_escrituras.py
+
+import logging
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from googleapiclient.errors import HttpError
+from in_telegram.g_sheets.sheets_api import ejecutar
+from in_telegram.g_sheets.cuota import PRIORIDAD_BAIXA
+from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_sheets_service_rw, get_spreadsheet_id
+from in_telegram.g_sheets.escritura_agrupada import rango_celda, valor_numerico, CeldaNoNumerica
+from in_telegram.g_sheets.buscar_data_actual import _rango_fechas, _fila_de_fecha, guardar_fila_fecha
+from in_telegram.g_sheets import coordinacion, replica_local
+from in_telegram.utils import granjas, metricas
+
+logger = logging.getLogger(__name__)
+
+# None: archivo temporal del proceso (benchmarks, pruebas). inicio.main usa 'datos/diario_escrituras.sqlite3'.
+# Las granjas que no son la principal usan '<ruta>-<granja>.sqlite3'
+DIARIO_PATH = None
+INTERVALO_SINCRONIZACION_MS = 500 # Espera máxima entre ciclos del sincronizador si no llegan entradas nuevas
+MAX_ENTRADAS_POR_LOTE = 200
+ESPERA_MAXIMA_REINTENTO = 60.0 # Segundos. La espera tras un fallo se duplica hasta este máximo
+DIAS_RETENCION = 30 # Las entradas aplicadas se borran pasado este tiempo
+ESPERA_BLOQUEO_DB = 30.0 # Segundos esperando a que otra instancia termine de escribir en el archivo
+# Escrituras de una entrada rechazadas por la hoja (400) antes de darla por perdida y avisar al chat.
+# Las caídas, la cuota (429/5xx) y los fallos de permisos o de spreadsheet (401/403/404) se reintentan sin límite:
+# no dependen de la entrada y perderla sería peor que esperar a que se arreglen
+MAX_INTENTOS = 5
+
+# Estados de una entrada:
+#  pendiente -> aún no se ha calculado el valor a escribir
+#  preparada -> valor_antiguo/valor_objetivo guardados; el batchUpdate puede haberse hecho o no
+#  aplicada  -> confirmada en la hoja
+#  error     -> no se puede aplicar (fecha inexistente, celda no numérica, hoja de la nau rechazada); se avisa al chat
+PENDIENTE, PREPARADA, APLICADA, ERROR = 'pendiente', 'preparada', 'aplicada', 'error'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entradas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    update_id INTEGER,
+    indice INTEGER NOT NULL DEFAULT 0,
+    chat_id INTEGER,
+    nave TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    columna TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    fila INTEGER,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    valor_antiguo INTEGER,
+    valor_objetivo INTEGER,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    creada REAL NOT NULL,
+    aplicada REAL,
+    UNIQUE (chat_id, update_id, indice)
+);
+CREATE INDEX IF NOT EXISTS idx_entradas_estado ON entradas (estado, id);
+"""
+
+_INSERTAR = ("INSERT OR IGNORE INTO entradas (update_id, indice, chat_id, nave, fecha, columna, cantidad, fila, creada) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+class _Diario:
+    """Diario de una granja: archivo, conexión y sincronizador propios. Si su hoja falla, las otras granjas siguen."""
+
+    __slots__ = ('granja', 'conexion', 'db_lock', 'evento', 'hilo', 'notificador', 'notificadores')
+
+    def __init__(self, granja: granjas.Granja):
+        self.granja = granja
+        self.conexion = None
+        self.db_lock = threading.Lock()
+        self.evento = threading.Event()
+        self.hilo = None
+        # funcion(chat_id, texto) para avisar de las entradas que no se pueden aplicar: la de cada entrada registrada
+        # en esta ejecución (en memoria, con db_lock) y la de la granja para las de una ejecución anterior
+        self.notificador = None
+        self.notificadores = {} # {id_entrada: funcion}
+
+    def ruta(self) -> str:
+        return self.granja.ruta(DIARIO_PATH or granjas.ruta_temporal('diario_escrituras.sqlite3'))
+
+    def db(self) -> sqlite3.Connection:
+        """Conexión única de la granja (protegida por db_lock). Se crea al primer uso."""
+        if self.conexion is None:
+            ruta = self.ruta()
+            directorio = os.path.dirname(ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            # Otras instancias del bot pueden compartir el archivo: se espera a que suelten el bloqueo de escritura
+            conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=ESPERA_BLOQUEO_DB)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=FULL") # La confirmación al operario solo se da con la entrada en disco
+            conexion.executescript(_ESQUEMA)
+            self.conexion = conexion
+        return self.conexion
+
+_diarios = {} # {granja: _Diario}
+_diarios_lock = threading.Lock()
+_hilo_lock = threading.Lock()
+
+def _diario() -> _Diario:
+    """Diario de la granja en curso."""
+    granja = granjas.actual()
+    with _diarios_lock:
+        diario = _diarios.get(granja.nombre)
+        if diario is None:
+            diario = _Diario(granja)
+            _diarios[granja.nombre] = diario
+    return diario
+
+def cerrar() -> None:
+    """Cierra la conexión del diario de la granja en curso (se vuelve a abrir al siguiente uso, p. ej. con otro DIARIO_PATH)."""
+    diario = _diario()
+    with diario.db_lock:
+        if diario.conexion is not None:
+            diario.conexion.close()
+            diario.conexion = None
+
+def _soltar_notificadores(diario: _Diario, ids) -> dict:
+    """Quita las funciones de aviso de las entradas ya resueltas. Retorna {id: funcion o None}."""
+    with diario.db_lock:
+        return {id_entrada: diario.notificadores.pop(id_entrada, None) or diario.notificador for id_entrada in ids}
+
+def _notificar(notificar, chat_id, texto: str) -> None:
+    if chat_id is None or notificar is None:
+        return
+    try:
+        notificar(chat_id, texto)
+    except Exception as e:
+        logger.error("Error al notificar al chat %s: %s", chat_id, e)
+
+def registrar(nave: str, fecha: str, columna: str, cantidad: int, fila: int | None = None,
+              chat_id: int | None = None, update_id: int | None = None, indice: int = 0, notificar=None) -> int | None:
+    """
+    Guarda una baixa en el diario de la granja en curso (en disco al retornar) y despierta a su sincronizador.
+    Si la entrada no se puede aplicar, se avisa a su chat con notificar(chat_id, texto).
+    Retorna el id de la entrada, o None si ese update ya estaba registrado (reentrega de Telegram).
+    """
+    diario = _diario()
+    iniciar_sincronizador() # Antes de insertar: las pendientes que cuenta al arrancar son solo las de ejecuciones anteriores
+    with diario.db_lock:
+        cursor = diario.db().execute(_INSERTAR, (update_id, indice, chat_id, nave, fecha, columna, cantidad, fila, time.time()))
+        id_entrada = cursor.lastrowid if cursor.rowcount else None
+        if id_entrada is not None and notificar is not None:
+            diario.notificadores[id_entrada] = notificar
+    diario.evento.set()
+    return id_entrada
+
+def registrar_varias(entradas: list, chat_id: int | None = None, update_id: int | None = None, notificar=None) -> list[int] | None:
+    """
+    Guarda las anotaciones de un mismo mensaje [(nave, fecha, columna, cantidad, fila), ...] en una sola transacción,
+    con el mismo update_id e indice 0, 1, 2... Se guardan todas o ninguna. Los avisos van con notificar(chat_id, texto).
+    Retorna los ids de las entradas, o None si ese update ya estaba registrado (reentrega de Telegram).
+    """
+    diario = _diario()
+    iniciar_sincronizador()
+    ahora = time.time()
+    ids = []
+    with diario.db_lock:
+        db = diario.db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for indice, (nave, fecha, columna, cantidad, fila) in enumerate(entradas):
+                cursor = db.execute(_INSERTAR, (update_id, indice, chat_id, nave, fecha, columna, cantidad, fila, ahora))
+                if not cursor.rowcount:
+                    break
+                ids.append(cursor.lastrowid)
+            else:
+                db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if len(ids) < len(entradas):
+            db.execute("ROLLBACK")
+            return None
+        if notificar is not None:
+            diario.notificadores.update(dict.fromkeys(ids, notificar))
+    diario.evento.set()
+    return ids
+
+def pendientes() -> int:
+    """Entradas de la granja en curso todavía no aplicadas en la hoja."""
+    diario = _diario()
+    with diario.db_lock:
+        return diario.db().execute("SELECT COUNT(*) FROM entradas WHERE estado IN (?, ?)", (PENDIENTE, PREPARADA)).fetchone()[0]
+
+def pendientes_totales() -> int:
+    """Entradas no aplicadas de todas las granjas con el diario abierto (para las métricas)."""
+    with _diarios_lock:
+        diarios = list(_diarios.values())
+    total = 0
+    for diario in diarios:
+        with granjas.contexto_granja(diario.granja):
+            total += pendientes()
+    return total
+
+def pendientes_por_celda() -> dict:
+    """{(nave, fecha, columna): cantidad} de las entradas de la granja en curso aún no aplicadas en la hoja."""
+    diario = _diario()
+    if diario.conexion is None and not os.path.exists(diario.ruta()):
+        return {}
+    with diario.db_lock:
+        filas = diario.db().execute(
+            "SELECT nave, fecha, columna, SUM(cantidad) FROM entradas WHERE estado IN (?, ?) GROUP BY nave, fecha, columna",
+            (PENDIENTE, PREPARADA)
+        ).fetchall()
+    return {(nave, fecha, columna): cantidad for nave, fecha, columna, cantidad in filas}
+
+def entrada(id_entrada: int) -> dict | None:
+    diario = _diario()
+    with diario.db_lock:
+        fila = diario.db().execute("SELECT * FROM entradas WHERE id = ?", (id_entrada,)).fetchone()
+    return dict(fila) if fila is not None else None
+
+def _marcar_error(entradas: list, motivo: str, texto_chat: str) -> set:
+    """
+    Marca las entradas como no aplicables y avisa a su chat. Las anotaciones pendientes del mismo mensaje tampoco
+    se aplican: un mensaje con varias anotaciones se anota entero o no se anota. Retorna los ids descartados.
+    """
+    diario = _diario()
+    mensajes = {(e['chat_id'], e['update_id']) for e in entradas if e['update_id'] is not None}
+    with diario.db_lock:
+        db = diario.db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("UPDATE entradas SET estado = ?, error = ? WHERE id = ?", [(ERROR, motivo, e['id']) for e in entradas])
+            companeras = []
+            for chat_id, update_id in mensajes:
+                companeras.extend(db.execute("SELECT id, chat_id FROM entradas WHERE chat_id IS ? AND update_id = ? AND estado = ?",
+                                             (chat_id, update_id, PENDIENTE)).fetchall())
+            db.executemany("UPDATE entradas SET estado = ?, error = ? WHERE id = ?",
+                           [(ERROR, f"otra anotación del mismo mensaje: {motivo}", c['id']) for c in companeras])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    notificadores = _soltar_notificadores(diario, [e['id'] for e in entradas] + [c['id'] for c in companeras])
+    for e in entradas:
+        logger.warning("Entrada %s del diario descartada: %s", e['id'], motivo)
+        _notificar(notificadores[e['id']], e['chat_id'], texto_chat)
+    if companeras:
+        logger.warning("Entradas %s del diario descartadas con su mensaje: %s", [c['id'] for c in companeras], motivo)
+        # Un aviso por chat, con la función de cualquiera de sus entradas (todas son del mismo mensaje)
+        por_chat = {c['chat_id']: notificadores[c['id']] for c in companeras}
+        for chat_id, notificar in por_chat.items():
+            _notificar(notificar, chat_id, "Tampoc s'han anotat les altres baixes del mateix missatge.")
+    return {e['id'] for e in entradas} | {c['id'] for c in companeras}
+
+def _rechazada(err: HttpError) -> bool:
+    # 400: rangos que la hoja no acepta, p. ej. de una nau sin hoja 'Nau X' o con la hoja renombrada
+    return err.resp.status == 400
+
+def _por_nave(naves: list, llamada) -> dict:
+    """
+    llamada(indices) hace una petición con los elementos 'indices' de un lote (naves[i] es la nau del elemento i).
+    Primero se piden todos juntos; si la hoja rechaza la petición, se repite nau por nau para que una nau
+    con la hoja rota no bloquee a las demás. Retorna {nave: HttpError} de las naus rechazadas.
+    """
+    try:
+        llamada(list(range(len(naves))))
+        return {}
+    except HttpError as err:
+        if not _rechazada(err):
+            raise
+        if len(set(naves)) == 1:
+            return {naves[0]: err}
+        logger.warning("La hoja rechaza la petición del diario (%s). Se repite nau por nau.", err.resp.status)
+    rechazadas = {}
+    for nave in dict.fromkeys(naves):
+        try:
+            llamada([i for i, n in enumerate(naves) if n == nave])
+        except HttpError as err:
+            if not _rechazada(err):
+                raise
+            rechazadas[nave] = err
+    return rechazadas
+
+def _descartar_naves(rechazadas: dict, entradas: list, descartadas: set) -> set:
+    """Marca como error las entradas de las naus cuya hoja rechaza las lecturas. Retorna las entradas descartadas."""
+    for nave, err in rechazadas.items():
+        lista = [e for e in entradas if e['nave'] == nave and e['id'] not in descartadas]
+        if lista:
+            descartadas |= _marcar_error(lista, f"la hoja rechaza los rangos de Nau {nave} ({err.resp.status})",
+                                         f"No s'ha pogut llegir la fulla 'Nau {nave}' del full de càlcul. La baixa no s'ha anotat.")
+    return descartadas
+
+def _resolver_filas(service_ro, spreadsheet_id: str, entradas: list) -> list:
+    """Busca la fila de la fecha de las entradas que aún no la tienen. Retorna las entradas que se pueden aplicar."""
+    diario = _diario()
+    sin_fila = []
+    for e in entradas:
+        if e['fila'] is not None:
+            continue
+        # La réplica local conoce las filas de todas las fechas de la hoja
+        fila = replica_local.fila_de_fecha(e['nave'], e['fecha'])
+        if fila is None:
+            sin_fila.append(e)
+            continue
+        e['fila'] = fila
+        with diario.db_lock:
+            diario.db().execute("UPDATE entradas SET fila = ? WHERE id = ?", (fila, e['id']))
+    if not sin_fila:
+        return entradas
+
+    naves = list(dict.fromkeys(e['nave'] for e in sin_fila))
+    fechas_por_nave = {}
+
+    def _leer_fechas(indices):
+        result = ejecutar(service_ro.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id, ranges=[_rango_fechas(naves[i]) for i in indices]
+        ), prioridad=PRIORIDAD_BAIXA)
+        for i, vr in zip(indices, result.get('valueRanges', [])):
+            fechas_por_nave[naves[i]] = vr.get('values', [])
+
+    rechazadas = _por_nave(naves, _leer_fechas)
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+
+    sin_fecha = []
+    with diario.db_lock:
+        for e in sin_fila:
+            if e['nave'] in rechazadas:
+                continue
+            fila = _fila_de_fecha(fechas_por_nave.get(e['nave'], []), e['fecha'])
+            if fila is None:
+                sin_fecha.append(e)
+                continue
+            e['fila'] = fila
+            diario.db().execute("UPDATE entradas SET fila = ? WHERE id = ?", (fila, e['id']))
+            if e['fecha'] == hoy:
+                guardar_fila_fecha(e['nave'], e['fecha'], fila)
+
+    descartadas = _descartar_naves(rechazadas, sin_fila, set())
+    for e in sin_fecha:
+        if e['id'] not in descartadas:
+            descartadas |= _marcar_error([e], f"fecha {e['fecha']} no encontrada en Nau {e['nave']}",
+                                         f"La data actual '{e['fecha']}' no s'ha trobat dins de la fulla de càlcul.")
+    return [e for e in entradas if e['id'] not in descartadas]
+
+def sincronizar(espera_bloqueo: float = coordinacion.ESPERA_MAXIMA_BLOQUEO) -> int:
+    """
+    Aplica en la hoja de la granja en curso un lote de sus entradas pendientes con un batchGet y un batchUpdate.
+    Retorna el número de entradas aplicadas.
+
+    Exactamente una vez: antes de escribir se guarda en el diario el valor antiguo y el valor objetivo de
+    cada entrada. Si el proceso cae a mitad, al reanudar se compara la celda con esos valores:
+    si ya tiene el objetivo, la escritura se hizo; si sigue con el valor antiguo, se repite.
+
+    Varias instancias del bot pueden compartir el archivo del diario: solo una a la vez lo aplica
+    (BloqueoOcupado si otra no lo suelta en 'espera_bloqueo' segundos). Todas deben escribir en modo diario,
+    porque las escrituras directas no esperan a este bloqueo.
+    """
+    with coordinacion.bloquear([coordinacion.clave_diario(granjas.actual().nombre)], espera_bloqueo):
+        return _sincronizar_lote()
+
+def _sincronizar_lote() -> int:
+    diario = _diario()
+    with diario.db_lock:
+        filas = diario.db().execute(
+            "SELECT * FROM entradas WHERE estado IN (?, ?) ORDER BY id LIMIT ?",
+            (PENDIENTE, PREPARADA, MAX_ENTRADAS_POR_LOTE)
+        ).fetchall()
+    if not filas:
+        return 0
+    entradas = [dict(f) for f in filas]
+
+    service_rw = get_sheets_service_rw()
+    service_ro = get_sheets_service_ro()
+    spreadsheet_id = get_spreadsheet_id()
+    if not service_rw or not service_ro or not spreadsheet_id:
+        raise RuntimeError("Servicio de Google Sheets (RW/RO) o Spreadsheet ID no disponibles.")
+
+    entradas = _resolver_filas(service_ro, spreadsheet_id, entradas)
+    if not entradas:
+        return 0
+
+    # Entradas por celda, en orden de llegada
+    por_celda = {}
+    for e in entradas:
+        por_celda.setdefault((e['nave'], e['columna'], e['fila']), []).append(e)
+    celdas = list(por_celda)
+    rangos = [rango_celda(*celda) for celda in celdas]
+
+    value_ranges = [{}] * len(celdas)
+
+    def _leer_celdas(indices):
+        result_read = ejecutar(service_ro.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id, ranges=[rangos[i] for i in indices], valueRenderOption='UNFORMATTED_VALUE'
+        ), prioridad=PRIORIDAD_BAIXA)
+        for i, vr in zip(indices, result_read.get('valueRanges', [])):
+            value_ranges[i] = vr
+
+    with metricas.medir_etapa(metricas.ETAPA_LECTURA_CELDA):
+        rechazadas = _por_nave([celda[0] for celda in celdas], _leer_celdas)
+
+    ya_aplicadas = [] # Preparadas en un ciclo anterior cuya escritura sí llegó a la hoja
+    preparar = [] # (valor_antiguo, valor_objetivo, id)
+    a_escribir = [] # (celda, rango, valor_final, entradas)
+    actuales = {}
+    # Entradas de una nau rechazada, de una celda no numérica o con los intentos agotados, y las demás anotaciones de sus mensajes
+    descartadas = _descartar_naves(rechazadas, entradas, set())
+    for i, celda in enumerate(celdas):
+        if celda[0] in rechazadas:
+            continue
+        values = value_ranges[i].get('values', [])
+        try:
+            actuales[celda] = valor_numerico(values, rangos[i])
+        except CeldaNoNumerica as err:
+            descartadas |= _marcar_error([e for e in por_celda[celda] if e['id'] not in descartadas], str(err),
+                                         f"Error: La celda de la fulla de càlcul '{rangos[i]}' conté un valor no numèric. No es pot sumar.")
+
+    agotadas = []
+    for celda, actual in actuales.items():
+        preparadas = [e for e in por_celda[celda] if e['estado'] == PREPARADA]
+        escritas = bool(preparadas) and actual == preparadas[-1]['valor_objetivo']
+        agotadas.extend(e for e in por_celda[celda] if e['intentos'] >= MAX_INTENTOS and e['id'] not in descartadas
+                        and not (escritas and e['estado'] == PREPARADA))
+    if agotadas:
+        descartadas |= _marcar_error(agotadas, f"la hoja ha rechazado {MAX_INTENTOS} veces la escritura",
+                                     "No s'ha pogut escriure la baixa al full de càlcul després de diversos intents. La baixa no s'ha anotat.")
+
+    for i, celda in enumerate(celdas):
+        lista = [e for e in por_celda[celda] if e['id'] not in descartadas]
+        if celda not in actuales or not lista:
+            continue
+        actual = actuales[celda]
+
+        preparadas = [e for e in lista if e['estado'] == PREPARADA]
+        nuevas = [e for e in lista if e['estado'] == PENDIENTE]
+        base = actual
+        if preparadas:
+            if actual == preparadas[-1]['valor_objetivo']:
+                ya_aplicadas.extend(preparadas) # Se escribió antes de la caída
+            elif actual == preparadas[0]['valor_antiguo']:
+                nuevas = preparadas + nuevas # No se llegó a escribir: se repite con los mismos valores
+            else:
+                logger.warning("La celda %s cambió fuera del bot (%s) con %s entradas preparadas. Se recalculan.",
+                               rangos[i], actual, len(preparadas))
+                nuevas = preparadas + nuevas
+
+        if not nuevas:
+            continue
+        for e in nuevas:
+            e['valor_antiguo'], e['valor_objetivo'] = base, base + e['cantidad']
+            base += e['cantidad']
+            preparar.append((e['valor_antiguo'], e['valor_objetivo'], e['id']))
+        a_escribir.append((celda, rangos[i], base, nuevas))
+
+    ahora = time.time()
+    with diario.db_lock:
+        db = diario.db()
+        db.execute("BEGIN IMMEDIATE") # Con otras instancias escribiendo, el bloqueo de escritura desde el principio
+        try:
+            db.executemany("UPDATE entradas SET estado = 'preparada', valor_antiguo = ?, valor_objetivo = ? WHERE id = ?", preparar)
+            db.executemany("UPDATE entradas SET estado = 'aplicada', aplicada = ? WHERE id = ?", [(ahora, e['id']) for e in ya_aplicadas])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    _soltar_notificadores(diario, [e['id'] for e in ya_aplicadas])
+
+    if a_escribir:
+        def _escribir_celdas(indices):
+            ejecutar(service_rw.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'valueInputOption': 'RAW', 'data': [{'range': a_escribir[i][1], 'values': [[a_escribir[i][2]]]} for i in indices]}
+            ), prioridad=PRIORIDAD_BAIXA)
+
+        with metricas.medir_etapa(metricas.ETAPA_ESCRITURA_CELDA):
+            rechazadas = _por_nave([celda[0] for celda, _, _, _ in a_escribir], _escribir_celdas)
+        if rechazadas:
+            # Se quedan preparadas y se repiten en el siguiente ciclo, hasta MAX_INTENTOS veces
+            fallidas = [e for celda, _, _, lista in a_escribir if celda[0] in rechazadas for e in lista]
+            with diario.db_lock:
+                diario.db().executemany("UPDATE entradas SET intentos = intentos + 1 WHERE id = ?", [(e['id'],) for e in fallidas])
+            logger.warning("La hoja rechaza la escritura de %s entradas del diario en Nau %s.", len(fallidas), ", ".join(rechazadas))
+            a_escribir = [x for x in a_escribir if x[0][0] not in rechazadas]
+
+    if a_escribir:
+        ahora = time.time()
+        aplicadas = [e for _, _, _, lista in a_escribir for e in lista]
+        with diario.db_lock:
+            diario.db().executemany("UPDATE entradas SET estado = 'aplicada', aplicada = ? WHERE id = ?",
+                                    [(ahora, e['id']) for e in aplicadas])
+        _soltar_notificadores(diario, [e['id'] for e in aplicadas])
+
+        for (nave, columna, fila), rango, valor, lista in a_escribir:
+            # La réplica local queda con el valor recién escrito
+            replica_local.guardar_celda(nave, columna, fila, valor, sum(e['cantidad'] for e in lista))
+            for e in lista:
+                logger.info("Baixa escrita a %s: %s -> %s (+%s) (diario %s)", rango, e['valor_antiguo'],
+                            e['valor_objetivo'], e['cantidad'], e['id'], extra={'auditoria': True})
+        logger.info("Diario: %s entradas aplicadas en %s celdas con un batchUpdate.", len(aplicadas), len(a_escribir))
+
+    return len(ya_aplicadas) + sum(len(lista) for _, _, _, lista in a_escribir)
+
+def purgar() -> int:
+    """
+    Borra las entradas de la granja en curso aplicadas hace más de DIAS_RETENCION días y olvida las funciones
+    de aviso de las entradas ya resueltas (también las que ha aplicado otra instancia con el diario compartido).
+    """
+    limite = time.time() - DIAS_RETENCION * 86400
+    diario = _diario()
+    with diario.db_lock:
+        db = diario.db()
+        sin_resolver = {fila[0] for fila in db.execute("SELECT id FROM entradas WHERE estado IN (?, ?)", (PENDIENTE, PREPARADA))}
+        for id_entrada in diario.notificadores.keys() - sin_resolver:
+            del diario.notificadores[id_entrada]
+        return db.execute("DELETE FROM entradas WHERE estado = ? AND aplicada < ?", (APLICADA, limite)).rowcount
+
+def _bucle_sincronizador(diario: _Diario):
+    espera_error = 0.0
+    ultima_purga = 0.0
+    nombre = diario.granja.nombre
+    while True:
+        diario.evento.wait(espera_error or INTERVALO_SINCRONIZACION_MS / 1000)
+        diario.evento.clear()
+        try:
+            with granjas.contexto_granja(granjas.vigente(diario.granja)):
+                while sincronizar(espera_bloqueo=0) >= MAX_ENTRADAS_POR_LOTE:
+                    pass # Quedan más entradas: se sigue sin esperar
+                espera_error = 0.0
+                if time.time() - ultima_purga > 3600:
+                    purgar()
+                    ultima_purga = time.time()
+        except coordinacion.BloqueoOcupado:
+            # Otra instancia está aplicando el diario compartido: sus entradas y las nuestras. Se vuelve a mirar en el siguiente ciclo
+            espera_error = 0.0
+            logger.debug("El diario de la granja %s lo está aplicando otra instancia.", nombre)
+        except HttpError as err:
+            espera_error = min(ESPERA_MAXIMA_REINTENTO, max(1.0, espera_error * 2))
+            logger.warning("Error de la API al sincronizar el diario de la granja %s (%s). Reintento en %.0f s.",
+                           nombre, err.resp.status, espera_error)
+        except Exception as e:
+            espera_error = min(ESPERA_MAXIMA_REINTENTO, max(1.0, espera_error * 2))
+            logger.error("Error al sincronizar el diario de la granja %s: %s. Reintento en %.0f s.", nombre, e, espera_error)
+
+def iniciar_sincronizador(notificar=None) -> None:
+    """
+    Arranca (una sola vez por granja) el hilo que aplica el diario de la granja en curso.
+    Las entradas pendientes de antes de un reinicio se aplican también; sus avisos van con 'notificar'.
+    """
+    diario = _diario()
+    if notificar is not None:
+        diario.notificador = notificar
+    if diario.hilo is not None:
+        return
+    with _hilo_lock:
+        if diario.hilo is not None:
+            return
+        n = pendientes()
+        if n:
+            logger.warning("Diario de escrituras de la granja %s: %s entradas pendientes de una ejecución anterior. Se reanudan.",
+                           diario.granja.nombre, n)
+        diario.hilo = threading.Thread(target=_bucle_sincronizador, args=(diario,),
+                                       name=f"sincronizador-diario-{diario.granja.nombre}", daemon=True)
+        diario.hilo.start()
+
+def esperar_sincronizado(timeout: float = 30.0) -> bool:
+    """Espera a que no quede nada pendiente en el diario de la granja en curso (para benchmarks y apagado ordenado)."""
+    diario = _diario()
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if pendientes() == 0:
+            return True
+        diario.evento.set()
+        time.sleep(0.05)
+    return False
@@ -0,0 +1,202 @@
+# in_telegram/g_sheets/escritura_agrupada.py
+
+import logging
+import threading
+import concurrent.futures
+from in_telegram.g_sheets.sheets_api import ejecutar
+from in_telegram.g_sheets.cuota import PRIORIDAD_BAIXA
+from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_sheets_service_rw, get_spreadsheet_id
+from in_telegram.g_sheets import coordinacion, replica_local
+from in_telegram.utils import granjas, metricas
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_FLUSH_MS = 500 # Cada cuánto se vuelcan los incrementos pendientes
+MAX_CELDAS_PENDIENTES = 50 # Si se alcanzan, se vuelca sin esperar al intervalo
+
+class _Cola:
+    """Incrementos pendientes de una granja. Cada granja tiene su hilo: una hoja lenta no retrasa a las demás."""
+
+    __slots__ = ('granja', 'pendientes', 'lock', 'evento_flush', 'hilo')
+
+    def __init__(self, granja: granjas.Granja):
+        self.granja = granja
+        self.pendientes = {} # {(nave, columna, fila): [(cantidad, future), ...]} en orden de llegada
+        self.lock = threading.Lock()
+        self.evento_flush = threading.Event()
+        self.hilo = None
+
+_colas = {} # {granja: _Cola}
+_colas_lock = threading.Lock()
+
+def _cola() -> _Cola:
+    """Cola de la granja en curso (se crea al primer uso)."""
+    granja = granjas.actual()
+    with _colas_lock:
+        cola = _colas.get(granja.nombre)
+        if cola is None:
+            cola = _Cola(granja)
+            _colas[granja.nombre] = cola
+    return cola
+
+class CeldaNoNumerica(ValueError):
+    """La celda de destino contiene un valor que no se puede sumar."""
+
+    def __init__(self, cell_range: str, valor):
+        super().__init__(f"La celda {cell_range} contiene un valor no numérico '{valor}'")
+        self.cell_range = cell_range
+        self.valor = valor
+
+def rango_celda(nave: str, columna: str, fila: int) -> str:
+    return f"'Nau {nave}'!{columna}{fila}"
+
+def valor_numerico(values: list, cell_range: str) -> int:
+    """Convierte el contenido devuelto por la API ([[valor]] o vacío) a entero."""
+    if not values or not values[0]:
+        return 0
+    valor_str = str(values[0][0]).strip()
+    if not valor_str:
+        return 0
+    try:
+        return int(float(valor_str))
+    except ValueError:
+        raise CeldaNoNumerica(cell_range, valor_str)
+
+def _asegurar_hilo(cola: _Cola):
+    if cola.hilo is None:
+        cola.hilo = threading.Thread(target=_bucle_flush, args=(cola,), name=f"flush-escrituras-{cola.granja.nombre}", daemon=True)
+        cola.hilo.start()
+
+def _bucle_flush(cola: _Cola):
+    while True:
+        cola.evento_flush.wait(INTERVALO_FLUSH_MS / 1000)
+        cola.evento_flush.clear()
+        try:
+            with granjas.contexto_granja(granjas.vigente(cola.granja)):
+                flush()
+        except Exception as e:
+            logger.error("Error inesperado al volcar las escrituras agrupadas de la granja %s: %s", cola.granja.nombre, e)
+
+def encolar_incrementos(incrementos: dict) -> concurrent.futures.Future:
+    """
+    Añade los incrementos de un mensaje {(nave, columna, fila): cantidad} al buffer de la granja en curso como una unidad:
+    el batchUpdate los aplica todos o, si alguna de sus celdas no se puede sumar, ninguno (CeldaNoNumerica).
+    El future se resuelve con {(nave, columna, fila): (valor_antiguo, valor_nuevo)} cuando se ha confirmado.
+    """
+    future = concurrent.futures.Future()
+    cola = _cola()
+    with cola.lock:
+        _asegurar_hilo(cola)
+        for celda, cantidad in incrementos.items():
+            cola.pendientes.setdefault(celda, []).append((cantidad, future))
+        lleno = len(cola.pendientes) >= MAX_CELDAS_PENDIENTES
+    if lleno:
+        cola.evento_flush.set()
+    return future
+
+def encolar_incremento(nave: str, columna: str, fila: int, cantidad: int) -> concurrent.futures.Future:
+    """
+    Añade un incremento al buffer de la granja en curso. El future se resuelve con (valor_antiguo, valor_nuevo)
+    cuando el batchUpdate que lo incluye se ha confirmado.
+    """
+    celda = (nave, columna, fila)
+    future = concurrent.futures.Future()
+
+    def _resolver(unidad: concurrent.futures.Future):
+        if unidad.exception() is not None:
+            future.set_exception(unidad.exception())
+        else:
+            future.set_result(unidad.result()[celda])
+
+    encolar_incrementos({celda: cantidad}).add_done_callback(_resolver)
+    return future
+
+def pendientes() -> int:
+    """Número de celdas de la granja en curso con incrementos pendientes de volcar."""
+    cola = _cola()
+    with cola.lock:
+        return len(cola.pendientes)
+
+def flush() -> None:
+    """Vuelca todos los incrementos pendientes de la granja en curso con un batchGet y un batchUpdate."""
+    cola = _cola()
+    with cola.lock:
+        lote = cola.pendientes
+        cola.pendientes = {}
+    if not lote:
+        return
+
+    claves = list(lote)
+    rangos = [rango_celda(*clave) for clave in claves]
+
+    try:
+        service_rw = get_sheets_service_rw()
+        service_ro = get_sheets_service_ro()
+        spreadsheet_id = get_spreadsheet_id()
+        if not service_rw or not service_ro or not spreadsheet_id:
+            raise RuntimeError("Servicio de Google Sheets (RW/RO) o Spreadsheet ID no disponibles.")
+
+        # Las celdas quedan bloqueadas entre la lectura y la escritura: otra instancia del bot no puede sumar en medio
+        with coordinacion.bloquear([coordinacion.clave_celda(spreadsheet_id, *clave) for clave in claves]):
+            with metricas.medir_etapa(metricas.ETAPA_LECTURA_CELDA):
+                result_read = ejecutar(service_ro.spreadsheets().values().batchGet(
+                    spreadsheetId=spreadsheet_id,
+                    ranges=rangos,
+                    valueRenderOption='UNFORMATTED_VALUE'
+                ), prioridad=PRIORIDAD_BAIXA)
+            value_ranges = result_read.get('valueRanges', [])
+
+            valores = {}
+            rechazados = {} # {future: CeldaNoNumerica} mensajes con alguna celda que no se puede sumar
+            for i, clave in enumerate(claves):
+                values = value_ranges[i].get('values', []) if i < len(value_ranges) else []
+                try:
+                    valores[clave] = valor_numerico(values, rangos[i])
+                except CeldaNoNumerica as e:
+                    logger.warning("%s. No se aplica ninguno de los %s mensajes con incrementos en ella.", e, len(lote[clave]))
+                    for _, future in lote[clave]:
+                        rechazados.setdefault(future, e)
+            for future, e in rechazados.items():
+                future.set_exception(e)
+
+            datos = []
+            escritas = []
+            resultados = {} # {future: {celda: (valor_antiguo, valor_nuevo)}}
+            for clave in claves:
+                if clave not in valores:
+                    continue
+                # Cada mensaje recibe su propio valor antiguo/nuevo, en orden de llegada
+                valor = valores[clave]
+                incremento = 0
+                for cantidad, future in lote[clave]:
+                    if future in rechazados:
+                        continue # Otra celda del mismo mensaje no se puede sumar: no se aplica ninguna
+                    resultados.setdefault(future, {})[clave] = (valor, valor + cantidad)
+                    valor += cantidad
+                    incremento += cantidad
+                if incremento:
+                    datos.append({'range': rango_celda(*clave), 'values': [[valor]]})
+                    escritas.append((clave, valor, incremento))
+
+            if datos:
+                with metricas.medir_etapa(metricas.ETAPA_ESCRITURA_CELDA):
+                    ejecutar(service_rw.spreadsheets().values().batchUpdate(
+                        spreadsheetId=spreadsheet_id,
+                        body={'valueInputOption': 'RAW', 'data': datos}
+                    ), prioridad=PRIORIDAD_BAIXA)
+                logger.info("Escritura agrupada: %s incrementos de %s mensajes en %s celdas con un batchUpdate.",
+                            sum(len(por_celda) for por_celda in resultados.values()), len(resultados), len(datos))
+
+                # La réplica local queda con los valores recién escritos
+                for (nave, columna, fila), valor, incremento in escritas:
+                    replica_local.guardar_celda(nave, columna, fila, valor, incremento)
+
+        for future, por_celda in resultados.items():
+            future.set_result(por_celda)
+
+    except Exception as e:
+        logger.error("Error al volcar %s celdas agrupadas: %s", len(claves), e)
+        for incrementos in lote.values():
+            for _, future in incrementos:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,238 @@
+# in_telegram/g_sheets/fake_sheets.py
+
+import logging
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import httplib2
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# 'Nau A'!D8  ·  'Nau A'!B7:E101  ·  Nau A!I2
+_PATRON_RANGO = re.compile(r"^(?:'(?P<hoja_q>[^']+)'|(?P<hoja>[^!]+))!(?P<c1>[A-Z]+)(?P<f1>\d+)(?::(?P<c2>[A-Z]+)(?P<f2>\d+))?$")
+
+PRIMERA_FILA_FECHAS = 7
+ULTIMA_FILA_FECHAS = 101
+
+def _columna_a_indice(columna: str) -> int:
+    indice = 0
+    for letra in columna:
+        indice = indice * 26 + (ord(letra) - ord('A') + 1)
+    return indice
+
+def _parsear_rango(rango: str):
+    match = _PATRON_RANGO.match(rango)
+    if match is None:
+        raise ValueError(f"Rango A1 no soportado por el backend simulado: {rango}")
+    hoja = match.group('hoja_q') or match.group('hoja')
+    c1, f1 = _columna_a_indice(match.group('c1')), int(match.group('f1'))
+    c2 = _columna_a_indice(match.group('c2')) if match.group('c2') else c1
+    f2 = int(match.group('f2')) if match.group('f2') else f1
+    return hoja, c1, f1, c2, f2
+
+class _Peticion:
+    def __init__(self, backend, metodo: str, operacion):
+        self._backend = backend
+        self._metodo = metodo
+        self._operacion = operacion
+        self.methodId = f"sheets.spreadsheets.{metodo}" # Igual que googleapiclient.http.HttpRequest
+
+    def execute(self, http=None, num_retries=0):
+        return self._backend._ejecutar(self._metodo, self._operacion)
+
+class _Values:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get(self, spreadsheetId, range, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return _Peticion(self._backend, 'values.get',
+                         lambda: self._backend._leer(range, valueRenderOption))
+
+    def batchGet(self, spreadsheetId, ranges, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return _Peticion(self._backend, 'values.batchGet',
+                         lambda: {'spreadsheetId': spreadsheetId,
+                                  'valueRanges': [self._backend._leer(r, valueRenderOption) for r in ranges]})
+
+    def update(self, spreadsheetId, range, body, valueInputOption='RAW', **kwargs):
+        return _Peticion(self._backend, 'values.update',
+                         lambda: self._backend._escribir(range, body.get('values', [])))
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def operacion():
+            respuestas = [self._backend._escribir(d['range'], d.get('values', [])) for d in body.get('data', [])]
+            return {'spreadsheetId': spreadsheetId, 'totalUpdatedCells': sum(r['updatedCells'] for r in respuestas),
+                    'responses': respuestas}
+        return _Peticion(self._backend, 'values.batchUpdate', operacion)
+
+class FakeSheetsService:
+    """
+    Sustituto en memoria del subconjunto de la API de Sheets v4 que usa el bot
+    (values.get, update, batchGet, batchUpdate), con latencia configurable e inyección de errores 429.
+    Cada hoja 'Nau X' tiene fechas en B7:B101 (incluida la de hoy), bajas en D/E y el total en I2 (=SUMA de D y E).
+    """
+
+    def __init__(self, naus=('A', 'B'), latencia: float = 0.0, prob_429: float = 0.0, semilla: int | None = None,
+                 dias_antes_de_hoy: int = 30):
+        self.latencia = latencia
+        self.prob_429 = prob_429
+        self._random = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._celdas = {} # {(hoja, columna, fila): valor}
+        self.llamadas = {}
+        self.errores_429 = 0
+
+        inicio = datetime.date.today() - datetime.timedelta(days=dias_antes_de_hoy)
+        for nau in naus:
+            self.crear_nau(nau, inicio)
+
+    def crear_nau(self, nau: str, primera_fecha: datetime.date | None = None):
+        if primera_fecha is None:
+            primera_fecha = datetime.date.today() - datetime.timedelta(days=30)
+        hoja = f"Nau {nau}"
+        col_b = _columna_a_indice('B')
+        with self._lock:
+            for i, fila in enumerate(range(PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS + 1)):
+                fecha = primera_fecha + datetime.timedelta(days=i)
+                self._celdas[(hoja, col_b, fila)] = fecha.strftime("%d/%m/%y")
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _Values(self)
+
+    def total_llamadas(self) -> int:
+        with self._lock:
+            return sum(self.llamadas.values())
+
+    def valor(self, nau: str, celda: str):
+        """Valor actual de una celda (para comprobaciones en benchmarks)."""
+        hoja, c, f, _, _ = _parsear_rango(f"'Nau {nau}'!{celda}")
+        with self._lock:
+            return self._valor_celda(hoja, c, f)
+
+    def ejecutar_remoto(self, metodo: str, kwargs: dict):
+        """Ejecuta una petición recibida de otro proceso (FakeSheetsRemoto): 'values.get', {'range': ...}."""
+        return getattr(self.values(), metodo.removeprefix('values.'))(**kwargs).execute()
+
+    def _ejecutar(self, metodo: str, operacion):
+        with self._lock:
+            self.llamadas[metodo] = self.llamadas.get(metodo, 0) + 1
+            error = self.prob_429 > 0 and self._random.random() < self.prob_429
+            if error:
+                self.errores_429 += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if error:
+            contenido = json.dumps({'error': {'code': 429, 'message': 'Quota exceeded (simulado)', 'status': 'RESOURCE_EXHAUSTED'}})
+            raise HttpError(httplib2.Response({'status': 429}), contenido.encode('utf-8'))
+        with self._lock:
+            return operacion()
+
+    def _valor_celda(self, hoja: str, columna: int, fila: int):
+        if (columna, fila) == (_columna_a_indice('I'), 2):
+            total = 0
+            for col in (_columna_a_indice('D'), _columna_a_indice('E')):
+                for f in range(PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS + 1):
+                    valor = self._celdas.get((hoja, col, f))
+                    if isinstance(valor, (int, float)):
+                        total += valor
+            return total
+        return self._celdas.get((hoja, columna, fila))
+
+    def _leer(self, rango: str, value_render_option: str) -> dict:
+        hoja, c1, f1, c2, f2 = _parsear_rango(rango)
+        filas = []
+        for f in range(f1, f2 + 1):
+            fila = []
+            for c in range(c1, c2 + 1):
+                valor = self._valor_celda(hoja, c, f)
+                if valor is None:
+                    fila.append("")
+                elif value_render_option == 'FORMATTED_VALUE':
+                    fila.append(str(valor))
+                else:
+                    fila.append(valor)
+            while fila and fila[-1] == "": # La API omite las celdas vacías del final
+                fila.pop()
+            filas.append(fila)
+        while filas and not filas[-1]:
+            filas.pop()
+        respuesta = {'range': rango, 'majorDimension': 'ROWS'}
+        if filas:
+            respuesta['values'] = filas
+        return respuesta
+
+    def _escribir(self, rango: str, values: list) -> dict:
+        hoja, c1, f1, _, _ = _parsear_rango(rango)
+        actualizadas = 0
+        for i, fila in enumerate(values):
+            for j, valor in enumerate(fila):
+                self._celdas[(hoja, c1 + j, f1 + i)] = valor
+                actualizadas += 1
+        return {'updatedRange': rango, 'updatedCells': actualizadas}
+
+class _ValuesLibros:
+    def __init__(self, libros: dict):
+        self._libros = libros
+
+    def __getattr__(self, metodo):
+        def llamada(spreadsheetId, **kwargs):
+            return getattr(self._libros[spreadsheetId].values(), metodo)(spreadsheetId=spreadsheetId, **kwargs)
+        return llamada
+
+class FakeLibrosSheets:
+    """
+    Varias hojas de cálculo simuladas (una por granja) detrás de un solo servicio, como la cuenta de servicio real.
+    Cada petición va al FakeSheetsService de su spreadsheetId, con su propia latencia y errores 429.
+    """
+
+    def __init__(self, libros: dict):
+        self.libros = libros # {spreadsheet_id: FakeSheetsService}
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _ValuesLibros(self.libros)
+
+    def total_llamadas(self) -> int:
+        return sum(libro.total_llamadas() for libro in self.libros.values())
+
+class _PeticionRemota:
+    def __init__(self, servidor, metodo: str, kwargs: dict):
+        self._servidor = servidor
+        self._metodo = metodo
+        self._kwargs = kwargs
+        self.methodId = f"sheets.spreadsheets.{metodo}"
+
+    def execute(self, http=None, num_retries=0):
+        return self._servidor.ejecutar_remoto(self._metodo, self._kwargs)
+
+class _ValuesRemotos:
+    def __init__(self, servidor):
+        self._servidor = servidor
+
+    def __getattr__(self, metodo):
+        def llamada(**kwargs):
+            return _PeticionRemota(self._servidor, f"values.{metodo}", kwargs)
+        return llamada
+
+class FakeSheetsRemoto:
+    """
+    Cliente de un FakeSheetsService que vive en otro proceso (proxy de multiprocessing.managers).
+    Varios procesos del bot escriben así en la misma hoja simulada, como varias instancias contra la hoja real.
+    """
+
+    def __init__(self, servidor):
+        self._servidor = servidor # Proxy con el método ejecutar_remoto
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _ValuesRemotos(self._servidor)
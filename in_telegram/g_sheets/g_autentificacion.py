@@ -1,10 +1,18 @@
 # in_telegram/g_sheets/g_autentificacion.py
 
 import logging
+import datetime
 import json
+import math
 import os
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import queue
+import threading
+import time
+import functools
+from contextlib import contextmanager
+from in_telegram.utils import granjas, metricas
+# Las librerías de Google (google.oauth2, googleapiclient, httplib2) se importan al cargar las credenciales
+# y construir el primer servicio, no al importar el módulo: así no retrasan el arranque del bot.
 
 logger = logging.getLogger(__name__)
 
@@ -16,32 +24,222 @@ _SPREADSHEET_ID_FILE = os.path.join(_SECRETS_DIR, 's_sheets.json')
 _CREDENTIALS_RW = None # Credenciales de Lectura y Escritura
 _CREDENTIALS_RO = None # Credenciales de Solo Lectura
 _SPREADSHEET_ID = None
+_credenciales_cargadas = False # Se intenta una sola vez, al primer uso o en la precarga
+_credenciales_lock = threading.Lock()
+
+_SCOPE_RW = 'https://www.googleapis.com/auth/spreadsheets'
+_SCOPE_RO = 'https://www.googleapis.com/auth/spreadsheets.readonly'
+
+_HTTP_POOL_SIZE = 8 # Conexiones keep-alive máximas por servicio (RW y RO por separado)
+_HTTP_TIMEOUT = 30 # Segundos
+
+# Renovación de los tokens OAuth: el hilo de fondo los renueva MARGEN_RENOVACION_TOKEN segundos antes de caducar.
+# Una petición solo renueva si al token le quedan menos de MARGEN_PETICION_TOKEN (google-auth lo haría por su cuenta
+# a partir de 3 min 45 s, sin compartir la renovación con las demás peticiones).
+MARGEN_RENOVACION_TOKEN = 600.0
+MARGEN_PETICION_TOKEN = 240.0
+INTERVALO_RENOVACION_TOKEN = 30.0
+ESPERA_MAXIMA_RENOVACION = 60.0
+_renovacion_lock = threading.Lock() # Una sola renovación a la vez: quien llega mientras tanto usa el token nuevo
+_renovado = {} # {id(credenciales): time.time() de la última renovación}
+_hilo_renovacion = None
+_hilo_renovacion_lock = threading.Lock()
+
+_SERVICE_RW = None
+_SERVICE_RO = None
+_service_lock = threading.Lock()
+_DOCUMENTO_DISCOVERY = None # Documento de descubrimiento de Sheets v4, leído una vez para los dos servicios
+_PETICION_CON_POOL = None
+
+# Contadores para el benchmark de conexiones (benchmarks/bench_sheets_service.py)
+_ESTADISTICAS = {'builds': 0, 'conexiones': 0}
+_estadisticas_lock = threading.Lock()
+
+def _sumar_estadistica(clave: str):
+    with _estadisticas_lock:
+        _ESTADISTICAS[clave] += 1
+
+class _HttpPool:
+    """
+    Pool de objetos AuthorizedHttp reutilizables.
+    httplib2.Http no es thread-safe, así que cada petición toma un objeto en exclusiva
+    y lo devuelve al terminar; la conexión TLS queda abierta para la siguiente.
+    """
+
+    def __init__(self, credentials, size: int):
+        self._credentials = credentials
+        self._libres = queue.LifoQueue() # LIFO: se reutiliza primero la conexión más reciente
+        self._semaforo = threading.BoundedSemaphore(size)
+
+    def _nueva_conexion(self):
+        import httplib2
+        import google_auth_httplib2
+        _sumar_estadistica('conexiones')
+        return google_auth_httplib2.AuthorizedHttp(
+            self._credentials,
+            http=httplib2.Http(timeout=_HTTP_TIMEOUT)
+        )
+
+    @contextmanager
+    def conexion(self):
+        # Normalmente el hilo de fondo ya lo ha renovado y no se espera nada
+        _renovar_token(self._credentials, "peticion", MARGEN_PETICION_TOKEN)
+        self._semaforo.acquire()
+        try:
+            try:
+                http = self._libres.get_nowait()
+            except queue.Empty:
+                http = self._nueva_conexion()
+            try:
+                yield http
+            finally:
+                self._libres.put(http)
+        finally:
+            self._semaforo.release()
+
+def _segundos_para_caducar(credenciales) -> float:
+    if not credenciales.valid:
+        return 0.0 # Sin token todavía o ya caducado
+    if credenciales.expiry is None:
+        return math.inf # No caduca (credenciales anónimas de los benchmarks)
+    # google-auth guarda la caducidad en UTC sin zona horaria
+    ahora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (credenciales.expiry - ahora).total_seconds()
+
+def _renovar_token(credenciales, origen: str, margen: float) -> None:
+    """Renueva el token si caduca en menos de 'margen' segundos. Las llamadas concurrentes comparten una sola renovación."""
+    if _segundos_para_caducar(credenciales) > margen:
+        return
+    with _renovacion_lock:
+        if _segundos_para_caducar(credenciales) > margen:
+            return # Lo ha renovado otro hilo mientras se esperaba
+        import httplib2
+        import google_auth_httplib2
+        inicio = time.perf_counter()
+        estado = "ok"
+        try:
+            credenciales.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=_HTTP_TIMEOUT)))
+            _renovado[id(credenciales)] = time.time()
+        except Exception:
+            estado = "error"
+            raise
+        finally:
+            metricas.incrementar("baixes_sheets_renovaciones_token_total", (origen, estado))
+        if origen == "peticion":
+            logger.warning("Token de Google renovado durante una petición (%.0f ms).", (time.perf_counter() - inicio) * 1000)
+        else:
+            logger.info("Token de Google renovado en segundo plano (%.0f ms).", (time.perf_counter() - inicio) * 1000)
+
+def _credenciales_en_uso() -> list:
+    return [c for c in (_CREDENTIALS_RW, _CREDENTIALS_RO) if c is not None]
+
+def antiguedad_token() -> float:
+    """Segundos desde la renovación del token más antiguo (0 si aún no se ha obtenido ninguno)."""
+    ahora = time.time()
+    edades = [ahora - _renovado[id(c)] for c in _credenciales_en_uso() if id(c) in _renovado]
+    return round(max(edades), 1) if edades else 0.0
+
+def caducidad_token() -> float:
+    """Segundos hasta que caduque el primero de los tokens (0 si falta alguno)."""
+    restantes = [_segundos_para_caducar(c) for c in _credenciales_en_uso()]
+    restantes = [r for r in restantes if r != math.inf]
+    return round(max(0.0, min(restantes)), 1) if restantes else 0.0
+
+def _bucle_renovacion():
+    espera_error = 0.0
+    while True:
+        _load_credentials_and_id()
+        try:
+            for credenciales in _credenciales_en_uso():
+                _renovar_token(credenciales, "fondo", MARGEN_RENOVACION_TOKEN)
+            espera_error = 0.0
+        except Exception as e:
+            espera_error = min(ESPERA_MAXIMA_RENOVACION, max(5.0, espera_error * 2))
+            logger.error("No se pudo renovar el token de Google: %s. Reintento en %.0f s.", e, espera_error)
+        time.sleep(espera_error or INTERVALO_RENOVACION_TOKEN)
+
+def iniciar_renovacion() -> None:
+    """Arranca (una sola vez) el hilo que renueva los tokens RW y RO antes de que caduquen."""
+    global _hilo_renovacion
+    if _hilo_renovacion is not None:
+        return
+    with _hilo_renovacion_lock:
+        if _hilo_renovacion is not None:
+            return
+        _hilo_renovacion = threading.Thread(target=_bucle_renovacion, name="renovacion-token", daemon=True)
+        _hilo_renovacion.start()
+
+def _clase_peticion():
+    """HttpRequest que ejecuta cada petición con una conexión prestada del pool (se define al primer uso)."""
+    global _PETICION_CON_POOL
+    if _PETICION_CON_POOL is None:
+        from googleapiclient.http import HttpRequest
+
+        class _PooledHttpRequest(HttpRequest):
+            def __init__(self, pool: _HttpPool, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self._pool = pool
+
+            def execute(self, http=None, num_retries=0):
+                if http is not None:
+                    return super().execute(http=http, num_retries=num_retries)
+                with self._pool.conexion() as http_pool:
+                    return super().execute(http=http_pool, num_retries=num_retries)
+
+        _PETICION_CON_POOL = _PooledHttpRequest
+    return _PETICION_CON_POOL
+
+def _documento_discovery():
+    # Documento incluido en la librería: sin red y sin volver a leerlo y parsearlo para el segundo servicio
+    global _DOCUMENTO_DISCOVERY
+    if _DOCUMENTO_DISCOVERY is None:
+        from googleapiclient import discovery_cache
+        _DOCUMENTO_DISCOVERY = discovery_cache.get_static_doc('sheets', 'v4')
+    return _DOCUMENTO_DISCOVERY
+
+def _build_service(credentials):
+    """Se llama con _service_lock tomado."""
+    from googleapiclient.discovery import build_from_document
+    _sumar_estadistica('builds')
+    pool = _HttpPool(credentials, _HTTP_POOL_SIZE)
+    return build_from_document(
+        _documento_discovery(),
+        credentials=credentials,
+        requestBuilder=functools.partial(_clase_peticion(), pool)
+    )
 
 def _load_credentials_and_id():
-    global _CREDENTIALS_RW, _CREDENTIALS_RO, _SPREADSHEET_ID
-    if _CREDENTIALS_RW and _CREDENTIALS_RO and _SPREADSHEET_ID: # Ya cargadas
+    """Carga las credenciales y el ID de la hoja la primera vez que se necesitan (una sola vez, aunque falle)."""
+    global _credenciales_cargadas
+    if _credenciales_cargadas:
         return
+    with _credenciales_lock:
+        if _credenciales_cargadas:
+            return
+        _cargar_credenciales()
+        _credenciales_cargadas = True
 
+def _cargar_credenciales():
+    global _CREDENTIALS_RW, _CREDENTIALS_RO, _SPREADSHEET_ID
     try:
+        from google.oauth2 import service_account
+
         # 1. Cargar las credenciales de la cuenta de servicio (con ámbito de Lectura/Escritura)
         _CREDENTIALS_RW = service_account.Credentials.from_service_account_file(
             _SERVICE_ACCOUNT_FILE,
-            scopes=['https://www.googleapis.com/auth/spreadsheets'] # Permiso completo (Lectura y Escritura)
-        )
-        
-        # 2. Crear credenciales de solo lectura a partir de las credenciales RW
-        _CREDENTIALS_RO = service_account.Credentials.from_service_account_file(
-            _SERVICE_ACCOUNT_FILE,
-            scopes=['https://www.googleapis.com/auth/spreadsheets.readonly'] # Permiso de Solo Lectura
+            scopes=[_SCOPE_RW] # Permiso completo (Lectura y Escritura)
         )
 
+        # 2. Crear credenciales de solo lectura a partir de las credenciales RW (sin volver a leer el archivo)
+        _CREDENTIALS_RO = _CREDENTIALS_RW.with_scopes([_SCOPE_RO]) # Permiso de Solo Lectura
+
         # 3. Cargar el ID de la hoja de cálculo
         with open(_SPREADSHEET_ID_FILE, 'r', encoding='utf-8') as f:
             spreadsheet_config = json.load(f)
             _SPREADSHEET_ID = spreadsheet_config.get('spreadsheet_id')
         
         if not _SPREADSHEET_ID:
-            logger.error(f"Spreadsheet ID no encontrado en {_SPREADSHEET_ID_FILE}. Asegúrate de que el JSON contiene la clave 'spreadsheet_id'.")
+            logger.error("Spreadsheet ID no encontrado en %s. Asegúrate de que el JSON contiene la clave 'spreadsheet_id'.", _SPREADSHEET_ID_FILE)
             # Invalidar credenciales si falta ID
             _CREDENTIALS_RW = None 
             _CREDENTIALS_RO = None
@@ -50,43 +248,92 @@ def _load_credentials_and_id():
         logger.info("Credenciales (RW/RO) y Spreadsheet ID de Google Sheets cargados correctamente.")
 
     except FileNotFoundError as e:
-        logger.error(f"Archivo de credenciales o Spreadsheet ID no encontrado: {e}. Asegúrate de que 'sheets_service_account.json' y 'spreadsheet_id.json' están en '{_SECRETS_DIR}'.")
+        logger.error("Archivo de credenciales o Spreadsheet ID no encontrado: %s. Asegúrate de que 'sheets_service_account.json' y 'spreadsheet_id.json' están en '%s'.", e, _SECRETS_DIR)
         _CREDENTIALS_RW = None
         _CREDENTIALS_RO = None
         _SPREADSHEET_ID = None
     except json.JSONDecodeError:
-        logger.error(f"Error al decodificar JSON desde el archivo de configuración. Revisa el formato de '{_SERVICE_ACCOUNT_FILE}' o '{_SPREADSHEET_ID_FILE}'.")
+        logger.error("Error al decodificar JSON desde el archivo de configuración. Revisa el formato de '%s' o '%s'.", _SERVICE_ACCOUNT_FILE, _SPREADSHEET_ID_FILE)
         _CREDENTIALS_RW = None
         _CREDENTIALS_RO = None
         _SPREADSHEET_ID = None
     except Exception as e:
-        logger.error(f"Error inesperado al cargar la configuración de Google Sheets: {e}")
+        logger.error("Error inesperado al cargar la configuración de Google Sheets: %s", e)
         _CREDENTIALS_RW = None
         _CREDENTIALS_RO = None
         _SPREADSHEET_ID = None
 
-_load_credentials_and_id()
+def precargar() -> None:
+    """Carga las credenciales y construye los dos servicios. Se lanza en segundo plano al arrancar el bot."""
+    inicio = time.perf_counter()
+    if get_sheets_service_rw() is not None and get_sheets_service_ro() is not None:
+        logger.info("Servicios de Google Sheets preparados en %.0f ms.", (time.perf_counter() - inicio) * 1000)
 
 
 def get_sheets_service_rw():# Permiso de Lectura y Escritura
+    global _SERVICE_RW
+    if _SERVICE_RW is not None:
+        return _SERVICE_RW
+    _load_credentials_and_id()
     if not _CREDENTIALS_RW:
         logger.error("No se pudieron obtener credenciales de LECTURA/ESCRITURA. No se puede construir el servicio de Sheets.")
         return None
-    try:
-        return build('sheets', 'v4', credentials=_CREDENTIALS_RW)
-    except Exception as e:
-        logger.error(f"Error al construir el servicio de Google Sheets (RW): {e}")
-        return None
+    with _service_lock:
+        if _SERVICE_RW is None:
+            try:
+                _SERVICE_RW = _build_service(_CREDENTIALS_RW)
+            except Exception as e:
+                logger.error("Error al construir el servicio de Google Sheets (RW): %s", e)
+                return None
+    return _SERVICE_RW
 
 def get_sheets_service_ro():#solo permiso de lectura
+    global _SERVICE_RO
+    if _SERVICE_RO is not None:
+        return _SERVICE_RO
+    _load_credentials_and_id()
     if not _CREDENTIALS_RO:
         logger.error("No se pudieron obtener credenciales de SOLO LECTURA. No se puede construir el servicio de Sheets.")
         return None
-    try:
-        return build('sheets', 'v4', credentials=_CREDENTIALS_RO)
-    except Exception as e:
-        logger.error(f"Error al construir el servicio de Google Sheets (RO): {e}")
-        return None
+    with _service_lock:
+        if _SERVICE_RO is None:
+            try:
+                _SERVICE_RO = _build_service(_CREDENTIALS_RO)
+            except Exception as e:
+                logger.error("Error al construir el servicio de Google Sheets (RO): %s", e)
+                return None
+    return _SERVICE_RO
+
+def reset_services():
+    """Descarta los servicios y conexiones compartidos (se reconstruyen en la próxima llamada)."""
+    global _SERVICE_RW, _SERVICE_RO
+    with _service_lock:
+        _SERVICE_RW = None
+        _SERVICE_RO = None
+
+def usar_sheets_simulado(servicio=None, spreadsheet_id: str = 'simulado'):
+    """
+    Sustituye los servicios RW/RO por el backend en memoria de fake_sheets (pruebas y benchmarks sin red).
+    Retorna el servicio simulado en uso.
+    """
+    global _SERVICE_RW, _SERVICE_RO, _SPREADSHEET_ID, _credenciales_cargadas
+    if servicio is None:
+        from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+        servicio = FakeSheetsService()
+    with _service_lock:
+        _SERVICE_RW = servicio
+        _SERVICE_RO = servicio
+        _SPREADSHEET_ID = spreadsheet_id
+        _credenciales_cargadas = True # No se leen los secretos reales
+    logger.warning("Usando el backend de Google Sheets SIMULADO en memoria.")
+    return servicio
+
+def estadisticas_conexion() -> dict:
+    """Número de servicios construidos y conexiones HTTP abiertas desde el arranque."""
+    with _estadisticas_lock:
+        return dict(_ESTADISTICAS)
 
 def get_spreadsheet_id() -> str:
-    return _SPREADSHEET_ID
\ No newline at end of file
+    """Hoja de la granja en curso; si la granja no tiene una propia, la de s_sheets.json."""
+    _load_credentials_and_id()
+    return granjas.actual().spreadsheet_id or _SPREADSHEET_ID
\ No newline at end of file
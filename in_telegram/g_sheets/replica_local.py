@@ -0,0 +1,327 @@
+# in_telegram/g_sheets/replica_local.py
+
+import logging
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from in_telegram.g_sheets.sheets_api import ejecutar
+from in_telegram.g_sheets.g_autentificacion import get_sheets_service_ro, get_spreadsheet_id
+from in_telegram.g_sheets.buscar_data_actual import guardar_fila_fecha
+from in_telegram.utils import granjas
+from in_telegram.utils.registre_naus import registro, RegistroNaus
+
+logger = logging.getLogger(__name__)
+
+# None: archivo temporal del proceso (benchmarks, pruebas). inicio.main usa 'datos/replica.sqlite3'.
+# Las granjas que no son la principal usan '<ruta>-<granja>.sqlite3'
+REPLICA_PATH = None
+INTERVALO_REFRESCO = 60.0 # Segundos entre lecturas completas de la hoja (un batchGet para todas las naus)
+AVISO_ANTIGUEDAD = 180.0 # A partir de esta antigüedad los informes avisan de que los datos no están al día
+PRIMERA_FILA = 7
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS filas (
+    nave TEXT NOT NULL,
+    fila INTEGER NOT NULL,
+    fecha TEXT,
+    sac,
+    no_sac,
+    PRIMARY KEY (nave, fila)
+);
+CREATE INDEX IF NOT EXISTS idx_filas_fecha ON filas (nave, fecha);
+CREATE TABLE IF NOT EXISTS totales (
+    nave TEXT PRIMARY KEY,
+    total
+);
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor
+);
+"""
+
+class _Replica:
+    """Réplica de la hoja de una granja: archivo, conexión e hilo de refresco propios."""
+
+    __slots__ = ('granja', 'conexion', 'db_lock', 'refresco_lock', 'evento', 'hilo', 'escrituras_en_refresco')
+
+    def __init__(self, granja: granjas.Granja):
+        self.granja = granja
+        self.conexion = None
+        self.db_lock = threading.Lock()
+        self.refresco_lock = threading.Lock() # Un solo refresco a la vez
+        self.evento = threading.Event()
+        self.hilo = None
+        # Durante un refresco (protegido por db_lock): {(nave, campo, fila): valor} escritos por el bot desde su lectura.
+        # La foto de la hoja puede ser anterior a esas escrituras; al guardarla se vuelven a aplicar. None: sin refresco
+        self.escrituras_en_refresco = None
+
+    def db(self) -> sqlite3.Connection:
+        """Conexión única de la granja (protegida por db_lock). Se crea al primer uso."""
+        if self.conexion is None:
+            ruta = self.granja.ruta(REPLICA_PATH or granjas.ruta_temporal('replica.sqlite3'))
+            directorio = os.path.dirname(ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=30.0)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(_ESQUEMA)
+            self.conexion = conexion
+        return self.conexion
+
+_replicas = {} # {granja: _Replica}
+_replicas_lock = threading.Lock()
+
+def _replica() -> _Replica:
+    """Réplica de la granja en curso."""
+    granja = granjas.actual()
+    with _replicas_lock:
+        replica = _replicas.get(granja.nombre)
+        if replica is None:
+            replica = _Replica(granja)
+            _replicas[granja.nombre] = replica
+    return replica
+
+def _normalizar(valor):
+    """Enteros como int (la API devuelve 3.0 para celdas con formato numérico); vacío como None."""
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def _celda(fila: list, indice: int):
+    return _normalizar(fila[indice]) if indice < len(fila) else None
+
+def refrescar(registro_naus: RegistroNaus | None = None) -> None:
+    """
+    Sustituye la réplica de la granja en curso por el contenido actual de su hoja
+    (fechas, SAC, NO SAC y total) con un solo batchGet.
+    Las escrituras del bot que llegan entre la lectura y el guardado se conservan (la foto puede ser anterior a ellas).
+    """
+    if registro_naus is None:
+        registro_naus = registro()
+    naves = registro_naus.naus
+    if not naves:
+        return
+
+    service_ro = get_sheets_service_ro()
+    spreadsheet_id = get_spreadsheet_id()
+    if not service_ro or not spreadsheet_id:
+        raise RuntimeError("Servicio de Google Sheets (RO) o Spreadsheet ID no disponibles.")
+
+    replica = _replica()
+    with replica.refresco_lock:
+        with replica.db_lock:
+            replica.escrituras_en_refresco = {} # Antes de leer: cualquier escritura posterior queda anotada
+        try:
+            rangos = [registro_naus.rangos_diarios[nave] for nave in naves] + [registro_naus.rangos_total[nave] for nave in naves]
+            result = ejecutar(service_ro.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=rangos,
+                valueRenderOption='UNFORMATTED_VALUE',
+                dateTimeRenderOption='FORMATTED_STRING' # Las fechas con el mismo formato que se ve en la hoja
+            ))
+            value_ranges = result.get('valueRanges', [])
+
+            fecha_actual = datetime.date.today().strftime("%d/%m/%y")
+            filas, totales = [], []
+            for i, nave in enumerate(naves):
+                valores = value_ranges[i].get('values', []) if i < len(value_ranges) else []
+                for offset, fila in enumerate(valores):
+                    fecha = _celda(fila, 0)
+                    fecha = str(fecha) if fecha is not None else None
+                    filas.append((nave, PRIMERA_FILA + offset, fecha, _celda(fila, 2), _celda(fila, 3)))
+                    if fecha == fecha_actual:
+                        guardar_fila_fecha(nave, fecha_actual, PRIMERA_FILA + offset)
+                j = len(naves) + i
+                total = value_ranges[j].get('values', []) if j < len(value_ranges) else []
+                totales.append((nave, _celda(total[0], 0) if total else None))
+
+            with replica.db_lock:
+                escritas = replica.escrituras_en_refresco
+                # Naus con escrituras del bot desde la lectura: su total local ya las suma; el de la foto puede que no
+                naves_escritas = {nave for nave, _, _ in escritas}
+                db = replica.db()
+                db.execute("BEGIN IMMEDIATE") # El archivo puede compartirse con otras instancias del bot
+                try:
+                    db.executemany("DELETE FROM filas WHERE nave = ?", [(nave,) for nave in naves])
+                    db.executemany("INSERT INTO filas (nave, fila, fecha, sac, no_sac) VALUES (?, ?, ?, ?, ?)", filas)
+                    for (nave, campo, fila), valor in escritas.items():
+                        db.execute(f"UPDATE filas SET {campo} = ? WHERE nave = ? AND fila = ?", (valor, nave, fila))
+                    db.executemany("INSERT OR REPLACE INTO totales (nave, total) VALUES (?, ?)",
+                                   [(nave, total) for nave, total in totales if nave not in naves_escritas])
+                    db.executemany("INSERT OR IGNORE INTO totales (nave, total) VALUES (?, ?)",
+                                   [(nave, total) for nave, total in totales if nave in naves_escritas])
+                    db.execute("INSERT OR REPLACE INTO estado (clave, valor) VALUES ('actualizada', ?)", (time.time(),))
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+        finally:
+            with replica.db_lock:
+                replica.escrituras_en_refresco = None
+    if escritas:
+        logger.info("Réplica local de la granja %s: %s escrituras del bot durante el refresco conservadas.",
+                    replica.granja.nombre, len(escritas))
+    logger.info("Réplica local de la granja %s actualizada: %s naus, %s filas.", replica.granja.nombre, len(naves), len(filas))
+
+def antiguedad() -> float | None:
+    """Segundos desde el último refresco completo, o None si la réplica nunca se ha cargado."""
+    replica = _replica()
+    with replica.db_lock:
+        fila = replica.db().execute("SELECT valor FROM estado WHERE clave = 'actualizada'").fetchone()
+    return time.time() - fila[0] if fila is not None else None
+
+def antiguedad_maxima() -> float | None:
+    """La antigüedad de la réplica más atrasada de todas las granjas abiertas (para las métricas)."""
+    with _replicas_lock:
+        replicas = list(_replicas.values())
+    edades = []
+    for replica in replicas:
+        with granjas.contexto_granja(replica.granja):
+            edad = antiguedad()
+        if edad is not None:
+            edades.append(edad)
+    return max(edades, default=None)
+
+def aviso_antiguedad() -> str | None:
+    """Texto para añadir a los informes si los datos no están al día."""
+    edad = antiguedad()
+    if edad is None or edad < AVISO_ANTIGUEDAD:
+        return None
+    return f"(Atenció: dades del full de càlcul de fa {int(edad // 60)} min, no s'han pogut actualitzar.)"
+
+def asegurar_cargada(registro_naus: RegistroNaus | None = None, forzar: bool = False) -> None:
+    """Refresca ahora si se pide, si la réplica está vacía o si le falta alguna nau del registro."""
+    if registro_naus is None:
+        registro_naus = registro()
+    if not forzar:
+        replica = _replica()
+        with replica.db_lock:
+            cargadas = {fila[0] for fila in replica.db().execute("SELECT nave FROM totales")}
+        if registro_naus.conjunto <= cargadas and antiguedad() is not None:
+            return
+    refrescar(registro_naus)
+
+def _pendientes_diario() -> dict:
+    # Import diferido: el diario importa este módulo para la escritura directa en la réplica
+    from in_telegram.g_sheets import diario_escrituras
+    try:
+        return diario_escrituras.pendientes_por_celda()
+    except Exception as e:
+        logger.error("No se pudieron leer las baixes pendientes del diario: %s", e)
+        return {}
+
+def _sumar(valor, incremento: int):
+    if not incremento:
+        return valor
+    if valor is None:
+        return incremento
+    if isinstance(valor, (int, float)):
+        return valor + incremento
+    return valor # Texto en la celda: se muestra tal cual
+
+def fila_de_fecha(nave: str, fecha: str) -> int | None:
+    replica = _replica()
+    with replica.db_lock:
+        fila = replica.db().execute("SELECT fila FROM filas WHERE nave = ? AND fecha = ? ORDER BY fila LIMIT 1", (nave, fecha)).fetchone()
+    return fila[0] if fila is not None else None
+
+def bajas_del_dia(nave: str, fecha: str):
+    """
+    (SAC, NO SAC) de la nau en la fecha, o None si la fecha no está en la hoja.
+    Incluye las baixes confirmadas al operario que el diario aún no ha aplicado.
+    """
+    replica = _replica()
+    with replica.db_lock:
+        fila = replica.db().execute("SELECT sac, no_sac FROM filas WHERE nave = ? AND fecha = ? ORDER BY fila LIMIT 1", (nave, fecha)).fetchone()
+    if fila is None:
+        return None
+    pendientes = _pendientes_diario()
+    return (_sumar(fila[0], pendientes.get((nave, fecha, 'D'), 0)),
+            _sumar(fila[1], pendientes.get((nave, fecha, 'E'), 0)))
+
+def filas_diarias(naves) -> list[tuple]:
+    """
+    [(nau, fila, fecha, sac, no_sac), ...] de todas las filas de la hoja de las naus indicadas.
+    Las celdas vacías o con texto se devuelven como 0 para poder operar con ellas directamente.
+    """
+    naves = list(naves)
+    if not naves:
+        return []
+    marcas = ",".join("?" * len(naves))
+    replica = _replica()
+    with replica.db_lock:
+        return replica.db().execute(
+            "SELECT nave, fila, fecha,"
+            " CASE WHEN typeof(sac) IN ('integer', 'real') THEN sac ELSE 0 END,"
+            " CASE WHEN typeof(no_sac) IN ('integer', 'real') THEN no_sac ELSE 0 END"
+            f" FROM filas WHERE nave IN ({marcas}) ORDER BY nave, fila", naves).fetchall()
+
+def totales(naves) -> list[tuple[str, object]]:
+    """[(nau, total), ...] en el orden indicado, incluyendo las baixes pendientes del diario."""
+    replica = _replica()
+    with replica.db_lock:
+        guardados = dict(replica.db().execute("SELECT nave, total FROM totales").fetchall())
+    pendientes_nave = {}
+    for (nave, _, _), cantidad in _pendientes_diario().items():
+        pendientes_nave[nave] = pendientes_nave.get(nave, 0) + cantidad
+    return [(nave, _sumar(guardados.get(nave), pendientes_nave.get(nave, 0))) for nave in naves]
+
+def guardar_celda(nave: str, columna: str, fila: int, valor, incremento_total: int = 0) -> None:
+    """Escritura directa tras una escritura del bot en la hoja: D/E con el valor escrito y el total sumando el incremento."""
+    campo = {'D': 'sac', 'E': 'no_sac'}.get(columna)
+    if campo is None:
+        return
+    replica = _replica()
+    with replica.db_lock:
+        if replica.escrituras_en_refresco is not None:
+            replica.escrituras_en_refresco[(nave, campo, fila)] = valor
+        db = replica.db()
+        db.execute(f"UPDATE filas SET {campo} = ? WHERE nave = ? AND fila = ?", (valor, nave, fila))
+        if incremento_total:
+            total = db.execute("SELECT total FROM totales WHERE nave = ?", (nave,)).fetchone()
+            if total is not None:
+                db.execute("UPDATE totales SET total = ? WHERE nave = ?", (_sumar(total[0], incremento_total), nave))
+
+def guardar_celdas(celdas: list) -> None:
+    """guardar_celda para varias celdas escritas con un mismo batchUpdate: [(nave, columna, fila, valor, incremento_total), ...]."""
+    for celda in celdas:
+        guardar_celda(*celda)
+
+def vaciar() -> None:
+    """Borra la réplica de la granja en curso (la siguiente consulta la vuelve a cargar)."""
+    replica = _replica()
+    with replica.db_lock:
+        db = replica.db()
+        db.execute("DELETE FROM filas")
+        db.execute("DELETE FROM totales")
+        db.execute("DELETE FROM estado")
+
+def _bucle_refresco(replica: _Replica):
+    while True:
+        replica.evento.wait(INTERVALO_REFRESCO)
+        replica.evento.clear()
+        with granjas.contexto_granja(granjas.vigente(replica.granja)):
+            try:
+                refrescar()
+            except Exception as e:
+                logger.error("Error al refrescar la réplica local de la granja %s (antigüedad %s s): %s",
+                             replica.granja.nombre, int(antiguedad() or 0), e)
+
+def iniciar_refresco() -> None:
+    """Arranca (una sola vez por granja) el hilo que refresca la réplica de la granja en curso cada INTERVALO_REFRESCO segundos."""
+    replica = _replica()
+    with _replicas_lock:
+        if replica.hilo is not None:
+            return
+        replica.hilo = threading.Thread(target=_bucle_refresco, args=(replica,),
+                                        name=f"refresco-replica-{replica.granja.nombre}", daemon=True)
+        replica.hilo.start()
+        replica.evento.set() # Primer refresco al arrancar
+
+def pedir_refresco() -> None:
+    """Adelanta el siguiente refresco del hilo de la granja en curso."""
+    _replica().evento.set()
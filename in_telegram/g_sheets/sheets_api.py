@@ -0,0 +1,106 @@
+# in_telegram/g_sheets/sheets_api.py
+
+import logging
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+from in_telegram.g_sheets import cuota
+from in_telegram.g_sheets.g_autentificacion import _HTTP_POOL_SIZE
+from in_telegram.utils import granjas, metricas
+
+logger = logging.getLogger(__name__)
+
+# Llamadas de una misma granja en curso a la vez, como máximo. Todas las granjas comparten los pools de
+# conexiones (_HTTP_POOL_SIZE por servicio): con el tope, una hoja que tarda 30 s en cada llamada deja
+# siempre conexiones libres para las demás granjas, en cualquier modo de escritura
+MAX_LLAMADAS_POR_GRANJA = max(1, _HTTP_POOL_SIZE // 2)
+
+# Por granja: hilos dedicados a las llamadas bloqueantes de googleapiclient (tantos como su tope: más solo
+# esperarían turno) y el semáforo de sus llamadas en curso, que cuenta también las de sus hilos de fondo
+_executors = {} # {granja: ThreadPoolExecutor}
+_en_curso = {} # {granja: threading.BoundedSemaphore}
+_granjas_lock = threading.Lock()
+
+def _executor() -> ThreadPoolExecutor:
+    nombre = granjas.actual().nombre
+    with _granjas_lock:
+        if nombre not in _executors:
+            _executors[nombre] = ThreadPoolExecutor(max_workers=MAX_LLAMADAS_POR_GRANJA, thread_name_prefix=f"sheets-io-{nombre}")
+        return _executors[nombre]
+
+def _semaforo_granja() -> threading.BoundedSemaphore:
+    nombre = granjas.actual().nombre
+    with _granjas_lock:
+        if nombre not in _en_curso:
+            _en_curso[nombre] = threading.BoundedSemaphore(MAX_LLAMADAS_POR_GRANJA)
+        return _en_curso[nombre]
+
+def _metodo(peticion) -> str:
+    # 'sheets.spreadsheets.values.get' -> 'values.get'
+    metodo = getattr(peticion, 'methodId', None) or 'desconocido'
+    return metodo.removeprefix('sheets.spreadsheets.')
+
+def _retry_after(error: HttpError) -> float | None:
+    try:
+        return float(error.resp.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _ejecutar_una_vez(peticion, metodo: str):
+    if not metricas.activas():
+        return peticion.execute()
+
+    estado = "200"
+    inicio = time.perf_counter()
+    try:
+        return peticion.execute()
+    except HttpError as e:
+        estado = str(e.resp.status)
+        raise
+    except Exception:
+        estado = "error"
+        raise
+    finally:
+        metricas.observar("baixes_sheets_llamada_segundos", time.perf_counter() - inicio, (metodo,))
+        metricas.incrementar("baixes_sheets_llamadas_total", (metodo, estado))
+
+def ejecutar(peticion, prioridad: int = cuota.PRIORIDAD_CONSULTA):
+    """
+    Ejecuta una petición de la API de Sheets desde un hilo que puede bloquearse (workers, flush).
+    Espera antes a que haya cuota (las baixes de los operarios, PRIORIDAD_BAIXA, pasan delante de los informes)
+    y reintenta los 429 y 5xx con backoff exponencial. El resto de errores se propagan al momento.
+    """
+    metodo = _metodo(peticion)
+    tipo = cuota.tipo_de(metodo)
+    en_curso = _semaforo_granja()
+    intento = 0
+    while True:
+        cuota.adquirir(tipo, prioridad)
+        try:
+            with en_curso:
+                return _ejecutar_una_vez(peticion, metodo)
+        except HttpError as e:
+            estado = e.resp.status
+            if estado not in cuota.ESTADOS_REINTENTABLES or intento >= cuota.MAX_REINTENTOS:
+                raise
+            espera = cuota.espera_reintento(intento, _retry_after(e))
+            if estado == 429:
+                cuota.pausar(tipo, espera)
+            metricas.incrementar("baixes_sheets_reintentos_total", (metodo, str(estado)))
+            logger.warning("Error %s de la API en %s. Reintento %s de %s en %.1f s (cuota de %s restante: %s).",
+                           estado, metodo, intento + 1, cuota.MAX_REINTENTOS, espera, tipo, cuota.restante(tipo))
+            time.sleep(espera)
+            intento += 1
+
+async def ejecutar_async(peticion, prioridad: int = cuota.PRIORIDAD_CONSULTA):
+    """
+    Versión awaitable de ejecutar() para las corrutinas del bucle principal.
+    La llamada de red se hace en el executor de la granja, así el bucle de eventos nunca se bloquea
+    y una granja con la hoja lenta no ocupa los hilos de las demás.
+    """
+    loop = asyncio.get_running_loop()
+    # run_in_executor no copia el contexto: sin él la llamada se contaría en la granja principal
+    return await loop.run_in_executor(_executor(), contextvars.copy_context().run, ejecutar, peticion, prioridad)
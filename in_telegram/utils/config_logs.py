@@ -0,0 +1,103 @@
+# in_telegram/utils/config_logs.py
+
+import logging
+import contextvars
+import json
+import sys
+import zlib
+
+# Id de correlación del update en curso (update_id de Telegram).
+# Pasa del hilo del worker a las corrutinas del bucle principal porque run_coroutine_threadsafe copia el contexto.
+id_correlacion = contextvars.ContextVar('id_correlacion', default=None)
+# Milisegundos por etapa del update en curso. Es el mismo diccionario en el hilo y en las corrutinas.
+tiempos_etapas = contextvars.ContextVar('tiempos_etapas', default=None)
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - [%(id_correlacion)s] %(message)s'
+
+# Atributos estándar de un LogRecord: el resto son campos pasados con extra={...}
+_ATRIBUTOS_RECORD = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'id_correlacion'}
+
+class contexto_update:
+    """Marca el hilo actual como procesando un update (id de correlación y tiempos de etapa nuevos)."""
+
+    __slots__ = ('_id', '_tokens')
+
+    def __init__(self, update_id):
+        self._id = update_id
+
+    def __enter__(self):
+        self._tokens = (id_correlacion.set(self._id), tiempos_etapas.set({}))
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        id_correlacion.reset(self._tokens[0])
+        tiempos_etapas.reset(self._tokens[1])
+        return False
+
+def contexto_actual():
+    """(id, tiempos) del update en curso, para restaurarlo en otra tarea con restaurar_contexto()."""
+    return id_correlacion.get(), tiempos_etapas.get()
+
+def restaurar_contexto(contexto) -> None:
+    id_correlacion.set(contexto[0])
+    tiempos_etapas.set(contexto[1])
+
+def etapas() -> dict:
+    """Copia de los tiempos de etapa del update en curso (vacía si no hay update)."""
+    tiempos = tiempos_etapas.get()
+    return dict(tiempos) if tiempos else {}
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar solo una fracción de los mensajes INFO de los updates.
+    La decisión se toma por id de correlación, así un update muestreado conserva todas sus líneas.
+    WARNING o superior, las líneas fuera de un update y las marcadas con extra={'auditoria': True} pasan siempre.
+    """
+
+    def __init__(self, fraccion: float):
+        super().__init__()
+        self._umbral = int(max(0.0, min(1.0, fraccion)) * 10000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        id_update = id_correlacion.get()
+        record.id_correlacion = id_update if id_update is not None else '-'
+        if id_update is None or record.levelno > logging.INFO or getattr(record, 'auditoria', False):
+            return True
+        return zlib.crc32(str(id_update).encode('utf-8')) % 10000 < self._umbral
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON compacta por registro, con el id de correlación y los campos extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            'ts': round(record.created, 3),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        id_update = getattr(record, 'id_correlacion', '-')
+        if id_update != '-':
+            datos['id'] = id_update
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info:
+            datos['exc'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, separators=(',', ':'), default=str)
+
+def configurar_logging(nivel: int = logging.INFO, formato: str = 'json', muestreo: float = 0.05, stream=None) -> None:
+    """
+    Configuración única del logging del bot. Sustituye los handlers que hubiera en el logger raíz.
+    'muestreo' es la fracción de updates cuyas líneas INFO se escriben (1.0 = todas).
+    """
+    handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    if formato == 'json':
+        handler.setFormatter(FormateadorJSON())
+    else:
+        handler.setFormatter(logging.Formatter(FORMATO_TEXTO))
+    handler.addFilter(FiltroMuestreo(muestreo))
+
+    raiz = logging.getLogger()
+    raiz.handlers[:] = [handler]
+    raiz.setLevel(nivel)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -0,0 +1,259 @@
+# in_telegram/utils/granjas.py
+
+import logging
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+from in_telegram.utils import registre_naus
+from in_telegram.utils.registre_naus import RegistroNaus
+
+logger = logging.getLogger(__name__)
+
+# Tabla de enrutado. Si no existe, todos los usuarios van a la granja principal (s_sheets.json y llista_naus.json).
+# {
+#   "granges": {"nord": {"spreadsheet_id": "...", "naus": ["A", "B"]}, "sud": {"spreadsheet_id": "..."}},
+#   "xats": {"-1001234": "nord"},
+#   "usuaris": {"5678": "sud"},
+#   "per_defecte": "nord"
+# }
+# Una granja sin "spreadsheet_id" usa el de s_sheets.json y sin "naus" usa llista_naus.json.
+# Se busca primero el chat, después el usuario y por último "per_defecte". Sin "per_defecte" el resto no tiene granja.
+GRANJAS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'secrets', 'granjas.json')
+INTERVALO_COMPROBACION = 5.0 # Segundos entre comprobaciones de cambios en el archivo
+PRINCIPAL = 'principal' # Granja sin tabla de enrutado. Conserva los nombres de archivo de siempre (réplica, diario)
+
+class Granja:
+    """Foto inmutable de una granja: su hoja de cálculo y su lista de naus (None = las globales)."""
+
+    __slots__ = ('nombre', 'spreadsheet_id', 'registro')
+
+    def __init__(self, nombre: str, spreadsheet_id: str | None = None, naus=None):
+        object.__setattr__(self, 'nombre', nombre)
+        object.__setattr__(self, 'spreadsheet_id', spreadsheet_id or None)
+        object.__setattr__(self, 'registro', RegistroNaus(naus) if naus is not None else None)
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("Granja es inmutable")
+
+    def __repr__(self):
+        return f"Granja({self.nombre!r})"
+
+    def ruta(self, ruta_base: str) -> str:
+        """Archivo propio de la granja: 'datos/replica.sqlite3' -> 'datos/replica-nord.sqlite3'."""
+        if self.nombre == PRINCIPAL:
+            return ruta_base
+        base, extension = os.path.splitext(ruta_base)
+        return f"{base}-{self.nombre}{extension}"
+
+class _Tabla:
+    __slots__ = ('granjas', 'xats', 'usuaris', 'per_defecte')
+
+    def __init__(self, granjas: dict, xats: dict, usuaris: dict, per_defecte: str | None):
+        self.granjas = MappingProxyType(granjas)
+        self.xats = MappingProxyType(xats)
+        self.usuaris = MappingProxyType(usuaris)
+        self.per_defecte = per_defecte
+
+_GRANJA_PRINCIPAL = Granja(PRINCIPAL)
+_TABLA_SIN_ARCHIVO = _Tabla({PRINCIPAL: _GRANJA_PRINCIPAL}, {}, {}, PRINCIPAL)
+
+# Granja del update en curso. Pasa a las corrutinas y a asyncio.to_thread igual que el id de correlación.
+granja_actual = contextvars.ContextVar('granja_actual', default=None)
+
+_tabla = _TABLA_SIN_ARCHIVO
+_firma_archivo = None
+_recarga_lock = threading.Lock()
+_vigilante_iniciado = False
+_directorio_temporal = None
+_al_activar = [] # funcion(granja) que se ejecuta la primera vez que se trabaja para cada granja
+_activadas = set()
+_activacion_lock = threading.RLock()
+
+def _leer_tabla(file_path) -> _Tabla | None:
+    """Lee y valida la tabla. Retorna None si el archivo no tiene el formato correcto."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error("Error de formato JSON en '%s': %s", file_path, e)
+        return None
+    except Exception as e:
+        logger.error("Error al cargar la tabla de granjas desde '%s': %s", file_path, e)
+        return None
+
+    if not isinstance(config, dict) or not isinstance(config.get('granges'), dict) or not config['granges']:
+        logger.error("El formato de '%s' es incorrecto. Debe contener 'granges' con al menos una granja.", file_path)
+        return None
+
+    granjas = {}
+    for nombre, datos in config['granges'].items():
+        datos = datos or {}
+        naus = datos.get('naus')
+        if naus is not None and (not isinstance(naus, list) or not all(isinstance(n, str) for n in naus)):
+            logger.error("Las naus de la granja '%s' en '%s' deben ser una lista de cadenas de texto.", nombre, file_path)
+            return None
+        granjas[nombre] = Granja(nombre, datos.get('spreadsheet_id'), naus)
+
+    asignaciones = []
+    for clave in ('xats', 'usuaris'):
+        tabla = {}
+        for identificador, nombre in (config.get(clave) or {}).items():
+            if nombre not in granjas:
+                logger.error("'%s' de '%s' asigna %s a la granja inexistente '%s'.", clave, file_path, identificador, nombre)
+                return None
+            try:
+                tabla[int(identificador)] = granjas[nombre]
+            except ValueError:
+                logger.error("'%s' de '%s' contiene el id no numérico '%s'.", clave, file_path, identificador)
+                return None
+        asignaciones.append(tabla)
+
+    per_defecte = config.get('per_defecte')
+    if per_defecte is not None and per_defecte not in granjas:
+        logger.error("La granja por defecto '%s' de '%s' no existe.", per_defecte, file_path)
+        return None
+    return _Tabla(granjas, asignaciones[0], asignaciones[1], per_defecte)
+
+def _firma(file_path):
+    try:
+        st = os.stat(file_path)
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+    except OSError:
+        return None
+
+def recargar(forzar: bool = False) -> bool:
+    """
+    Recarga la tabla si el archivo ha cambiado. Si el archivo no es válido se mantiene la anterior;
+    si no existe, se vuelve a la granja principal única. Retorna True si se sustituyó la tabla.
+    """
+    global _tabla, _firma_archivo
+    with _recarga_lock:
+        firma = _firma(GRANJAS_FILE)
+        if not forzar and firma == _firma_archivo:
+            return False
+        _firma_archivo = firma
+
+        if firma is None:
+            tabla = _TABLA_SIN_ARCHIVO
+        else:
+            tabla = _leer_tabla(GRANJAS_FILE)
+            if tabla is None:
+                return False
+
+        _tabla = tabla
+        if firma is not None:
+            logger.info("Tabla de granjas cargada: %s (%s xats, %s usuaris, por defecto %s).",
+                        list(tabla.granjas), len(tabla.xats), len(tabla.usuaris), tabla.per_defecte)
+        return True
+
+def _bucle_vigilante():
+    while True:
+        time.sleep(INTERVALO_COMPROBACION)
+        try:
+            recargar()
+        except Exception as e:
+            logger.error("Error en la recarga de la tabla de granjas: %s", e)
+
+def iniciar_vigilante():
+    """Arranca (una sola vez) el hilo que recarga la tabla cuando cambia el archivo."""
+    global _vigilante_iniciado
+    with _recarga_lock:
+        if _vigilante_iniciado:
+            return
+        threading.Thread(target=_bucle_vigilante, name="vigilante-granjas", daemon=True).start()
+        _vigilante_iniciado = True
+
+def ruta_temporal(nombre_archivo: str) -> str:
+    """
+    Archivo en un directorio temporal del proceso, para los datos locales (diario, réplica) sin ruta configurada.
+    Así los benchmarks y las pruebas nunca escriben en los archivos del bot; inicio.main configura las rutas reales.
+    """
+    global _directorio_temporal
+    with _recarga_lock:
+        if _directorio_temporal is None:
+            _directorio_temporal = tempfile.mkdtemp(prefix="baixes-")
+            logger.warning("Sin ruta de datos configurada: diario y réplica en %s (no se conservan entre ejecuciones).",
+                           _directorio_temporal)
+    return os.path.join(_directorio_temporal, nombre_archivo)
+
+def para_update(chat_id: int | None, user_id: int | None) -> Granja | None:
+    """Granja que atiende un mensaje: la del chat, la del usuario o la de por defecto. None si no tiene."""
+    if not _vigilante_iniciado:
+        iniciar_vigilante()
+    tabla = _tabla
+    granja = tabla.xats.get(chat_id) or tabla.usuaris.get(user_id)
+    if granja is None and tabla.per_defecte is not None:
+        granja = tabla.granjas[tabla.per_defecte]
+    return granja
+
+def todas() -> tuple[Granja, ...]:
+    """Granjas de la tabla vigente (para arrancar los hilos de fondo de cada una)."""
+    return tuple(_tabla.granjas.values())
+
+def actual() -> Granja:
+    """Granja del update o hilo en curso. Fuera de un update, la principal."""
+    granja = granja_actual.get()
+    if granja is not None:
+        return granja
+    return _tabla.granjas.get(PRINCIPAL, _GRANJA_PRINCIPAL)
+
+def vigente(granja: Granja) -> Granja:
+    """La misma granja en la tabla actual (puede haber cambiado su hoja o sus naus). Si se ha quitado, la recibida."""
+    return _tabla.granjas.get(granja.nombre, granja)
+
+def al_activar(funcion) -> None:
+    """
+    Registra una función que se ejecuta, dentro del contexto de la granja, la primera vez que se trabaja para cada granja
+    (p. ej. arrancar sus hilos de fondo). También se ejecuta para las granjas que ya estaban activadas.
+    Así una granja añadida a la tabla con el bot en marcha tiene lo mismo que las del arranque.
+    """
+    with _activacion_lock:
+        _al_activar.append(funcion)
+        activadas = [g for g in _tabla.granjas.values() if g.nombre in _activadas]
+    for granja in activadas:
+        with contexto_granja(granja):
+            _ejecutar_activacion(funcion, granja)
+
+def _ejecutar_activacion(funcion, granja: Granja) -> None:
+    try:
+        funcion(granja)
+    except Exception as e:
+        logger.error("Error al activar la granja %s: %s", granja.nombre, e)
+
+def activar(granja: Granja) -> None:
+    """Ejecuta las funciones de al_activar para la granja si todavía no se ha hecho."""
+    if granja.nombre in _activadas:
+        return
+    with _activacion_lock:
+        if granja.nombre in _activadas:
+            return
+        _activadas.add(granja.nombre)
+        funciones = list(_al_activar)
+    with contexto_granja(granja):
+        for funcion in funciones:
+            _ejecutar_activacion(funcion, granja)
+
+class contexto_granja:
+    """Marca el hilo actual como trabajando para una granja: hoja de cálculo, naus, cachés y colas de escritura."""
+
+    __slots__ = ('_granja', '_tokens')
+
+    def __init__(self, granja: Granja):
+        self._granja = granja
+
+    def __enter__(self):
+        self._tokens = (granja_actual.set(self._granja), registre_naus.registro_granja.set(self._granja.registro))
+        if self._granja.nombre not in _activadas:
+            activar(self._granja)
+        return self._granja
+
+    def __exit__(self, tipo, valor, traza):
+        granja_actual.reset(self._tokens[0])
+        registre_naus.registro_granja.reset(self._tokens[1])
+        return False
+
+recargar(forzar=True)
@@ -1,20 +1,190 @@
 # in_telegram/utils/message_sender.py
 
 import logging
-from telegram.ext import ContextTypes # Necesario para el type hinting
 import asyncio
+import collections
+import datetime
+import time
+import weakref
+from telegram.error import RetryAfter
+from telegram.ext import ContextTypes # Necesario para el type hinting
+from in_telegram.utils import metricas
+from in_telegram.utils.config_logs import contexto_actual, restaurar_contexto, etapas
+from in_telegram.utils.token_bucket import TokenBucket
 
 logger = logging.getLogger(__name__)
 
-async def send_message_async(chat_id: int, context: ContextTypes.DEFAULT_TYPE, message_text: str): # Función asíncrona para enviar un mensaje
+# Límites de Telegram: ~1 mensaje/s por chat y ~30 mensajes/s en total
+MENSAJES_POR_SEGUNDO_CHAT = 1.0
+MENSAJES_POR_SEGUNDO_GLOBAL = 30.0
+MAX_REINTENTOS_RETRY_AFTER = 3
+LONGITUD_MAX_FUSION = 4096 # Límite de Telegram para el texto de un mensaje
+LONGITUD_MENSAJE_CORTO = 1024 # Solo se fusionan mensajes de hasta esta longitud
+ESPERA_REINICIO_DESPACHADOR = 1.0 # Segundos antes de volver a arrancar el despachador si ha fallado
+
+class _Planificador:
+    """
+    Cola de salida única por bucle de eventos.
+    Mantiene el orden por chat (como máximo un envío en curso por chat),
+    respeta los límites por chat y global con token buckets y reintenta los RetryAfter.
+    Todo el estado es del bucle de eventos salvo el contador de pendientes, que se puede leer desde cualquier hilo.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._colas = {} # {chat_id: deque[(bot, texto, fusionable, intentos, contexto_log, mensajes)]}
+        self._buckets_chat = {}
+        self._bucket_global = TokenBucket(MENSAJES_POR_SEGUNDO_GLOBAL, MENSAJES_POR_SEGUNDO_GLOBAL)
+        self._en_curso = set()
+        self._pausa_global_hasta = 0.0
+        self._despertar = asyncio.Event()
+        self._vacio = asyncio.Event()
+        self._vacio.set()
+        self._pendientes = 0 # Mensajes encolados o en curso; solo lo modifica el bucle
+        self._iniciar_despachador()
+
+    def _iniciar_despachador(self):
+        self._tarea = self._loop.create_task(self._despachar())
+        self._tarea.add_done_callback(self._despachador_terminado)
+
+    def _despachador_terminado(self, tarea: asyncio.Task):
+        if tarea.cancelled():
+            return
+        # Sin despachador los mensajes se quedarían en cola para siempre
+        logger.error("El despachador de mensajes se ha detenido. Se reinicia en %s s.", ESPERA_REINICIO_DESPACHADOR,
+                     exc_info=tarea.exception())
+        self._loop.call_later(ESPERA_REINICIO_DESPACHADOR, self._iniciar_despachador)
+
+    def encolar(self, bot, chat_id: int, texto: str, fusionable: bool, contexto_log=(None, None)):
+        self._colas.setdefault(chat_id, collections.deque()).append((bot, texto, fusionable, 0, contexto_log, 1))
+        self._pendientes += 1
+        self._vacio.clear()
+        self._despertar.set()
+
+    def pendientes(self) -> int:
+        return self._pendientes
+
+    async def esperar_vacio(self):
+        await self._vacio.wait()
+
+    def _bucket_chat(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets_chat.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(MENSAJES_POR_SEGUNDO_CHAT, 1)
+            self._buckets_chat[chat_id] = bucket
+        return bucket
+
+    def _sacar_lote(self, chat_id: int):
+        """Saca el siguiente mensaje del chat, fusionando los mensajes cortos consecutivos."""
+        cola = self._colas[chat_id]
+        bot, texto, fusionable, intentos, contexto_log, mensajes = cola.popleft()
+        if fusionable and len(texto) <= LONGITUD_MENSAJE_CORTO:
+            while cola:
+                bot_sig, texto_sig, fusionable_sig, _, _, mensajes_sig = cola[0]
+                if (bot_sig is not bot or not fusionable_sig or len(texto_sig) > LONGITUD_MENSAJE_CORTO
+                        or len(texto) + 1 + len(texto_sig) > LONGITUD_MAX_FUSION):
+                    break
+                cola.popleft()
+                texto = f"{texto}\n{texto_sig}"
+                mensajes += mensajes_sig
+        if not cola:
+            del self._colas[chat_id]
+        # Un lote fusionado se registra con el contexto (id de correlación) del primer mensaje
+        return bot, texto, fusionable, intentos, contexto_log, mensajes
+
+    async def _despachar(self):
+        while True:
+            self._despertar.clear()
+            espera_minima = None
+
+            for chat_id in list(self._colas):
+                if chat_id in self._en_curso:
+                    continue
+                espera = max(
+                    self._pausa_global_hasta - time.monotonic(),
+                    self._bucket_global.espera(),
+                    self._bucket_chat(chat_id).espera()
+                )
+                if espera > 0:
+                    espera_minima = espera if espera_minima is None else min(espera_minima, espera)
+                    continue
+
+                self._bucket_global.consumir()
+                self._bucket_chat(chat_id).consumir()
+                lote = self._sacar_lote(chat_id)
+                self._en_curso.add(chat_id)
+                self._loop.create_task(self._enviar(chat_id, *lote))
+
+            # Los buckets llenos de chats sin mensajes pendientes ya no aportan nada
+            for chat_id in [c for c, b in self._buckets_chat.items() if c not in self._colas and c not in self._en_curso and b.lleno()]:
+                del self._buckets_chat[chat_id]
+
+            if not self._colas and not self._en_curso:
+                self._vacio.set()
+
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=espera_minima)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _enviar(self, chat_id: int, bot, texto: str, fusionable: bool, intentos: int, contexto_log, mensajes: int):
+        # La tarea tiene su propia copia del contexto: se restaura el del update que generó la respuesta
+        restaurar_contexto(contexto_log)
+        reencolado = False
+        try:
+            with metricas.medir_etapa(metricas.ETAPA_ENVIO_TELEGRAM):
+                await bot.send_message(chat_id=chat_id, text=texto)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Mensaje enviado a %s (%s caracteres)", chat_id, len(texto), extra={'etapas': etapas()})
+        except RetryAfter as e:
+            espera = e.retry_after
+            if isinstance(espera, datetime.timedelta):
+                espera = espera.total_seconds()
+            if intentos < MAX_REINTENTOS_RETRY_AFTER:
+                logger.warning("Límite de Telegram alcanzado enviando a %s. Reintento en %s s.", chat_id, espera)
+                # Se pausa todo el envío y el mensaje vuelve al principio de la cola de su chat
+                self._pausa_global_hasta = max(self._pausa_global_hasta, time.monotonic() + espera)
+                self._colas.setdefault(chat_id, collections.deque()).appendleft((bot, texto, False, intentos + 1, contexto_log, mensajes))
+                reencolado = True
+            else:
+                logger.error("Mensaje a %s descartado tras %s reintentos por límite de Telegram.", chat_id, intentos)
+        except Exception as e:
+            logger.error("Error al enviar mensaje a %s: %s", chat_id, e)
+        finally:
+            if not reencolado:
+                self._pendientes -= mensajes
+            self._en_curso.discard(chat_id)
+            self._despertar.set()
+
+_planificadores = weakref.WeakKeyDictionary()
+
+def _planificador(loop: asyncio.AbstractEventLoop) -> _Planificador:
+    planificador = _planificadores.get(loop)
+    if planificador is None:
+        planificador = _Planificador(loop)
+        _planificadores[loop] = planificador
+    return planificador
+
+async def send_message_async(chat_id: int, context: ContextTypes.DEFAULT_TYPE, message_text: str, fusionable: bool = True): # Función asíncrona para enviar un mensaje
+    """Encola el mensaje en la cola de salida del bucle actual. No espera a que se envíe."""
     try:
-        await context.bot.send_message(chat_id=chat_id, text=message_text)
-        logger.info(f"Mensaje enviado a {chat_id}: '{message_text}'")
+        _planificador(asyncio.get_running_loop()).encolar(context.bot, chat_id, message_text, fusionable, contexto_actual())
     except Exception as e:
-        logger.error(f"Error al enviar mensaje a {chat_id}: {e}")
+        logger.error("Error al encolar mensaje para %s: %s", chat_id, e)
 
 def send_message_sync_wrapper(chat_id: int, context: ContextTypes.DEFAULT_TYPE, message_text: str, main_loop: asyncio.AbstractEventLoop):#Función sincrona para enviar un mensaje
     asyncio.run_coroutine_threadsafe(
         send_message_async(chat_id, context, message_text),
         main_loop
-    )
\ No newline at end of file
+    )
+
+async def esperar_envios():
+    """Espera a que la cola de salida del bucle actual quede vacía."""
+    planificador = _planificadores.get(asyncio.get_running_loop())
+    if planificador is not None:
+        await planificador.esperar_vacio()
+
+def mensajes_pendientes(main_loop: asyncio.AbstractEventLoop) -> int:
+    """Mensajes en cola o en curso en el bucle indicado. Se puede llamar desde otro hilo (métricas)."""
+    planificador = _planificadores.get(main_loop)
+    return planificador.pendientes() if planificador is not None else 0
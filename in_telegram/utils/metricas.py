@@ -0,0 +1,185 @@
+# in_telegram/utils/metricas.py
+
+import logging
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from in_telegram.utils.config_logs import tiempos_etapas
+
+logger = logging.getLogger(__name__)
+
+# Límites (en segundos) de los histogramas de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Etapas del procesado de un mensaje
+ETAPA_AUTORIZACION = "autorizacion"
+ETAPA_TIPO_MENSAJE = "tipo_mensaje"
+ETAPA_FILTRADO = "filtrado"
+ETAPA_BUSQUEDA_FECHA = "busqueda_fecha"
+ETAPA_LECTURA_CELDA = "lectura_celda"
+ETAPA_ESCRITURA_CELDA = "escritura_celda"
+ETAPA_ENVIO_TELEGRAM = "envio_telegram"
+
+# Mientras no se active (servidor /metrics arrancado) no se registra nada:
+# medir_etapa() devuelve un contexto vacío compartido (salvo que haya un update en curso cuyos
+# tiempos de etapa se estén recogiendo para el log) y el resto de funciones retornan al momento.
+_activas = False
+_lock = threading.Lock()
+
+# {nombre: (tipo, ayuda, nombres_etiquetas)}
+_definiciones = {}
+# Contadores {nombre: {valores_etiquetas: valor}}
+_contadores = {}
+# Histogramas {nombre: {valores_etiquetas: [cuentas_por_bucket..., suma, total]}}
+_histogramas = {}
+# Valores calculados al exponer {nombre: funcion}
+_calculados = {}
+
+_NULO = nullcontext()
+
+def _definir(nombre: str, tipo: str, ayuda: str, etiquetas: tuple = ()):
+    _definiciones[nombre] = (tipo, ayuda, etiquetas)
+    if tipo == "counter":
+        _contadores[nombre] = {}
+    elif tipo == "histogram":
+        _histogramas[nombre] = {}
+
+_definir("baixes_etapa_segundos", "histogram", "Duración de cada etapa del procesado de un mensaje.", ("etapa",))
+_definir("baixes_etapa_errores_total", "counter", "Etapas que terminaron con una excepción.", ("etapa",))
+_definir("baixes_sheets_llamadas_total", "counter", "Llamadas a la API de Google Sheets por método y estado.", ("metodo", "estado"))
+_definir("baixes_sheets_llamada_segundos", "histogram", "Duración de las llamadas a la API de Google Sheets.", ("metodo",))
+_definir("baixes_sheets_reintentos_total", "counter", "Llamadas a la API de Google Sheets reintentadas tras un 429 o 5xx.", ("metodo", "estado"))
+_definir("baixes_sheets_renovaciones_token_total", "counter", "Renovaciones del token OAuth de Google (origen fondo o peticion).", ("origen", "estado"))
+_definir("baixes_sheets_espera_cuota_segundos", "histogram", "Tiempo esperando cuota de la API de Google Sheets.", ("tipo",))
+
+def activas() -> bool:
+    return _activas
+
+def activar() -> None:
+    global _activas
+    _activas = True
+
+def incrementar(nombre: str, etiquetas: tuple = (), cantidad: float = 1) -> None:
+    if not _activas:
+        return
+    with _lock:
+        serie = _contadores[nombre]
+        serie[etiquetas] = serie.get(etiquetas, 0) + cantidad
+
+def observar(nombre: str, valor: float, etiquetas: tuple = ()) -> None:
+    if not _activas:
+        return
+    with _lock:
+        serie = _histogramas[nombre]
+        cuentas = serie.get(etiquetas)
+        if cuentas is None:
+            cuentas = [0] * (len(BUCKETS_LATENCIA) + 2)
+            serie[etiquetas] = cuentas
+        cuentas[bisect.bisect_left(BUCKETS_LATENCIA, valor)] += 1
+        cuentas[-2] += valor
+        cuentas[-1] += 1
+
+def registrar_calculado(nombre: str, ayuda: str, funcion, tipo: str = "gauge") -> None:
+    """Registra un valor que se lee en el momento de exponer (profundidad de cola, hilos vivos...)."""
+    with _lock:
+        _definiciones[nombre] = (tipo, ayuda, ())
+        _calculados[nombre] = funcion
+
+class _Medicion:
+    __slots__ = ('_etapa', '_tiempos', '_inicio')
+
+    def __init__(self, etapa: str, tiempos: dict | None):
+        self._etapa = etapa
+        self._tiempos = tiempos
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        duracion = time.perf_counter() - self._inicio
+        if self._tiempos is not None:
+            # Milisegundos, acumulados si la etapa se repite dentro del mismo update
+            self._tiempos[self._etapa] = round(self._tiempos.get(self._etapa, 0) + duracion * 1000, 2)
+        observar("baixes_etapa_segundos", duracion, (self._etapa,))
+        if tipo is not None:
+            incrementar("baixes_etapa_errores_total", (self._etapa,))
+        return False
+
+def medir_etapa(etapa: str):
+    """
+    Context manager que mide la duración de una etapa para las métricas y para el log del update en curso.
+    Sin coste apreciable si las métricas están desactivadas y no hay update en curso.
+    """
+    tiempos = tiempos_etapas.get()
+    if not _activas and tiempos is None:
+        return _NULO
+    return _Medicion(etapa, tiempos)
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatear_etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto de Prometheus."""
+    lineas = []
+    with _lock:
+        definiciones = dict(_definiciones)
+        contadores = {nombre: dict(serie) for nombre, serie in _contadores.items()}
+        histogramas = {nombre: {e: list(c) for e, c in serie.items()} for nombre, serie in _histogramas.items()}
+        calculados = dict(_calculados)
+
+    for nombre, (tipo, ayuda, etiquetas) in definiciones.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        if nombre in calculados:
+            try:
+                lineas.append(f"{nombre} {calculados[nombre]()}")
+            except Exception as e:
+                logger.error("Error al calcular la métrica %s: %s", nombre, e)
+        elif tipo == "counter":
+            for valores, valor in contadores[nombre].items():
+                lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas, valores)} {valor}")
+        elif tipo == "histogram":
+            for valores, cuentas in histogramas[nombre].items():
+                acumulado = 0
+                for limite, cuenta in zip(BUCKETS_LATENCIA, cuentas):
+                    acumulado += cuenta
+                    le = 'le="%s"' % limite
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, valores, le)} {acumulado}")
+                le = 'le="+Inf"'
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas, valores, le)} {cuentas[-1]}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas, valores)} {cuentas[-2]}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas, valores)} {cuentas[-1]}")
+    return "\n".join(lineas) + "\n"
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        cuerpo = exponer().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass # Los scrapes periódicos no deben llenar el log
+
+def iniciar_servidor(listen: str = '127.0.0.1', port: int = 9464) -> ThreadingHTTPServer:
+    """Activa las métricas y sirve /metrics en un hilo propio."""
+    servidor = ThreadingHTTPServer((listen, port), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    activar()
+    threading.Thread(target=servidor.serve_forever, name="servidor-metricas", daemon=True).start()
+    logger.warning("Métricas disponibles en http://%s:%s/metrics", listen, servidor.server_address[1])
+    return servidor
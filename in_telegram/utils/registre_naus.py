@@ -0,0 +1,127 @@
+# in_telegram/utils/registre_naus.py
+
+import logging
+import contextvars
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+NAVE_LIST_FILE_PATH = os.path.join(os.path.dirname(__file__), 'llista_naus.json')
+INTERVALO_COMPROBACION = 5.0 # Segundos entre comprobaciones de cambios en el archivo
+
+RANGO_FECHAS = "B7:B101" # Columna de fechas
+RANGO_DIARIO = "B7:E101" # Fechas (B) y bajas SAC (D) / NO SAC (E)
+CELDA_TOTAL = "I2" # Total de bajas de la nau
+
+class RegistroNaus:
+    """Foto inmutable de la lista de naus con los nombres de hoja y rangos A1 ya calculados."""
+
+    __slots__ = ('naus', 'conjunto', 'hojas', 'rangos_fechas', 'rangos_diarios', 'rangos_total')
+
+    def __init__(self, naus):
+        naus = tuple(dict.fromkeys(nau.upper() for nau in naus)) # Sin duplicados, en orden
+        object.__setattr__(self, 'naus', naus)
+        object.__setattr__(self, 'conjunto', frozenset(naus))
+        object.__setattr__(self, 'hojas', MappingProxyType({nau: f"Nau {nau}" for nau in naus}))
+        object.__setattr__(self, 'rangos_fechas', MappingProxyType({nau: f"'Nau {nau}'!{RANGO_FECHAS}" for nau in naus}))
+        object.__setattr__(self, 'rangos_diarios', MappingProxyType({nau: f"'Nau {nau}'!{RANGO_DIARIO}" for nau in naus}))
+        object.__setattr__(self, 'rangos_total', MappingProxyType({nau: f"'Nau {nau}'!{CELDA_TOTAL}" for nau in naus}))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("RegistroNaus es inmutable")
+
+    def __contains__(self, nau: str) -> bool:
+        return nau.upper() in self.conjunto
+
+_registro = RegistroNaus(())
+# Naus propias de la granja en curso (las fija granjas.contexto_granja). None = la lista de llista_naus.json
+registro_granja = contextvars.ContextVar('registro_granja', default=None)
+_firma_archivo = None
+_recarga_lock = threading.Lock()
+_vigilante_iniciado = False
+
+def _cargar_naus(file_path):
+    """Lee la lista de naus. Retorna None si el archivo no existe o no tiene el formato correcto."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            loaded_letters = json.load(f)
+    except FileNotFoundError:
+        logger.error("Archivo de lista de naves no encontrado en: %s. Asegúrate de que existe.", file_path)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error al decodificar JSON en: %s. Revisa el formato del archivo.", file_path)
+        return None
+    except Exception as e:
+        logger.error("Error inesperado al cargar la lista de naves desde %s: %s", file_path, e)
+        return None
+
+    if not isinstance(loaded_letters, list) or not all(isinstance(item, str) for item in loaded_letters):
+        logger.error("El formato de '%s' es incorrecto. Debe ser una lista de cadenas de texto.", file_path)
+        return None
+    return loaded_letters
+
+def _firma(file_path):
+    try:
+        st = os.stat(file_path)
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+    except OSError:
+        return None
+
+def recargar(forzar: bool = False) -> bool:
+    """
+    Recarga la lista si el archivo ha cambiado. Si el archivo no es válido se mantiene la anterior.
+    Retorna True si se sustituyó el registro.
+    """
+    global _registro, _firma_archivo
+    with _recarga_lock:
+        firma = _firma(NAVE_LIST_FILE_PATH)
+        if not forzar and firma == _firma_archivo:
+            return False
+        _firma_archivo = firma
+
+        naus = _cargar_naus(NAVE_LIST_FILE_PATH)
+        if naus is None:
+            return False
+
+        # Sustitución atómica de la referencia: los lectores ven la foto vieja o la nueva, nunca una mezcla
+        _registro = RegistroNaus(naus)
+        logger.info("Naves válidas cargadas: %s", list(_registro.naus))
+        return True
+
+def _bucle_vigilante():
+    while True:
+        time.sleep(INTERVALO_COMPROBACION)
+        try:
+            recargar()
+        except Exception as e:
+            logger.error("Error en la recarga de la lista de naves: %s", e)
+
+def iniciar_vigilante():
+    """Arranca (una sola vez) el hilo que recarga la lista cuando cambia el archivo."""
+    global _vigilante_iniciado
+    with _recarga_lock:
+        if _vigilante_iniciado:
+            return
+        threading.Thread(target=_bucle_vigilante, name="vigilante-naus", daemon=True).start()
+        _vigilante_iniciado = True
+
+def registro() -> RegistroNaus:
+    """Registro vigente. Hay que guardarlo en una variable local si se usa varias veces en la misma operación."""
+    propio = registro_granja.get()
+    if propio is not None:
+        return propio
+    if not _vigilante_iniciado:
+        iniciar_vigilante()
+    return _registro
+
+def naus_validas() -> tuple[str, ...]:
+    return registro().naus
+
+def es_nau_valida(nave: str) -> bool:
+    return nave.upper() in registro().conjunto
+
+recargar(forzar=True)
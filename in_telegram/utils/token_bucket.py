@@ -0,0 +1,36 @@
+# in_telegram/utils/token_bucket.py
+
+import time
+
+class TokenBucket:
+    """Token bucket sin bloqueos propios: quien lo comparta entre hilos debe protegerlo con su lock."""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self._tasa = tasa
+        self._capacidad = capacidad
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self._capacidad, self._tokens + (ahora - self._ultimo) * self._tasa)
+        self._ultimo = ahora
+
+    def espera(self, necesarios: float = 1) -> float:
+        """Segundos hasta que haya 'necesarios' tokens disponibles (0 si ya los hay)."""
+        self._rellenar()
+        if self._tokens >= necesarios:
+            return 0.0
+        return (necesarios - self._tokens) / self._tasa
+
+    def consumir(self):
+        self._rellenar()
+        self._tokens -= 1
+
+    def disponibles(self) -> float:
+        self._rellenar()
+        return self._tokens
+
+    def lleno(self) -> bool:
+        self._rellenar()
+        return self._tokens >= self._capacidad
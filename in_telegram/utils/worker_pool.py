@@ -0,0 +1,106 @@
+# in_telegram/utils/worker_pool.py
+
+import logging
+import queue
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Pool fijo de hilos con cola de entrada acotada.
+    Cada chat se asigna siempre al mismo hilo (por hash del chat_id), de modo que
+    los mensajes de un mismo chat se procesan en orden y chats distintos en paralelo.
+    """
+
+    def __init__(self, num_workers: int, max_pendientes: int, nombre: str = "worker"):
+        if num_workers < 1:
+            raise ValueError("num_workers debe ser >= 1")
+        if max_pendientes < num_workers:
+            raise ValueError("max_pendientes debe ser >= num_workers")
+
+        self._num_workers = num_workers
+        self._max_por_worker = max_pendientes // num_workers
+        self._colas = [queue.Queue(maxsize=self._max_por_worker) for _ in range(num_workers)]
+        self._rechazados = 0
+        self._lock_rechazados = threading.Lock()
+        self._hilos = []
+        self._nombre = nombre
+        self._iniciado = False
+        self._lock_inicio = threading.Lock()
+
+    def _asegurar_iniciado(self):
+        if self._iniciado:
+            return
+        with self._lock_inicio:
+            if self._iniciado:
+                return
+            for i, cola in enumerate(self._colas):
+                hilo = threading.Thread(
+                    target=self._bucle_worker,
+                    args=(cola,),
+                    name=f"{self._nombre}-{i}",
+                    daemon=True
+                )
+                hilo.start()
+                self._hilos.append(hilo)
+            self._iniciado = True
+
+    def _indice_para(self, clave) -> int:
+        # crc32 en lugar de hash() para que el reparto sea estable entre ejecuciones
+        return zlib.crc32(str(clave).encode('utf-8')) % self._num_workers
+
+    def _bucle_worker(self, cola: queue.Queue):
+        while True:
+            tarea = cola.get()
+            try:
+                if tarea is None:
+                    return
+                func, args = tarea
+                func(*args)
+            except Exception as e:
+                logger.error("Error no controlado en el worker %s: %s", threading.current_thread().name, e)
+            finally:
+                cola.task_done()
+
+    def submit(self, clave, func, *args) -> bool:
+        """
+        Encola func(*args) en el hilo asignado a 'clave' (normalmente el chat_id).
+        Retorna False si la cola de ese hilo está llena (backpressure).
+        """
+        self._asegurar_iniciado()
+        cola = self._colas[self._indice_para(clave)]
+        try:
+            cola.put_nowait((func, args))
+            return True
+        except queue.Full:
+            with self._lock_rechazados:
+                self._rechazados += 1
+            logger.warning("Cola de trabajo llena para la clave %s. Actualización rechazada.", clave)
+            return False
+
+    def queue_depth(self) -> int:
+        """Número total de tareas pendientes en todas las colas."""
+        return sum(cola.qsize() for cola in self._colas)
+
+    def live_workers(self) -> int:
+        """Número de hilos del pool que siguen vivos."""
+        return sum(1 for hilo in self._hilos if hilo.is_alive())
+
+    def rejected_count(self) -> int:
+        """Número de actualizaciones rechazadas por tener la cola llena."""
+        return self._rechazados
+
+    def shutdown(self, wait: bool = True):
+        """Detiene los hilos después de procesar las tareas ya encoladas."""
+        if not self._iniciado:
+            return
+        for cola in self._colas:
+            cola.put(None)
+        if wait:
+            for hilo in self._hilos:
+                hilo.join()
+        self._hilos = []
+        self._iniciado = False
@@ -0,0 +1,108 @@
+# in_telegram/validadores/parser_baixes.py
+
+import re
+from dataclasses import dataclass
+from enum import Enum
+from in_telegram.utils.registre_naus import registro
+
+# Número y letra en cualquier orden, con espacios opcionales. Se aplica sobre el texto en minúsculas y sin 'sac'.
+_PATRON_BAIXA = re.compile(r"\s*(?:([0-9]+)\s*([a-zñç])|([a-zñç])\s*([0-9]+))\s*")
+# Solo para decidir el tipo de error cuando el patrón anterior no coincide
+_PATRON_CARACTERS = re.compile(r"[a-z0-9\sñç]+")
+# Una anotación de un mensaje con varias ('10a 3b sac 2c'). El '*' marca dónde estaba un 'sac'
+_PATRON_ANOTACION = re.compile(r"\s*(?:(\*)|([0-9]+)\s*([a-zñç])|([a-zñç])\s*([0-9]+))\s*")
+
+@dataclass(frozen=True, slots=True)
+class ParsedBaixa:
+    """Informe de baixes ya validado."""
+    nave: str # Letra en mayúsculas
+    cantidad: int
+    sac: bool
+
+class ErrorBaixa(Enum):
+    """Motivo por el que un mensaje no es un informe de baixes válido."""
+    CARACTERS = "caracters" # Contiene caracteres no alfanuméricos
+    FORMAT = "format" # No es exactamente un número y una letra (más 'sac' opcional)
+    QUANTITAT = "quantitat" # El número de baixes es 0
+    NAU_INVALIDA = "nau_invalida" # La letra no es una nau del registro
+
+def parse_baixa(message_content: str, naus_valides: frozenset | None = None) -> ParsedBaixa | ErrorBaixa:
+    """
+    Analiza un mensaje como '10 a sac' o 'A10' en una sola pasada.
+    'naus_valides' por defecto es el conjunto del registro de naus vigente.
+    """
+    texto = message_content.lower()
+    sac = "sac" in texto
+    if sac:
+        texto = texto.replace("sac", "")
+
+    match = _PATRON_BAIXA.fullmatch(texto)
+    if match is None:
+        if not _PATRON_CARACTERS.fullmatch(texto) and texto.strip():
+            return ErrorBaixa.CARACTERS
+        return ErrorBaixa.FORMAT
+
+    if match.group(1) is not None:
+        cantidad, nave = match.group(1), match.group(2)
+    else:
+        nave, cantidad = match.group(3), match.group(4)
+
+    cantidad = int(cantidad)
+    if cantidad < 1:
+        return ErrorBaixa.QUANTITAT
+
+    nave = nave.upper()
+    if naus_valides is None:
+        naus_valides = registro().conjunto
+    if nave not in naus_valides:
+        return ErrorBaixa.NAU_INVALIDA
+
+    return ParsedBaixa(nave, cantidad, sac)
+
+def parse_baixes(message_content: str, naus_valides: frozenset | None = None) -> tuple[ParsedBaixa, ...] | ErrorBaixa:
+    """
+    Analiza un mensaje con una o varias anotaciones: '10a 3b sac 2c' -> 10 A, 3 B SAC, 2 C.
+    Con varias, cada 'sac' se aplica a la anotación que tiene delante (o a la primera si va al principio).
+    Con una sola, igual que parse_baixa ('sac' en cualquier sitio).
+    Se validan todas juntas: si una no es válida se retorna el error y no se anota ninguna.
+    """
+    baixa = parse_baixa(message_content, naus_valides)
+    if isinstance(baixa, ParsedBaixa):
+        return (baixa,)
+    if baixa is not ErrorBaixa.FORMAT:
+        return baixa
+
+    texto = message_content.lower().replace("sac", "*")
+    anotaciones = [] # [cantidad, nave, sac]
+    sac_inicial = False
+    posicion = 0
+    while posicion < len(texto):
+        match = _PATRON_ANOTACION.match(texto, posicion)
+        if match is None or match.end() == posicion:
+            return ErrorBaixa.FORMAT
+        posicion = match.end()
+        if match.group(1) is not None:
+            if anotaciones:
+                anotaciones[-1][2] = True
+            else:
+                sac_inicial = True
+        elif match.group(2) is not None:
+            anotaciones.append([match.group(2), match.group(3), False])
+        else:
+            anotaciones.append([match.group(5), match.group(4), False])
+    if len(anotaciones) < 2:
+        return ErrorBaixa.FORMAT
+    if sac_inicial:
+        anotaciones[0][2] = True
+
+    if naus_valides is None:
+        naus_valides = registro().conjunto
+    baixes = []
+    for cantidad, nave, sac in anotaciones:
+        cantidad, nave = int(cantidad), nave.upper()
+        if cantidad < 1:
+            return ErrorBaixa.QUANTITAT
+        if nave not in naus_valides:
+            return ErrorBaixa.NAU_INVALIDA
+        baixes.append(ParsedBaixa(nave, cantidad, sac))
+    return tuple(baixes)
@@ -2,39 +2,104 @@
 import json
 import os
 import logging
+import signal
+import threading
 
-# Configuración del logging para este módulo
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Ruta al archivo de IDs
 USER_IDS_FILE = 'in_telegram/utils/telegram-clientes.json'
+INTERVALO_COMPROBACION = 2.0 # Segundos entre comprobaciones de cambios en el archivo
+
+# Conjunto inmutable: las lecturas no necesitan lock, la recarga sustituye la referencia entera
+_AUTHORIZED_IDS = frozenset()
+_firma_archivo = None
+_recarga_lock = threading.Lock()
+_recarga_pedida = threading.Event()
+_vigilante_iniciado = False
+_vigilante_lock = threading.Lock()
 
 def _load_user_ids(file_path):
     """
     Carga la lista de IDs de usuario desde un archivo JSON.
-    Retorna una lista de enteros con los IDs.
+    Retorna una lista de enteros con los IDs, o None si el archivo no se pudo leer.
     """
     if not os.path.exists(file_path):
-        logger.error(f"Error: El archivo de IDs de usuario no se encontró en '{file_path}'.")
-        return []
+        logger.error("Error: El archivo de IDs de usuario no se encontró en '%s'.", file_path)
+        return None
     
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             ids_list = json.load(f)
             if not isinstance(ids_list, list):
-                logger.error(f"Error: El formato del archivo '{file_path}' no es una lista JSON.")
-                return []
+                logger.error("Error: El formato del archivo '%s' no es una lista JSON.", file_path)
+                return None
             return [int(uid) for uid in ids_list if isinstance(uid, (int, str)) and str(uid).isdigit()]
     except json.JSONDecodeError as e:
-        logger.error(f"Error de formato JSON en '{file_path}': {e}. Se usará una lista vacía.")
-        return []
+        logger.error("Error de formato JSON en '%s': %s.", file_path, e)
+        return None
     except Exception as e:
-        logger.error(f"Error al cargar la lista de IDs desde '{file_path}': {e}. Se usará una lista vacía.")
-        return []
+        logger.error("Error al cargar la lista de IDs desde '%s': %s.", file_path, e)
+        return None
+
+def _firma(file_path):
+    """mtime, inodo y tamaño del archivo, o None si no existe."""
+    try:
+        st = os.stat(file_path)
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+    except OSError:
+        return None
+
+def recargar_usuarios(forzar: bool = False) -> bool:
+    """
+    Recarga la lista blanca si el archivo ha cambiado (o siempre, si forzar=True).
+    Si el archivo no se puede leer se mantiene el último conjunto válido.
+    Retorna True si se sustituyó el conjunto en memoria.
+    """
+    global _AUTHORIZED_IDS, _firma_archivo
+    with _recarga_lock:
+        firma = _firma(USER_IDS_FILE)
+        if not forzar and firma == _firma_archivo:
+            return False
+        # Se guarda la firma aunque falle la carga, para no reintentar hasta el próximo cambio
+        _firma_archivo = firma
+
+        ids = _load_user_ids(USER_IDS_FILE)
+        if ids is None:
+            logger.error("No se pudo recargar '%s'. Se mantienen los %s IDs cargados anteriormente.", USER_IDS_FILE, len(_AUTHORIZED_IDS))
+            return False
+
+        _AUTHORIZED_IDS = frozenset(ids)
+        logger.info("Lista de IDs autorizados cargada: %s usuarios.", len(_AUTHORIZED_IDS))
+        return True
+
+def _bucle_vigilante():
+    while True:
+        forzar = _recarga_pedida.wait(INTERVALO_COMPROBACION)
+        _recarga_pedida.clear()
+        try:
+            recargar_usuarios(forzar=forzar)
+        except Exception as e:
+            logger.error("Error en la recarga de IDs autorizados: %s", e)
+
+def iniciar_vigilante():
+    """Arranca (una sola vez) el hilo que recarga la lista cuando cambia el archivo."""
+    global _vigilante_iniciado
+    with _vigilante_lock:
+        if _vigilante_iniciado:
+            return
+        threading.Thread(target=_bucle_vigilante, name="vigilante-usuarios", daemon=True).start()
+        _vigilante_iniciado = True
+
+def instalar_recarga_sighup():
+    """Fuerza la recarga de la lista al recibir SIGHUP. Debe llamarse desde el hilo principal."""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+    # El manejador solo activa el evento; la lectura del archivo la hace el hilo vigilante
+    signal.signal(signal.SIGHUP, lambda signum, frame: _recarga_pedida.set())
+    iniciar_vigilante()
+
+recargar_usuarios(forzar=True)
 
 # --- Función principal de verificación ---
 def es_usuario_autorizado(telegram_message_update: dict) -> bool:
@@ -48,16 +113,17 @@ def es_usuario_autorizado(telegram_message_update: dict) -> bool:
         logger.warning("No se pudo extraer el ID de usuario del mensaje.")
         return False
 
-    authorized_ids = _load_user_ids(USER_IDS_FILE)
+    if not _vigilante_iniciado:
+        iniciar_vigilante()
 
-    if not authorized_ids:
-        logger.warning(f"¡ATENCIÓN! La lista de IDs de usuario en '{USER_IDS_FILE}' está vacía o hubo un error al cargarla.")
+    authorized_ids = _AUTHORIZED_IDS
 
-    logger.info(f"Verificando usuario con ID: {user_id}")
+    if not authorized_ids:
+        logger.warning("¡ATENCIÓN! La lista de IDs de usuario en '%s' está vacía o hubo un error al cargarla.", USER_IDS_FILE)
 
     if user_id in authorized_ids:
-        logger.info(f"Usuario {user_id} ENCONTRADO en la lista de IDs autorizados.")
+        logger.debug("Usuario %s ENCONTRADO en la lista de IDs autorizados.", user_id)
         return True
     else:
-        logger.info(f"Usuario {user_id} NO está en la lista de IDs autorizados.")
+        logger.info("Usuario %s NO está en la lista de IDs autorizados.", user_id)
         return False
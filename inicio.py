@@ -1,77 +1,112 @@
 import logging
 from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
-from in_telegram.verificar_uuid import es_usuario_autorizado
+from in_telegram.verificar_uuid import es_usuario_autorizado, instalar_recarga_sighup
 from in_telegram.validar_tipo_mensaje import es_mensaje_de_texto
 from in_telegram.filtrar_mensajes import filtrar
-from in_telegram.utils.message_sender import send_message_sync_wrapper 
-import threading
+from in_telegram.utils.message_sender import send_message_sync_wrapper, send_message_async, mensajes_pendientes
+from in_telegram.utils.worker_pool import WorkerPool
+from in_telegram.utils import granjas, metricas
+from in_telegram.utils.config_logs import configurar_logging, contexto_update
+from in_telegram.g_sheets import coordinacion, cuota, diario_escrituras, g_autentificacion, replica_local
 import os
+import threading
+import json
 import asyncio
 
-logging.basicConfig(
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
-logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # Configuración
 TELEGRAM_TOKEN_FILE = 'secrets/telegram'
+WEBHOOK_CONFIG_FILE = 'secrets/webhook.json' # Si existe y tiene "activat": true, se usa webhook en lugar de polling
+METRICAS_CONFIG_FILE = 'secrets/metricas.json' # Si existe y tiene "activat": true, se sirve /metrics (Prometheus)
+NUM_WORKERS = 8 # Hilos fijos que procesan los mensajes
+MAX_MENSAJES_PENDIENTES = 200 # Tamaño máximo de la cola de entrada (repartido entre los hilos)
+LOG_FORMATO = os.environ.get('BAIXES_LOG_FORMATO', 'json') # 'json' o 'texto'
+LOG_NIVEL = os.environ.get('BAIXES_LOG_NIVEL', 'INFO')
+LOG_MUESTREO = float(os.environ.get('BAIXES_LOG_MUESTREO', '0.05')) # Fracción de updates con todas sus líneas INFO
+# Varias instancias del bot (p. ej. detrás de un balanceador en modo webhook; en polling solo puede haber una)
+# necesitan el mismo backend de coordinación con la misma ruta: 'fichero' en una máquina, 'sqlite' en un disco compartido
+COORDINACION = os.environ.get('BAIXES_COORDINACION', coordinacion.LOCAL) # 'local', 'fichero' o 'sqlite'
+COORDINACION_RUTA = os.environ.get('BAIXES_COORDINACION_RUTA') or None
+# Diario de escrituras y réplica local del bot. Sin configurar (benchmarks, pruebas) se usan archivos temporales
+DIARIO_PATH = os.environ.get('BAIXES_DIARIO_PATH', 'datos/diario_escrituras.sqlite3')
+REPLICA_PATH = os.environ.get('BAIXES_REPLICA_PATH', 'datos/replica.sqlite3')
+
+# Los mensajes de un mismo chat van siempre al mismo hilo, así se procesan en orden
+worker_pool = WorkerPool(NUM_WORKERS, MAX_MENSAJES_PENDIENTES, nombre="procesador")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:  
     main_loop_for_thread = asyncio.get_running_loop() 
-    
-    thread = threading.Thread(
-        target=process_message_in_thread,
-        args=(update, context, main_loop_for_thread),
-        daemon=True
-    )
-    thread.start()
+    chat_id = update.effective_chat.id if update.effective_chat else None
+
+    aceptado = worker_pool.submit(chat_id, process_message_in_thread, update, context, main_loop_for_thread)
+    if not aceptado:
+        logger.warning("Mensaje del chat %s rechazado: cola llena (%s pendientes, %s rechazados en total).", chat_id, worker_pool.queue_depth(), worker_pool.rejected_count())
+        if chat_id is not None:
+            await send_message_async(chat_id, context, "El bot està saturat. Torna a enviar el missatge d'aquí uns segons.")
 
 def process_message_in_thread(update: Update, context: ContextTypes.DEFAULT_TYPE, current_loop: asyncio.AbstractEventLoop):
     """Función que se ejecuta en el hilo secundario para procesar todo el mensaje"""
+    # Todas las líneas de log de este update (también las de las corrutinas que lance) llevan su update_id
+    with contexto_update(update.update_id):
+        _procesar_mensaje(update, context, current_loop)
+
+def _procesar_mensaje(update: Update, context: ContextTypes.DEFAULT_TYPE, current_loop: asyncio.AbstractEventLoop):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
         
     try:
         update_dict = update.to_dict()
-        logger.info(f"Procesando mensaje del usuario {user_id} en hilo secundario")
+        logger.debug("Procesando mensaje del usuario %s en hilo secundario", user_id)
         
-        is_authorized = es_usuario_autorizado(update_dict)
+        with metricas.medir_etapa(metricas.ETAPA_AUTORIZACION):
+            is_authorized = es_usuario_autorizado(update_dict)
         
         if not isinstance(is_authorized, bool):
-            logger.error(f"Valor inesperado de es_usuario_autorizado: {is_authorized}")
+            logger.error("Valor inesperado de es_usuario_autorizado: %s", is_authorized)
             return
              
         if is_authorized:
-            logger.info(f"Usuario {user_id} autorizado.")
-            if not es_mensaje_de_texto(update_dict):
-                logger.info(f"Mensaje del usuario {user_id}. No es un mensaje de texto.")
-                asyncio.run_coroutine_threadsafe(
+            logger.debug("Usuario %s autorizado.", user_id)
+            granja = granjas.para_update(chat_id, user_id)
+            if granja is None:
+                logger.warning("Usuario %s autorizado pero sin granja asignada (chat %s).", user_id, chat_id)
+                send_message_sync_wrapper(
+                    chat_id=chat_id,
+                    context=context,
+                    message_text="No tens cap granja assignada. Contacta amb l'administrador.",
+                    main_loop=current_loop
+                )
+                return
+            # Hoja de cálculo, naus, cachés y colas de escritura de la granja del chat o del usuario
+            with granjas.contexto_granja(granja):
+                with metricas.medir_etapa(metricas.ETAPA_TIPO_MENSAJE):
+                    es_texto = es_mensaje_de_texto(update_dict)
+                if not es_texto:
+                    logger.info("Mensaje del usuario %s. No es un mensaje de texto.", user_id)
                     send_message_sync_wrapper(
                         chat_id=chat_id,
                         context=context,
                         message_text="Només s'admeten missatges de text.",
                         main_loop=current_loop
-                    ),
-                    current_loop
-                )
-                return
-            else:
-                filtrar(update_dict, context, current_loop)
-                return            
+                    )
+                    return
+                else:
+                    with metricas.medir_etapa(metricas.ETAPA_FILTRADO):
+                        filtrar(update_dict, context, current_loop)
+                    return            
         else:
-            logger.info(f"Usuario {user_id} no autorizado")
+            logger.info("Usuario %s no autorizado", user_id)
             return            
     
     except Exception as e:
-        logger.error(f"Error en hilo secundario: {e}")
+        logger.error("Error en hilo secundario: %s", e)
 
 def get_telegram_token(file_path):
     """Lee el token de Telegram de un archivo"""
     if not os.path.exists(file_path):
-        logger.error(f"Error: El archivo de token no se encontró en '{file_path}'.")
+        logger.error("Error: El archivo de token no se encontró en '%s'.", file_path)
         raise FileNotFoundError(f"Archivo de token no encontrado: {file_path}")
     
     try:
@@ -82,26 +117,162 @@ def get_telegram_token(file_path):
                 token = token[1:-1]
             
             if not token:
-                logger.error(f"Error: El archivo '{file_path}' está vacío.")
+                logger.error("Error: El archivo '%s' está vacío.", file_path)
                 raise ValueError("Token vacío")
             return token
     except Exception as e:
-        logger.error(f"Error al leer el token: {e}")
+        logger.error("Error al leer el token: %s", e)
         raise
 
+def get_webhook_config(file_path):
+    """
+    Lee la configuración del modo webhook. Retorna None si no existe o no está activado (modo polling).
+    Claves: activat, secret_token (obligatoria), listen, port, url_path, webhook_url, base_url.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error("Error de formato JSON en '%s': %s", file_path, e)
+        raise
+
+    if not isinstance(config, dict) or not config.get('activat', False):
+        return None
+
+    if not config.get('secret_token'):
+        # Sin secret_token cualquiera que conozca la URL podría inyectar actualizaciones
+        logger.error("Error: El archivo '%s' no contiene 'secret_token'.", file_path)
+        raise ValueError("secret_token obligatorio en modo webhook")
+
+    return {
+        'listen': config.get('listen', '127.0.0.1'),
+        'port': int(config.get('port', 8443)),
+        'url_path': config.get('url_path', 'telegram'),
+        'webhook_url': config.get('webhook_url'),
+        'secret_token': config['secret_token'],
+        'base_url': config.get('base_url'),
+    }
+
+def get_metricas_config(file_path):
+    """
+    Lee la configuración del endpoint de métricas. Retorna None si no existe o no está activado.
+    Claves: activat, listen, port.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error("Error de formato JSON en '%s': %s", file_path, e)
+        raise
+
+    if not isinstance(config, dict) or not config.get('activat', False):
+        return None
+
+    return {
+        'listen': config.get('listen', '127.0.0.1'), # Solo local por defecto: no lleva autenticación
+        'port': int(config.get('port', 9464)),
+    }
+
+def iniciar_metricas(metricas_config: dict, main_loop: asyncio.AbstractEventLoop | None = None):
+    """Registra los indicadores del proceso y arranca el servidor /metrics."""
+    metricas.registrar_calculado("baixes_workers_vivos", "Hilos del pool de procesado vivos.", worker_pool.live_workers)
+    metricas.registrar_calculado("baixes_cola_pendientes", "Mensajes esperando en la cola de entrada.", worker_pool.queue_depth)
+    metricas.registrar_calculado("baixes_mensajes_rechazados_total", "Mensajes rechazados por cola de entrada llena.",
+                                 worker_pool.rejected_count, tipo="counter")
+    metricas.registrar_calculado("baixes_replica_antiguedad_segundos", "Segundos desde el último refresco de la réplica local más atrasada.",
+                                 lambda: round(replica_local.antiguedad_maxima() or 0, 1))
+    metricas.registrar_calculado("baixes_diario_pendientes", "Baixes de los diarios locales aún no aplicadas en la hoja.",
+                                 diario_escrituras.pendientes_totales)
+    metricas.registrar_calculado("baixes_sheets_token_antiguedad_segundos", "Segundos desde la renovación del token OAuth más antiguo.",
+                                 g_autentificacion.antiguedad_token)
+    metricas.registrar_calculado("baixes_sheets_token_caducidad_segundos", "Segundos hasta que caduque el primer token OAuth.",
+                                 g_autentificacion.caducidad_token)
+    metricas.registrar_calculado("baixes_sheets_cuota_lecturas_restantes", "Lecturas de Google Sheets disponibles sin esperar.",
+                                 lambda: cuota.restante(cuota.LECTURA))
+    metricas.registrar_calculado("baixes_sheets_cuota_escrituras_restantes", "Escrituras de Google Sheets disponibles sin esperar.",
+                                 lambda: cuota.restante(cuota.ESCRITURA))
+    if main_loop is not None:
+        metricas.registrar_calculado("baixes_envios_pendientes", "Respuestas en la cola de salida de Telegram.",
+                                     lambda: mensajes_pendientes(main_loop))
+    return metricas.iniciar_servidor(metricas_config['listen'], metricas_config['port'])
+
+async def _post_init(application: Application) -> None:
+    main_loop = asyncio.get_running_loop()
+    metricas_config = application.bot_data.get('metricas_config')
+    if metricas_config:
+        iniciar_metricas(metricas_config, main_loop)
+
+    # Credenciales y servicios de Google en segundo plano: el bot empieza a recibir updates sin esperarlos
+    threading.Thread(target=g_autentificacion.precargar, name="precarga-sheets", daemon=True).start()
+    # Tokens OAuth renovados antes de caducar: ninguna petición de un operario espera al servidor de tokens
+    g_autentificacion.iniciar_renovacion()
+
+    def _iniciar_hilos_granja(granja: granjas.Granja) -> None:
+        # Réplica local de la hoja para los informes: se refresca al arrancar y cada INTERVALO_REFRESCO
+        replica_local.iniciar_refresco()
+
+        # Aplica las baixes que quedaron en el diario de una ejecución anterior y avisa de las que no se puedan aplicar
+        diario_escrituras.iniciar_sincronizador(
+            notificar=lambda chat_id, texto: send_message_sync_wrapper(chat_id, application, texto, main_loop)
+        )
+
+    # Las granjas de la tabla al arrancar, ahora; las que se añadan con el bot en marcha, con su primer mensaje
+    granjas.al_activar(_iniciar_hilos_granja)
+    for granja in granjas.todas():
+        granjas.activar(granja)
+
+def build_application(telegram_token: str, base_url: str | None = None) -> Application:
+    builder = Application.builder().token(telegram_token).post_init(_post_init)
+    if base_url:
+        # Servidor de la Bot API alternativo (p. ej. uno local para pruebas sin red)
+        builder = builder.base_url(base_url)
+    application = builder.build()
+    application.add_handler(MessageHandler(filters.ALL, handle_message))
+    return application
+
+def run_webhook(application: Application, webhook_config: dict, **kwargs) -> None:
+    logger.warning("Modo webhook: escuchando en %s:%s/%s", webhook_config['listen'], webhook_config['port'], webhook_config['url_path'])
+    application.run_webhook(
+        listen=webhook_config['listen'],
+        port=webhook_config['port'],
+        url_path=webhook_config['url_path'],
+        webhook_url=webhook_config['webhook_url'],
+        secret_token=webhook_config['secret_token'],
+        **kwargs
+    )
+
 def main() -> None:
+    configurar_logging(getattr(logging, LOG_NIVEL.upper(), logging.INFO), LOG_FORMATO, LOG_MUESTREO)
     try:
+        coordinacion.configurar(COORDINACION, COORDINACION_RUTA)
+        diario_escrituras.DIARIO_PATH = DIARIO_PATH
+        replica_local.REPLICA_PATH = REPLICA_PATH
         telegram_token = get_telegram_token(TELEGRAM_TOKEN_FILE)
+        webhook_config = get_webhook_config(WEBHOOK_CONFIG_FILE)
 
-        application = Application.builder().token(telegram_token).build()
+        metricas_config = get_metricas_config(METRICAS_CONFIG_FILE)
 
-        application.add_handler(MessageHandler(filters.ALL, handle_message))
+        application = build_application(telegram_token, webhook_config['base_url'] if webhook_config else None)
+        # Se arranca en post_init, cuando ya existe el bucle de eventos principal
+        application.bot_data['metricas_config'] = metricas_config
+
+        # 'kill -HUP <pid>' recarga la lista de usuarios autorizados sin reiniciar
+        instalar_recarga_sighup()
 
         logger.warning("El bot se ha iniciado correctamente y está a la espera de recibir mensajes...")
-        application.run_polling()
+        if webhook_config:
+            run_webhook(application, webhook_config)
+        else:
+            application.run_polling()
         
     except Exception as e:
-        logger.critical(f"Error fatal: {e}")
+        logger.critical("Error fatal: %s", e)
         exit(1)
 
 if __name__ == '__main__':
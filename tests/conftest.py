@@ -0,0 +1,65 @@
+# tests/conftest.py
+"""
+Utilidades comunes de las pruebas: backend de Sheets simulado en memoria, diario y réplica en un directorio
+temporal y un bot de Telegram falso que guarda las respuestas.
+Uso: python -m pytest -q (desde la raíz del repositorio)
+"""
+
+import asyncio
+import itertools
+import os
+
+import pytest
+
+from in_telegram.g_sheets import baixes_g_sheets, buscar_data_actual, cuota, diario_escrituras, g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils import granjas
+from in_telegram.utils.message_sender import esperar_envios
+
+NAUS = ("A", "B", "C")
+_update_ids = itertools.count(1) # El diario descarta los update_id repetidos: únicos en toda la sesión
+
+class Bot:
+    def __init__(self):
+        self.respuestas = []
+
+    async def send_message(self, chat_id, text):
+        self.respuestas.append(text)
+
+class Context:
+    def __init__(self):
+        self.bot = Bot()
+
+def update(texto: str, chat_id: int = 1) -> dict:
+    return {'update_id': next(_update_ids), 'effective_user': {'id': chat_id}, 'message': {'chat': {'id': chat_id}, 'text': texto}}
+
+async def enviar(context: Context, *textos: str) -> list:
+    """Procesa los mensajes uno tras otro con baixes_g_sheets.g_sheets y retorna las respuestas enviadas."""
+    for texto in textos:
+        await baixes_g_sheets.g_sheets(update(texto), context, asyncio.get_running_loop())
+    await esperar_envios()
+    return context.bot.respuestas
+
+@pytest.fixture(scope='session', autouse=True)
+def datos_temporales(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("datos")
+    diario_escrituras.DIARIO_PATH = os.path.join(directorio, "diario.sqlite3")
+    replica_local.REPLICA_PATH = os.path.join(directorio, "replica.sqlite3")
+    cuota.configurar(1e9, 1e9)
+
+@pytest.fixture
+def hoja(monkeypatch):
+    """Hoja simulada nueva con las naus NAUS, en la granja principal, con cachés y réplica vacías."""
+    monkeypatch.setattr(baixes_g_sheets, 'DIARIO_ESCRITURAS', False)
+    monkeypatch.setattr(baixes_g_sheets, 'ESCRITURA_AGRUPADA', False)
+    backend = g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=NAUS))
+    with granjas.contexto_granja(granjas.Granja(granjas.PRINCIPAL, naus=list(NAUS))):
+        buscar_data_actual.invalidar_cache_fechas()
+        replica_local.vaciar()
+        yield backend
+
+def fila_de_hoy(backend: FakeSheetsService, nau: str = "A") -> int:
+    return buscar_data_actual.fila_cacheada(nau) or asyncio.run(buscar_data_actual.buscar_data_actual_g_sheet(nau))
+
+def escribir(backend: FakeSheetsService, nau: str, celda: str, valor) -> None:
+    backend.values().update(spreadsheetId='simulado', range=f"'Nau {nau}'!{celda}", body={'values': [[valor]]}).execute()
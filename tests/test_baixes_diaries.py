@@ -0,0 +1,61 @@
+# tests/test_baixes_diaries.py
+"""/mostrar_baixes_avui: todas las naus salen de un solo batchGet y se responden en un único mensaje."""
+
+import asyncio
+
+from in_telegram.comandos import baixes_diaries
+from in_telegram.g_sheets import g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils import granjas
+from in_telegram.utils.message_sender import esperar_envios
+from in_telegram.utils.registre_naus import RegistroNaus
+
+from conftest import Context, escribir, fila_de_hoy
+
+def _consultar(context: Context, forzar: bool = False) -> list:
+    async def _ejecutar():
+        await asyncio.to_thread(baixes_diaries.bajas_diarias_handler, 1, context, asyncio.get_running_loop(), forzar)
+        await asyncio.sleep(0.05) # El mensaje llega al bucle desde el hilo del worker
+        await esperar_envios()
+    asyncio.run(_ejecutar())
+    return context.bot.respuestas
+
+def test_un_mensaje_con_todas_las_naus(hoja):
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "A", f"D{fila}", 3)
+    escribir(hoja, "A", f"E{fila}", 4)
+    escribir(hoja, "C", f"E{fila}", 1)
+    hoja.llamadas.clear()
+
+    respuestas = _consultar(Context())
+
+    assert hoja.llamadas == {'values.batchGet': 1}
+    assert respuestas == ["\n\n".join([
+        "Baixes del dia en la nau  A:\nSAC: 3\nNO SAC: 4",
+        "Baixes del dia en la nau  B:\nSAC: 0\nNO SAC: 0",
+        "Baixes del dia en la nau  C:\nSAC: 0\nNO SAC: 1",
+    ])]
+
+def test_consultas_seguidas_no_leen_la_hoja_salvo_si_se_fuerza(hoja):
+    fila = fila_de_hoy(hoja)
+    _consultar(Context())
+
+    # Las escrituras del bot se guardan también en la réplica: la consulta siguiente ya las ve
+    escribir(hoja, "B", f"D{fila}", 2)
+    replica_local.guardar_celda("B", "D", fila, 2, 2)
+    hoja.llamadas.clear()
+    assert "SAC: 2" in _consultar(Context())[0]
+    assert hoja.total_llamadas() == 0
+
+    _consultar(Context(), forzar=True)
+    assert hoja.llamadas == {'values.batchGet': 1}
+
+def test_el_numero_de_llamadas_no_crece_con_las_naus(hoja):
+    naus = [chr(ord('A') + i) for i in range(12)]
+    backend = g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=naus))
+    with granjas.contexto_granja(granjas.Granja(granjas.PRINCIPAL, naus=naus)):
+        replica_local.vaciar()
+        bloques = baixes_diaries._leer_bajas_diarias(RegistroNaus(naus))
+
+    assert backend.llamadas == {'values.batchGet': 1}
+    assert [bloque.splitlines()[0] for bloque in bloques] == [f"Baixes del dia en la nau  {nau}:" for nau in naus]
@@ -0,0 +1,24 @@
+# tests/test_baixes_historic.py
+"""/baixes_historic: lectura vectorizada de las fechas de la hoja."""
+
+import datetime
+
+import numpy as np
+
+from in_telegram.comandos.baixes_historic import _fechas, calcular
+
+def test_fechas_validas_con_anyo_de_dos_y_cuatro_cifras():
+    fechas = _fechas(["01/02/24", "31/12/2023", "29/02/24", "29/02/2000"])
+    assert fechas.tolist() == [datetime.date(2024, 2, 1), datetime.date(2023, 12, 31),
+                               datetime.date(2024, 2, 29), datetime.date(2000, 2, 29)]
+
+def test_lo_que_no_es_una_fecha_queda_como_nat():
+    textos = ["31/04/24", "29/02/23", "00/01/24", "15/13/24", "15/00/24", "1/2/24", "", "01/02/2024 hores",
+              "01/02/24 ", "ab/cd/ef", "12/05/202", "12-05-24"]
+    assert np.isnat(_fechas(textos)).all()
+
+def test_un_dia_inexistente_no_suma_en_el_mes_siguiente():
+    hoy = datetime.date(2024, 5, 2)
+    filas = [("A", 7, "30/04/24", 1, 0), ("A", 8, "31/04/24", 5, 5), ("A", 9, "01/05/2024", 0, 2)]
+    resultado = calcular(filas, ("A",), hoy, 3)
+    assert resultado['diario'].tolist() == [[1.0, 2.0, 0.0]]
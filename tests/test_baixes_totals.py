@@ -0,0 +1,73 @@
+# tests/test_baixes_totals.py
+"""/mostrar_baixes_totals contra la hoja simulada con latencia: un batchGet y una tabla, sin depender del número de naus."""
+
+import asyncio
+import time
+
+import pytest
+
+from in_telegram.comandos import baixes_totals
+from in_telegram.g_sheets import buscar_data_actual, g_autentificacion, replica_local
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService
+from in_telegram.utils import granjas, message_sender
+from in_telegram.utils.message_sender import esperar_envios
+
+from conftest import Context, escribir, fila_de_hoy
+
+NAUS = [chr(ord('A') + i) for i in range(12)]
+LATENCIA = 0.1 # Segundos por llamada a Sheets: leer nau por nau tardaría 1,2 s
+
+@pytest.fixture
+def hoja_lenta():
+    backend = g_autentificacion.usar_sheets_simulado(FakeSheetsService(naus=NAUS))
+    with granjas.contexto_granja(granjas.Granja(granjas.PRINCIPAL, naus=NAUS)):
+        buscar_data_actual.invalidar_cache_fechas()
+        fila = fila_de_hoy(backend)
+        escribir(backend, "A", f"D{fila}", 5) # I2 suma las columnas D y E de la nau
+        escribir(backend, "L", f"D{fila}", 7)
+        escribir(backend, "L", f"E{fila}", 5)
+        backend.latencia = LATENCIA
+        backend.llamadas.clear()
+        replica_local.vaciar()
+        yield backend
+
+def _consultar(context: Context, forzar: bool = False) -> float:
+    """Ejecuta el comando como lo hace el worker y retorna los segundos hasta que la respuesta se ha enviado."""
+    async def _ejecutar():
+        inicio = time.perf_counter()
+        await asyncio.to_thread(baixes_totals.mostrar_baixes_totals, 1, context, asyncio.get_running_loop(), forzar)
+        await asyncio.sleep(0) # La respuesta se encola en el bucle desde el hilo del worker
+        await esperar_envios()
+        return time.perf_counter() - inicio
+    return asyncio.run(_ejecutar())
+
+def test_una_lectura_y_una_tabla(hoja_lenta):
+    context = Context()
+    duracion = _consultar(context)
+
+    assert hoja_lenta.llamadas == {'values.batchGet': 1}
+    assert duracion < 4 * LATENCIA
+    assert len(context.bot.respuestas) == 1
+    tabla = context.bot.respuestas[0].splitlines()
+    assert tabla[0] == "Total de baixes per nau:"
+    assert tabla[1:] == [f"Nau {nau}  {'5' if nau == 'A' else '12' if nau == 'L' else '0'}" for nau in NAUS]
+
+def test_las_consultas_siguientes_no_esperan_a_sheets(hoja_lenta):
+    _consultar(Context())
+    hoja_lenta.llamadas.clear()
+
+    duracion = _consultar(Context())
+
+    assert hoja_lenta.total_llamadas() == 0
+    assert duracion < LATENCIA
+
+def test_un_mensaje_por_nau(hoja_lenta, monkeypatch):
+    monkeypatch.setattr(baixes_totals, 'UN_MISSATGE_PER_NAU', True)
+    monkeypatch.setattr(message_sender, 'MENSAJES_POR_SEGUNDO_CHAT', 1000.0)
+    context = Context()
+
+    _consultar(context)
+
+    assert hoja_lenta.llamadas == {'values.batchGet': 1}
+    assert context.bot.respuestas == [f"El total de baixes en la Nau {nau} es de {'5' if nau == 'A' else '12' if nau == 'L' else '0'}"
+                                      for nau in NAUS]
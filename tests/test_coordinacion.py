@@ -0,0 +1,155 @@
+# tests/test_coordinacion.py
+"""
+Incrementos coordinados: varios mensajes (y varias instancias del bot) sumando a la vez en las mismas celdas
+no pierden ni duplican ninguna baixa. Las instancias son procesos contra una hoja simulada compartida.
+"""
+
+import asyncio
+import datetime
+import multiprocessing
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+import pytest
+
+from in_telegram.g_sheets import coordinacion
+from in_telegram.g_sheets.fake_sheets import FakeSheetsService, PRIMERA_FILA_FECHAS, ULTIMA_FILA_FECHAS
+
+from conftest import Context, enviar, fila_de_hoy
+
+SPREADSHEET_ID = 'coordinacion'
+NAUS = ("A", "B")
+MENSAJES = ("1a", "2b sac", "3a 1b", "2a sac 2a")
+INSTANCIAS = 3
+RONDAS = 4 # Cada instancia envía RONDAS veces todos los MENSAJES a la vez
+
+class _ServidorSheets(BaseManager):
+    pass
+
+_ServidorSheets.register('FakeSheetsService', FakeSheetsService, exposed=('ejecutar_remoto', 'valor'))
+
+def _esperado(instancias: int) -> dict:
+    # 1a + 3a + 2a = 6 NO SAC en A, 1b = 1 NO SAC en B, 2a sac = 2 SAC en A, 2b sac = 2 SAC en B, por ronda
+    por_ronda = {("A", "E"): 6, ("B", "E"): 1, ("A", "D"): 2, ("B", "D"): 2}
+    return {celda: valor * RONDAS * instancias for celda, valor in por_ronda.items()}
+
+def _confirmaciones(respuestas: list) -> int:
+    # La cola de salida puede fusionar varias respuestas del mismo chat en un mensaje
+    return sum(r.count("Sa escrit") + r.count("S'han escrit") for r in respuestas)
+
+async def _rafaga(context: Context) -> None:
+    await asyncio.gather(*(enviar(context, texto) for _ in range(RONDAS) for texto in MENSAJES))
+
+def test_mensajes_concurrentes_en_una_instancia(hoja):
+    fila = fila_de_hoy(hoja)
+    hoja.latencia = 0.005 # Lecturas y escrituras lentas: sin bloqueo los mensajes se pisarían
+    context = Context()
+
+    asyncio.run(_rafaga(context))
+
+    assert _confirmaciones(context.bot.respuestas) == RONDAS * len(MENSAJES)
+    assert {celda: hoja.valor(celda[0], f"{celda[1]}{fila}") for celda in _esperado(1)} == _esperado(1)
+
+def _fila_de_hoy(hoja) -> int:
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    fechas = hoja.ejecutar_remoto('values.get', {'spreadsheetId': SPREADSHEET_ID,
+                                                 'range': f"'Nau A'!B{PRIMERA_FILA_FECHAS}:B{ULTIMA_FILA_FECHAS}"})
+    return PRIMERA_FILA_FECHAS + [fila[0] if fila else None for fila in fechas['values']].index(hoy)
+
+def _instancia(hoja, directorio: str, tipo: str, indice: int, barrera, resultados):
+    """Una instancia del bot en su propio proceso, con la hoja del proceso servidor."""
+    import os
+    from in_telegram.g_sheets import baixes_g_sheets, cuota, diario_escrituras, g_autentificacion, replica_local
+    from in_telegram.g_sheets.fake_sheets import FakeSheetsRemoto
+    from in_telegram.utils import granjas, message_sender
+
+    context = Context()
+    try:
+        g_autentificacion.usar_sheets_simulado(FakeSheetsRemoto(hoja), SPREADSHEET_ID)
+        cuota.configurar(1e9, 1e9)
+        diario_escrituras.DIARIO_PATH = os.path.join(directorio, f"diario-{indice}.sqlite3")
+        replica_local.REPLICA_PATH = os.path.join(directorio, f"replica-{indice}.sqlite3")
+        coordinacion.configurar(tipo, os.path.join(directorio, f"coordinacion-{tipo}"))
+        baixes_g_sheets.DIARIO_ESCRITURAS = False # Escritura directa: cada mensaje lee y escribe sus celdas bajo el bloqueo
+        baixes_g_sheets.ESCRITURA_AGRUPADA = False
+        message_sender.MENSAJES_POR_SEGUNDO_CHAT = 1000.0
+        with granjas.contexto_granja(granjas.Granja(granjas.PRINCIPAL, naus=list(NAUS))):
+            barrera.wait(timeout=60)
+            asyncio.run(_rafaga(context))
+    except Exception as e:
+        barrera.abort() # Las demás instancias no se quedan esperando a esta
+        resultados.put(f"instancia {indice}: {e!r}")
+        return
+    resultados.put(_confirmaciones(context.bot.respuestas))
+
+@pytest.mark.parametrize('tipo', ['fichero', 'sqlite'])
+def test_varias_instancias_no_pierden_incrementos(tipo, tmp_path):
+    ctx = multiprocessing.get_context('spawn') # Sin fork: las instancias no heredan los hilos de las otras pruebas
+    servidor = _ServidorSheets(ctx=ctx)
+    servidor.start()
+    try:
+        hoja = servidor.FakeSheetsService(naus=NAUS, latencia=0.005)
+        barrera = ctx.Barrier(INSTANCIAS)
+        resultados = ctx.Queue()
+        procesos = [ctx.Process(target=_instancia, args=(hoja, str(tmp_path), tipo, i, barrera, resultados), daemon=True)
+                    for i in range(INSTANCIAS)]
+        for proceso in procesos:
+            proceso.start()
+        confirmaciones = [resultados.get(timeout=120) for _ in procesos]
+        for proceso in procesos:
+            proceso.join(timeout=30)
+
+        assert confirmaciones == [RONDAS * len(MENSAJES)] * INSTANCIAS
+        fila = _fila_de_hoy(hoja)
+        escrito = {celda: hoja.valor(celda[0], f"{celda[1]}{fila}") for celda in _esperado(INSTANCIAS)}
+        assert escrito == _esperado(INSTANCIAS)
+    finally:
+        servidor.shutdown()
+
+class _BackendLento:
+    """Backend que tarda en conceder el bloqueo: deja cancelar la tarea mientras el hilo aún lo está tomando."""
+
+    def __init__(self):
+        self.concedido = threading.Event()
+        self.liberados = []
+
+    def adquirir(self, claves, espera_maxima):
+        self.concedido.wait(5)
+        return "testigo"
+
+    def liberar(self, claves, testigo):
+        self.liberados.append((claves, testigo))
+
+def test_cancelar_mientras_se_adquiere_suelta_el_bloqueo(monkeypatch):
+    backend = _BackendLento()
+    monkeypatch.setattr(coordinacion, '_backend', backend)
+
+    async def _cancelar():
+        async def _escribir():
+            async with coordinacion.bloquear(["celda:x"]):
+                pytest.fail("La tarea cancelada no debe entrar en el bloque")
+
+        tarea = asyncio.create_task(_escribir())
+        await asyncio.sleep(0.05)
+        tarea.cancel()
+        backend.concedido.set() # El hilo consigue el bloqueo después de la cancelación
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+        await asyncio.sleep(0.1)
+
+    asyncio.run(_cancelar())
+    assert backend.liberados == [(["celda:x"], "testigo")]
+
+def test_el_arrendamiento_sqlite_se_renueva_mientras_se_tiene(monkeypatch, tmp_path):
+    monkeypatch.setattr(coordinacion, 'DURACION_ARRIENDO', 0.3)
+    ruta = str(tmp_path / "coordinacion.sqlite3")
+    esta, otra = coordinacion._BloqueoSqlite(ruta), coordinacion._BloqueoSqlite(ruta)
+
+    testigo = esta.adquirir(["celda:x"], 1.0)
+    time.sleep(1.0) # Más de tres duraciones del arrendamiento: sin renovar ya habría caducado
+    with pytest.raises(coordinacion.BloqueoOcupado):
+        otra.adquirir(["celda:x"], 0)
+
+    esta.liberar(["celda:x"], testigo)
+    otra.liberar(["celda:x"], otra.adquirir(["celda:x"], 0))
@@ -0,0 +1,55 @@
+# tests/test_cuota.py
+"""Gobernador de cuota de Sheets: una cuota por cuenta de servicio, repartida entre granjas."""
+
+import threading
+
+import pytest
+
+from in_telegram.g_sheets import cuota
+from in_telegram.utils import granjas
+
+@pytest.fixture
+def cuota_pequena():
+    cuota.configurar(600, 600) # 10 peticiones por segundo, ráfaga de 20
+    yield
+    cuota.configurar(1e9, 1e9)
+
+def _adquirir(nombre_granja: str, veces: int, orden: list, orden_lock: threading.Lock):
+    with granjas.contexto_granja(granjas.Granja(nombre_granja)):
+        for _ in range(veces):
+            cuota.adquirir(cuota.LECTURA, cuota.PRIORIDAD_BAIXA)
+            with orden_lock:
+                orden.append(nombre_granja)
+
+def test_todas_las_granjas_comparten_la_cuota_de_la_cuenta(cuota_pequena):
+    with granjas.contexto_granja(granjas.Granja("cuota-nord")):
+        for _ in range(cuota.RAFAGA_MAXIMA):
+            cuota.adquirir(cuota.ESCRITURA, cuota.PRIORIDAD_BAIXA)
+    with granjas.contexto_granja(granjas.Granja("cuota-sud")):
+        assert cuota.restante(cuota.ESCRITURA) < 1
+        cuota.pausar(cuota.ESCRITURA, 5.0)
+    with granjas.contexto_granja(granjas.Granja("cuota-nord")):
+        assert cuota.restante(cuota.ESCRITURA) == 0.0
+
+def test_una_granja_con_muchas_peticiones_no_deja_sin_turno_a_otra(cuota_pequena):
+    orden, orden_lock = [], threading.Lock()
+    _adquirir("reparto-nord", cuota.RAFAGA_MAXIMA, [], orden_lock) # Bucket vacío: a partir de aquí se espera turno
+    hilos = [threading.Thread(target=_adquirir, args=("reparto-nord", 5, orden, orden_lock)) for _ in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    sud = threading.Thread(target=_adquirir, args=("reparto-sud", 3, orden, orden_lock))
+    sud.start()
+    for hilo in hilos + [sud]:
+        hilo.join(timeout=30)
+
+    # Sin reparto, sud (1 hilo contra 6) recibiría un token de cada 7
+    assert len(orden) == 33
+    assert orden[:8].count("reparto-sud") == 3
+
+def test_una_cuota_sin_sitio_para_la_reserva_se_rechaza(cuota_pequena):
+    # Con 5 peticiones/min la ráfaga es 5: una consulta necesita 1 + RESERVA_BAIXES y no pasaría nunca
+    with pytest.raises(ValueError):
+        cuota.configurar(cuota.RESERVA_BAIXES, 600)
+    assert cuota.restante(cuota.LECTURA) == cuota.RAFAGA_MAXIMA # No ha cambiado ningún límite
+    cuota.configurar(1 + cuota.RESERVA_BAIXES, 600)
+    assert cuota.restante(cuota.LECTURA) == 1 + cuota.RESERVA_BAIXES
@@ -0,0 +1,142 @@
+# tests/test_diario_escrituras.py
+"""Diario de escrituras: los avisos de una entrada que no se puede aplicar van al chat y al bot del mensaje que la creó."""
+
+import asyncio
+import datetime
+import sqlite3
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from in_telegram.g_sheets import baixes_g_sheets, coordinacion, diario_escrituras
+from in_telegram.utils import granjas
+from in_telegram.utils.message_sender import esperar_envios
+
+from conftest import Context, escribir, fila_de_hoy, update
+
+def _sin_sincronizar():
+    """Mientras dura, el sincronizador no puede aplicar el diario: las entradas se quedan pendientes."""
+    return coordinacion.bloquear([coordinacion.clave_diario(granjas.PRINCIPAL)])
+
+def test_cada_mensaje_recibe_sus_avisos(hoja, monkeypatch):
+    monkeypatch.setattr(baixes_g_sheets, 'DIARIO_ESCRITURAS', True)
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "B", f"D{fila}", "revisar")
+    con_error, correcto = Context(), Context()
+
+    async def _enviar():
+        loop = asyncio.get_running_loop()
+        with _sin_sincronizar():
+            await baixes_g_sheets.g_sheets(update("3b sac", chat_id=1), con_error, loop)
+            await baixes_g_sheets.g_sheets(update("1a", chat_id=2), correcto, loop)
+        assert await asyncio.to_thread(diario_escrituras.esperar_sincronizado, 10.0)
+        await asyncio.sleep(0.1) # Los avisos del sincronizador llegan al bucle desde su hilo
+        await esperar_envios()
+
+    asyncio.run(_enviar())
+
+    assert any("no numèric" in r for r in con_error.bot.respuestas)
+    assert not any("no numèric" in r for r in correcto.bot.respuestas)
+    assert hoja.valor("A", f"E{fila}") == 1
+    assert diario_escrituras._diario().notificadores == {} # Resueltas: no se guardan más funciones de aviso
+
+def test_las_entradas_de_una_ejecucion_anterior_avisan_con_el_de_la_granja(hoja, monkeypatch):
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "C", f"E{fila}", "revisar")
+    avisos = []
+    monkeypatch.setattr(diario_escrituras._diario(), 'notificador', None)
+
+    with _sin_sincronizar():
+        # Sin función propia, como una entrada que quedó en el diario antes de reiniciar el bot
+        diario_escrituras.registrar("C", datetime.date.today().strftime("%d/%m/%y"), "E", 2, fila, chat_id=9)
+        diario_escrituras.iniciar_sincronizador(notificar=lambda chat_id, texto: avisos.append((chat_id, texto)))
+    assert diario_escrituras.esperar_sincronizado(10.0)
+
+    assert [chat_id for chat_id, _ in avisos] == [9]
+    assert "no numèric" in avisos[0][1]
+
+class _ConexionSinEspacio:
+    """Conexión del diario que falla una vez al preparar las entradas, como con el disco lleno."""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self.fallos = 0
+
+    def executemany(self, sql, parametros):
+        if "'preparada'" in sql and not self.fallos:
+            self.fallos += 1
+            raise sqlite3.OperationalError("database or disk is full")
+        return self._conexion.executemany(sql, parametros)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+def test_un_fallo_al_preparar_no_deja_la_transaccion_abierta(hoja, monkeypatch):
+    fila = fila_de_hoy(hoja)
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    diario = diario_escrituras._diario()
+    conexion = _ConexionSinEspacio(diario.db())
+    monkeypatch.setattr(diario, 'conexion', conexion)
+
+    with _sin_sincronizar():
+        diario_escrituras.registrar("A", hoy, "E", 2, fila, chat_id=3)
+        with pytest.raises(sqlite3.OperationalError):
+            diario_escrituras._sincronizar_lote()
+        assert not conexion.in_transaction
+        # Las baixes siguientes se guardan en su propia transacción, no dentro de la que falló
+        assert diario_escrituras.registrar_varias([("B", hoy, "D", 1, fila)], chat_id=3) is not None
+    assert diario_escrituras.esperar_sincronizado(10.0)
+
+    assert conexion.fallos == 1
+    assert (hoja.valor("A", f"E{fila}"), hoja.valor("B", f"D{fila}")) == (2, 1)
+
+def _rechazar_nau(hoja, monkeypatch, nau: str, metodo: str) -> None:
+    """La hoja responde 400 a los rangos de la nau en las lecturas ('_leer') o escrituras ('_escribir'), como sin hoja 'Nau X'."""
+    original = getattr(hoja, metodo)
+
+    def _rechazar(rango, *args):
+        if rango.startswith(f"'Nau {nau}'"):
+            raise HttpError(httplib2.Response({'status': 400}),
+                            b'{"error": {"code": 400, "message": "Unable to parse range", "status": "INVALID_ARGUMENT"}}')
+        return original(rango, *args)
+
+    monkeypatch.setattr(hoja, metodo, _rechazar)
+
+def test_una_nau_sin_hoja_no_bloquea_a_las_demas(hoja, monkeypatch):
+    fila = fila_de_hoy(hoja)
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    _rechazar_nau(hoja, monkeypatch, "B", '_leer')
+    avisos = []
+
+    def _avisar(chat_id, texto):
+        avisos.append((chat_id, texto))
+
+    with _sin_sincronizar():
+        diario_escrituras.registrar_varias([("A", hoy, "E", 2, fila)], chat_id=1, notificar=_avisar)
+        diario_escrituras.registrar_varias([("B", hoy, "E", 3, fila)], chat_id=2, notificar=_avisar)
+        # Sin fila: se busca la fecha en la hoja de la nau
+        diario_escrituras.registrar_varias([("B", hoy, "D", 1, None)], chat_id=3, notificar=_avisar)
+        diario_escrituras.registrar_varias([("C", hoy, "D", 4, None)], chat_id=4, notificar=_avisar)
+    assert diario_escrituras.esperar_sincronizado(10.0)
+
+    assert (hoja.valor("A", f"E{fila}"), hoja.valor("C", f"D{fila}")) == (2, 4)
+    assert sorted(chat_id for chat_id, _ in avisos) == [2, 3]
+    assert all("'Nau B'" in texto for _, texto in avisos)
+
+def test_una_escritura_rechazada_se_abandona_tras_max_intentos(hoja, monkeypatch):
+    fila = fila_de_hoy(hoja)
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    _rechazar_nau(hoja, monkeypatch, "B", '_escribir')
+    avisos = []
+
+    with _sin_sincronizar():
+        id_b = diario_escrituras.registrar("B", hoy, "E", 3, fila, chat_id=2,
+                                           notificar=lambda chat_id, texto: avisos.append((chat_id, texto)))
+        diario_escrituras.registrar("A", hoy, "E", 2, fila, chat_id=1)
+    assert diario_escrituras.esperar_sincronizado(30.0)
+
+    assert hoja.valor("A", f"E{fila}") == 2
+    assert hoja.valor("B", f"E{fila}") in (None, "", 0)
+    assert diario_escrituras.entrada(id_b)['intentos'] == diario_escrituras.MAX_INTENTOS
+    assert [chat_id for chat_id, _ in avisos] == [2]
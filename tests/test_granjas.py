@@ -0,0 +1,71 @@
+# tests/test_granjas.py
+"""
+Activación de granjas: los hilos de fondo de una granja arrancan con su primer uso, también si se añade en marcha.
+Una granja con la hoja lenta no ocupa los hilos de las llamadas a Sheets de las demás.
+"""
+
+import asyncio
+import json
+import time
+
+from in_telegram.g_sheets import sheets_api
+from in_telegram.g_sheets.fake_sheets import FakeLibrosSheets, FakeSheetsService
+from in_telegram.utils import granjas
+
+def _tabla(monkeypatch, tmp_path, granges: dict):
+    ruta = tmp_path / "granjas.json"
+    ruta.write_text(json.dumps({'granges': granges, 'per_defecte': next(iter(granges))}), encoding='utf-8')
+    monkeypatch.setattr(granjas, 'GRANJAS_FILE', str(ruta))
+    granjas.recargar(forzar=True)
+
+def test_una_granja_anadida_en_marcha_se_activa_con_su_primer_uso(monkeypatch, tmp_path):
+    monkeypatch.setattr(granjas, '_al_activar', [])
+    monkeypatch.setattr(granjas, '_activadas', set())
+    activadas = []
+    try:
+        _tabla(monkeypatch, tmp_path, {'nord': {}})
+        granjas.al_activar(lambda granja: activadas.append((granja.nombre, granjas.actual().nombre)))
+        for granja in granjas.todas():
+            granjas.activar(granja)
+        assert activadas == [('nord', 'nord')]
+
+        _tabla(monkeypatch, tmp_path, {'nord': {}, 'sud': {}})
+        with granjas.contexto_granja(granjas.vigente(granjas.Granja('sud'))):
+            pass
+        with granjas.contexto_granja(granjas.vigente(granjas.Granja('sud'))):
+            pass
+        assert activadas == [('nord', 'nord'), ('sud', 'sud')]
+    finally:
+        monkeypatch.undo()
+        granjas.recargar(forzar=True)
+
+def test_al_activar_tambien_se_ejecuta_para_las_granjas_ya_activadas(monkeypatch):
+    monkeypatch.setattr(granjas, '_al_activar', [])
+    monkeypatch.setattr(granjas, '_activadas', set())
+    with granjas.contexto_granja(granjas.actual()):
+        pass
+    activadas = []
+    granjas.al_activar(lambda granja: activadas.append(granja.nombre))
+    assert activadas == [granjas.PRINCIPAL]
+
+def test_una_granja_con_la_hoja_lenta_no_ocupa_los_hilos_de_las_demas(monkeypatch):
+    monkeypatch.setattr(granjas, '_al_activar', []) # Sin réplica ni diario: solo las llamadas de la prueba
+    libros = FakeLibrosSheets({'hoja-lenta': FakeSheetsService(naus=("A",), latencia=1.0),
+                               'hoja-rapida': FakeSheetsService(naus=("A",))})
+
+    def _leer(spreadsheet_id):
+        return sheets_api.ejecutar_async(libros.values().get(spreadsheetId=spreadsheet_id, range="'Nau A'!E7"))
+
+    async def _medir():
+        with granjas.contexto_granja(granjas.Granja('lenta', 'hoja-lenta')):
+            # Más llamadas que hilos tenía el executor compartido: antes lo llenaban entero
+            atascadas = [asyncio.ensure_future(_leer('hoja-lenta')) for _ in range(2 * sheets_api.MAX_LLAMADAS_POR_GRANJA)]
+        await asyncio.sleep(0.1)
+        inicio = time.perf_counter()
+        with granjas.contexto_granja(granjas.Granja('rapida', 'hoja-rapida')):
+            await _leer('hoja-rapida')
+        espera = time.perf_counter() - inicio
+        await asyncio.gather(*atascadas)
+        return espera
+
+    assert asyncio.run(_medir()) < 0.3
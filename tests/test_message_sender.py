@@ -0,0 +1,73 @@
+# tests/test_message_sender.py
+"""Cola de salida de Telegram: el despachador se recupera si falla y los pendientes se pueden leer desde otro hilo."""
+
+import asyncio
+import datetime
+
+from telegram.error import RetryAfter
+
+from in_telegram.utils import message_sender
+from in_telegram.utils.message_sender import esperar_envios, mensajes_pendientes, send_message_async
+
+from conftest import Context
+
+def test_el_despachador_se_reinicia_si_falla(monkeypatch):
+    monkeypatch.setattr(message_sender, 'ESPERA_REINICIO_DESPACHADOR', 0.01)
+    sacar_lote = message_sender._Planificador._sacar_lote
+    fallos = []
+
+    def _falla_una_vez(self, chat_id):
+        if not fallos:
+            fallos.append(chat_id)
+            raise RuntimeError("fallo simulado")
+        return sacar_lote(self, chat_id)
+
+    monkeypatch.setattr(message_sender._Planificador, '_sacar_lote', _falla_una_vez)
+    context = Context()
+
+    async def _enviar():
+        await send_message_async(1, context, "hola")
+        await asyncio.wait_for(esperar_envios(), timeout=5)
+
+    asyncio.run(_enviar())
+    assert fallos == [1]
+    assert context.bot.respuestas == ["hola"]
+
+def test_pendientes_desde_otro_hilo():
+    context = Context()
+
+    async def _enviar():
+        loop = asyncio.get_running_loop()
+        for texto in ("u", "dos", "tres"):
+            await send_message_async(7, context, texto, fusionable=False)
+        await asyncio.sleep(0.05) # El primero sale enseguida; los otros esperan el límite por chat
+        en_cola = await asyncio.to_thread(mensajes_pendientes, loop)
+        await esperar_envios()
+        return en_cola, await asyncio.to_thread(mensajes_pendientes, loop)
+
+    assert asyncio.run(_enviar()) == (2, 0)
+    assert context.bot.respuestas == ["u", "dos", "tres"]
+
+def test_los_mensajes_fusionados_y_reintentados_se_descuentan(monkeypatch):
+    monkeypatch.setattr(message_sender, 'MENSAJES_POR_SEGUNDO_CHAT', 1000.0)
+    enviados = []
+
+    class _BotConLimite:
+        async def send_message(self, chat_id, text):
+            if not enviados:
+                enviados.append(None)
+                raise RetryAfter(datetime.timedelta(milliseconds=10))
+            enviados.append(text)
+
+    class _Context:
+        bot = _BotConLimite()
+
+    async def _enviar():
+        loop = asyncio.get_running_loop()
+        for texto in ("a", "b", "c"):
+            await send_message_async(8, _Context(), texto)
+        await esperar_envios()
+        return await asyncio.to_thread(mensajes_pendientes, loop)
+
+    assert asyncio.run(_enviar()) == 0
+    assert enviados == [None, "a\nb\nc"]
@@ -0,0 +1,62 @@
+# tests/test_multianotacio.py
+"""Mensajes con varias anotaciones ('3a 2b sac'): se escriben todas en un lote o ninguna."""
+
+import asyncio
+
+import pytest
+
+from in_telegram.g_sheets import baixes_g_sheets, diario_escrituras
+from in_telegram.utils.message_sender import esperar_envios
+
+from conftest import Context, enviar, escribir, fila_de_hoy
+
+def _configurar_modo(monkeypatch, modo: str):
+    monkeypatch.setattr(baixes_g_sheets, 'DIARIO_ESCRITURAS', modo == 'diari')
+    monkeypatch.setattr(baixes_g_sheets, 'ESCRITURA_AGRUPADA', modo == 'agrupat')
+
+async def _enviar_y_sincronizar(context, *textos) -> list:
+    respuestas = await enviar(context, *textos)
+    if baixes_g_sheets.DIARIO_ESCRITURAS:
+        assert await asyncio.to_thread(diario_escrituras.esperar_sincronizado, 10.0)
+        await asyncio.sleep(0.1) # Los avisos del sincronizador llegan al bucle desde su hilo
+        await esperar_envios()
+    return respuestas
+
+@pytest.mark.parametrize('modo', ['directe', 'agrupat', 'diari'])
+def test_un_mensaje_escribe_todas_las_anotaciones(hoja, monkeypatch, modo):
+    _configurar_modo(monkeypatch, modo)
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "A", f"E{fila}", 4)
+
+    asyncio.run(_enviar_y_sincronizar(Context(), "3a 2b sac 1a"))
+
+    assert hoja.valor("A", f"E{fila}") == 8
+    assert hoja.valor("B", f"D{fila}") == 2
+
+@pytest.mark.parametrize('modo', ['directe', 'agrupat', 'diari'])
+def test_una_celda_no_numerica_no_escribe_ninguna(hoja, monkeypatch, modo):
+    _configurar_modo(monkeypatch, modo)
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "A", f"E{fila}", 4)
+    escribir(hoja, "B", f"D{fila}", "revisar")
+
+    respuestas = asyncio.run(_enviar_y_sincronizar(Context(), "3a 2b sac 5c"))
+
+    assert hoja.valor("A", f"E{fila}") == 4
+    assert hoja.valor("B", f"D{fila}") == "revisar"
+    assert hoja.valor("C", f"E{fila}") is None
+    assert any("no numèric" in r for r in respuestas)
+
+def test_agrupat_el_mensaje_con_error_no_afecta_a_otro_en_el_mismo_lote(hoja, monkeypatch):
+    _configurar_modo(monkeypatch, 'agrupat')
+    fila = fila_de_hoy(hoja)
+    escribir(hoja, "B", f"D{fila}", "revisar")
+
+    async def _dos_mensajes():
+        # Los dos mensajes entran en el mismo volcado y comparten la celda de la nau A
+        await asyncio.gather(enviar(Context(), "3a 2b sac"), enviar(Context(), "1a"))
+
+    asyncio.run(_dos_mensajes())
+
+    assert hoja.valor("A", f"E{fila}") == 1
+    assert hoja.valor("B", f"D{fila}") == "revisar"
@@ -0,0 +1,34 @@
+# tests/test_replica_local.py
+"""Réplica local: un refresco no debe pisar con su foto las escrituras del bot que llegan mientras tanto."""
+
+import datetime
+
+from in_telegram.g_sheets import replica_local
+
+from conftest import escribir, fila_de_hoy
+
+def test_escritura_durante_el_refresco_no_se_pierde(hoja, monkeypatch):
+    hoy = datetime.date.today().strftime("%d/%m/%y")
+    fila = fila_de_hoy(hoja)
+    replica_local.refrescar()
+    assert replica_local.bajas_del_dia("A", hoy) == (None, None)
+
+    ejecutar_original = replica_local.ejecutar
+
+    def _leer_y_escribir_en_medio(peticion, *args, **kwargs):
+        foto = ejecutar_original(peticion, *args, **kwargs)
+        # El bot escribe en la hoja y en la réplica después de la lectura y antes de que el refresco guarde su foto
+        escribir(hoja, "A", f"E{fila}", 7)
+        replica_local.guardar_celda("A", "E", fila, 7, 7)
+        return foto
+
+    monkeypatch.setattr(replica_local, 'ejecutar', _leer_y_escribir_en_medio)
+    replica_local.refrescar()
+
+    assert replica_local.bajas_del_dia("A", hoy) == (None, 7)
+    assert replica_local.totales(["A", "B"]) == [("A", 7), ("B", 0)]
+
+    monkeypatch.setattr(replica_local, 'ejecutar', ejecutar_original)
+    replica_local.refrescar()
+    assert replica_local.bajas_del_dia("A", hoy) == (None, 7)
+    assert replica_local.totales(["A"]) == [("A", 7)]
@@ -0,0 +1,50 @@
+# tests/test_sheets_api.py
+"""Llamadas a Sheets desde el bucle de eventos: con ejecutar_async una hoja lenta no retrasa las demás corrutinas."""
+
+import asyncio
+
+from benchmarks.bench_lag_bucle import INTERVALO, _ejecutar_en_bucle, _monitor
+from in_telegram.g_sheets import baixes_g_sheets
+from in_telegram.utils.message_sender import esperar_envios
+
+from conftest import Context, fila_de_hoy
+
+LATENCIA = 0.05 # Segundos de cada llamada a la hoja simulada
+INFORMES = 10
+
+def _lags(fila: int) -> list:
+    """Retrasos del bucle de eventos, ordenados, mientras se escribe una ráfaga de informes de baja."""
+    async def _rafaga():
+        lags = []
+        parar = asyncio.Event()
+        monitor = asyncio.create_task(_monitor(lags, parar))
+        await asyncio.sleep(INTERVALO * 2)
+        await asyncio.gather(*(baixes_g_sheets._escribir_Datos_sheets("A", fila, 1, False, Context(), chat_id)
+                               for chat_id in range(INFORMES)))
+        await esperar_envios()
+        parar.set()
+        await monitor
+        return sorted(lags)
+
+    return asyncio.run(_rafaga())
+
+def _p99(lags: list) -> float:
+    return lags[int(len(lags) * 0.99) - 1]
+
+def test_ejecutar_async_no_bloquea_el_bucle(hoja):
+    fila = fila_de_hoy(hoja)
+    hoja.latencia = LATENCIA
+
+    lags = _lags(fila)
+
+    assert _p99(lags) < LATENCIA / 2
+    assert hoja.valor("A", f"E{fila}") == INFORMES
+
+def test_execute_en_el_bucle_lo_bloquea(hoja, monkeypatch):
+    fila = fila_de_hoy(hoja)
+    hoja.latencia = LATENCIA
+    monkeypatch.setattr(baixes_g_sheets, 'ejecutar_async', _ejecutar_en_bucle)
+
+    lags = _lags(fila)
+
+    assert lags[-1] >= LATENCIA * 0.9